@@ -0,0 +1,279 @@
+"""
+Archive Manager
+Compressed, column-oriented segment files for aged-out monitoring data
+
+Rows leaving the hot database are written to immutable segment files
+instead of being discarded. A segment holds one table's rows sorted by
+timestamp, cut into blocks; inside a block every column is stored as its
+own zlib-compressed JSON array, so similar values sit together and a scan
+only inflates the columns it asks for.
+
+File layout:
+    MAGIC | block 0 columns | block 1 columns | ... | footer JSON |
+    footer length (uint32 LE) | MAGIC
+
+The footer lists the columns and, per block, the row count, min/max
+timestamp and the offset/length of each column chunk, so readers can skip
+whole files and blocks outside a time range by reading only the footer.
+"""
+
+import json
+import os
+import zlib
+import base64
+import struct
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveManager:
+    """Writes and scans compressed archive segments"""
+    
+    MAGIC = b'EMSEG01\x00'
+    FORMAT_VERSION = 1
+    SUFFIX = '.seg'
+    
+    def __init__(self, archive_dir: Path, block_rows: int = 4096, compression_level: int = 6):
+        """
+        Initialize archive manager
+        
+        Args:
+            archive_dir: Directory holding one sub-directory of segments per table
+            block_rows: Rows per block (the unit of time-range skipping)
+            compression_level: zlib level for column chunks
+        """
+        self.archive_dir = Path(archive_dir)
+        self.block_rows = max(1, block_rows)
+        self.compression_level = compression_level
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+    
+    # ------------------------------------------------------------------
+    # Column chunk encoding
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _json_value(value: Any) -> Any:
+        """JSON-safe form of a column value (bytes are tagged base64)"""
+        if isinstance(value, bytes):
+            return {'$b': base64.b64encode(value).decode('ascii')}
+        return value
+    
+    @staticmethod
+    def _python_value(value: Any) -> Any:
+        """Inverse of _json_value"""
+        if isinstance(value, dict) and '$b' in value:
+            return base64.b64decode(value['$b'])
+        return value
+    
+    def _encode_chunk(self, values: List[Any]) -> bytes:
+        """Compress one column of one block"""
+        payload = json.dumps(
+            [self._json_value(v) for v in values],
+            ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+        return zlib.compress(payload, self.compression_level)
+    
+    def _decode_chunk(self, data: bytes) -> List[Any]:
+        """Inflate one column of one block"""
+        return [self._python_value(v) for v in json.loads(zlib.decompress(data))]
+    
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    
+    def segment_path(self, table: str, rows: List[Dict[str, Any]]) -> Path:
+        """Path for a new segment: <table>/<table>_<first day>_<first id>-<last id>.seg"""
+        first_day = (rows[0].get('timestamp') or '')[:10].replace('-', '') or 'unknown'
+        ids = [r['id'] for r in rows if r.get('id') is not None]
+        span = f"{min(ids)}-{max(ids)}" if ids else datetime.now().strftime('%H%M%S%f')
+        return self.archive_dir / table / f"{table}_{first_day}_{span}{self.SUFFIX}"
+    
+    def write_segment(self, table: str, columns: List[str],
+                      rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Write rows to a new segment file
+        
+        The file is written under a temporary name, fsynced and renamed,
+        so a segment either exists completely or not at all.
+        
+        Args:
+            table: Source table name
+            columns: Columns to store ('timestamp' must be one of them)
+            rows: Row dicts
+        
+        Returns:
+            Segment summary (filepath, row_count, min/max id and timestamp,
+            file_bytes, raw_bytes)
+        """
+        if 'timestamp' not in columns:
+            raise ValueError("Archive segments need a 'timestamp' column")
+        if not rows:
+            raise ValueError("Cannot write an empty segment")
+        
+        rows = sorted(rows, key=lambda r: (r.get('timestamp') or '', r.get('id') or 0))
+        path = self.segment_path(table, rows)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        
+        blocks = []
+        raw_bytes = 0
+        with open(tmp_path, 'wb') as f:
+            f.write(self.MAGIC)
+            offset = len(self.MAGIC)
+            
+            for start in range(0, len(rows), self.block_rows):
+                block = rows[start:start + self.block_rows]
+                timestamps = [r.get('timestamp') for r in block if r.get('timestamp')]
+                entry = {
+                    'rows': len(block),
+                    'min_timestamp': min(timestamps) if timestamps else None,
+                    'max_timestamp': max(timestamps) if timestamps else None,
+                    'columns': {},
+                }
+                for column in columns:
+                    values = [r.get(column) for r in block]
+                    raw_bytes += sum(len(v) for v in values if isinstance(v, (str, bytes)))
+                    chunk = self._encode_chunk(values)
+                    f.write(chunk)
+                    entry['columns'][column] = [offset, len(chunk)]
+                    offset += len(chunk)
+                blocks.append(entry)
+            
+            ids = [r['id'] for r in rows if r.get('id') is not None]
+            lows = [b['min_timestamp'] for b in blocks if b['min_timestamp']]
+            highs = [b['max_timestamp'] for b in blocks if b['max_timestamp']]
+            footer = {
+                'format': self.FORMAT_VERSION,
+                'table': table,
+                'columns': list(columns),
+                'row_count': len(rows),
+                'min_id': min(ids) if ids else None,
+                'max_id': max(ids) if ids else None,
+                'min_timestamp': min(lows) if lows else None,
+                'max_timestamp': max(highs) if highs else None,
+                'created_at': datetime.now().isoformat(),
+                'blocks': blocks,
+            }
+            footer_bytes = json.dumps(footer, separators=(',', ':')).encode('utf-8')
+            f.write(footer_bytes)
+            f.write(struct.pack('<I', len(footer_bytes)))
+            f.write(self.MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_path, path)
+        file_bytes = path.stat().st_size
+        
+        logger.debug(
+            f"Archived {len(rows)} {table} rows to {path.name} "
+            f"({raw_bytes} -> {file_bytes} bytes)"
+        )
+        
+        return {
+            'filepath': str(path),
+            'table_name': table,
+            'row_count': len(rows),
+            'min_id': footer['min_id'],
+            'max_id': footer['max_id'],
+            'min_timestamp': footer['min_timestamp'],
+            'max_timestamp': footer['max_timestamp'],
+            'file_bytes': file_bytes,
+            'raw_bytes': raw_bytes,
+        }
+    
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    
+    def read_footer(self, path: Path) -> Dict[str, Any]:
+        """Read a segment's footer (only the tail of the file is read)"""
+        trailer = len(self.MAGIC) + 4
+        with open(path, 'rb') as f:
+            f.seek(-trailer, os.SEEK_END)
+            tail = f.read(trailer)
+            if tail[4:] != self.MAGIC:
+                raise ValueError(f"Not an archive segment: {path}")
+            footer_length = struct.unpack('<I', tail[:4])[0]
+            f.seek(-(trailer + footer_length), os.SEEK_END)
+            return json.loads(f.read(footer_length))
+    
+    def list_segments(self, table: str) -> List[Path]:
+        """Segment files of a table, oldest first by name"""
+        table_dir = self.archive_dir / table
+        if not table_dir.exists():
+            return []
+        return sorted(table_dir.glob(f"*{self.SUFFIX}"))
+    
+    def scan(self, table: str, since: str = None, until: str = None,
+             columns: Optional[List[str]] = None,
+             paths: Optional[Iterable[Path]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate archived rows with since <= timestamp < until
+        
+        Files and blocks whose footer range lies outside [since, until) are
+        skipped without being inflated; only the requested columns (plus
+        timestamp) are decompressed. Rows come out in timestamp order
+        within each segment, segments in the order given.
+        
+        Args:
+            table: Table name (segments are looked up in its directory)
+            since: Inclusive ISO-8601 lower bound (None for unbounded)
+            until: Exclusive ISO-8601 upper bound (None for unbounded)
+            columns: Columns to return (all stored columns if None)
+            paths: Segment files to read instead of the whole table directory
+        """
+        for path in (paths if paths is not None else self.list_segments(table)):
+            path = Path(path)
+            try:
+                footer = self.read_footer(path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Skipping unreadable archive segment {path}: {e}")
+                continue
+            
+            if not self._overlaps(footer['min_timestamp'], footer['max_timestamp'], since, until):
+                continue
+            
+            wanted = [c for c in (columns or footer['columns']) if c in footer['columns']]
+            read_columns = wanted if 'timestamp' in wanted else wanted + ['timestamp']
+            
+            with open(path, 'rb') as f:
+                for block in footer['blocks']:
+                    if not self._overlaps(block['min_timestamp'], block['max_timestamp'], since, until):
+                        continue
+                    
+                    values = {}
+                    for column in read_columns:
+                        offset, length = block['columns'][column]
+                        f.seek(offset)
+                        values[column] = self._decode_chunk(f.read(length))
+                    
+                    for i in range(block['rows']):
+                        timestamp = values['timestamp'][i]
+                        if since and (timestamp is None or timestamp < since):
+                            continue
+                        if until and (timestamp is None or timestamp >= until):
+                            continue
+                        yield {column: values[column][i] for column in wanted}
+    
+    @staticmethod
+    def _overlaps(low: Optional[str], high: Optional[str],
+                  since: Optional[str], until: Optional[str]) -> bool:
+        """Check whether [low, high] intersects [since, until)"""
+        if low is None:
+            return since is None and until is None
+        if since and high < since:
+            return False
+        if until and low >= until:
+            return False
+        return True
+    
+    def delete_segment(self, path: Path):
+        """Delete a segment file"""
+        try:
+            Path(path).unlink()
+        except FileNotFoundError:
+            pass
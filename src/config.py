@@ -26,6 +26,19 @@ class Config:
     IPC_HOST = "127.0.0.1"
     IPC_PORT = 51234
     IPC_AUTH_TOKEN = "ENTERPRISE_MONITOR_SECRET_2024"  # Change in production
+    IPC_CODECS = ('msgpack', 'binary', 'json')  # Frame codecs by preference ('json' only: no handshake)
+    IPC_HANDSHAKE_TIMEOUT = 2.0  # seconds to wait for the watchdog's codec choice
+    IPC_BATCH_MAX_MESSAGES = 100  # events per batch frame (1: one frame per event)
+    IPC_BATCH_MAX_BYTES = 256 * 1024  # send the batch early once it reaches this size
+    IPC_BATCH_LINGER_MS = 10  # how long an event may wait for others to share its frame
+    IPC_SERVER_MODE = 'threaded'  # 'threaded' (thread per agent) or 'asyncio' (one event loop)
+    IPC_ASYNC_WORKERS = 4  # asyncio server: threads running message handlers
+    IPC_ASYNC_BUFFER_BYTES = 1024 * 1024  # asyncio server: read-ahead limit per connection (a frame is buffered whole, up to IPC_MAX_FRAME_BYTES)
+    IPC_MAX_FRAME_BYTES = 64 * 1024 * 1024  # larger length prefixes close the connection
+    IPC_RECV_BUFFER_BYTES = 64 * 1024  # threaded server: reusable receive buffer per connection
+    IPC_TRANSPORT = 'tcp'  # 'tcp' (IPC_HOST:IPC_PORT) or 'unix' (IPC_SOCKET_PATH; not on Windows)
+    IPC_SOCKET_MODE = 0o660  # unix transport: socket file permissions (connect needs write)
+    IPC_SOCKET_GROUP = None  # unix transport: group allowed to connect (e.g. the agents' users)
     
     # Paths (ProgramData for service compatibility)
     if os.name == 'nt':  # Windows
@@ -37,10 +50,48 @@ class Config:
     LOG_DIR = BASE_DIR / "logs"
     CONFIG_DIR = BASE_DIR / "config"
     SCREENSHOT_DIR = DATA_DIR / "screenshots"
+    IPC_SOCKET_PATH = BASE_DIR / "ipc.sock"  # IPC_TRANSPORT = 'unix'
     EXPORT_DIR = BASE_DIR / "Exports"  # NEW: For JSON exports
     
     # Database
     DATABASE_PATH = DATA_DIR / "monitoring.db"
+    DB_READER_POOL_SIZE = 4  # Max concurrent read-only connections
+    DB_READER_MMAP_SIZE = 0  # Bytes readers memory-map (0: page cache only; tools/bench_mmap.py)
+    DB_DURABILITY = 'balanced'  # 'strict', 'balanced' or 'throughput' (tools/bench_durability.py)
+    DB_WRITE_BEHIND = None  # Queue event inserts and group-commit them (None: from DB_DURABILITY)
+    DB_WRITE_QUEUE_SIZE = 10000  # Max queued rows before log_* calls block
+    DB_BATCH_MAX_ROWS = 500  # Commit once this many rows are queued...
+    DB_BATCH_MAX_MS = None  # ...or this many ms after the first one (None: from DB_DURABILITY)
+    DB_BACKGROUND_MAINTENANCE = True  # Run vacuum etc. on a DatabaseManager thread
+    DB_VACUUM_INTERVAL = 300  # seconds between incremental vacuum runs
+    DB_VACUUM_STEP_PAGES = 256  # pages freed per incremental_vacuum transaction
+    DB_VACUUM_STEP_PAUSE = 0.05  # seconds to yield to ingestion between steps
+    DB_VACUUM_TIME_BUDGET = 10.0  # max seconds per vacuum run
+    DB_RETENTION_CHUNK_ROWS = 5000  # id range deleted per retention transaction
+    DB_RETENTION_CHUNK_PAUSE = 0.05  # seconds to yield to ingestion between chunks
+    DB_RETENTION_TIME_BUDGET = 60.0  # max seconds per cleanup run
+    DB_RETENTION_RESUME_DELAY = 120  # seconds before resuming an unfinished cleanup
+    DB_MIGRATION_CHUNK_ROWS = 5000  # rows rewritten per background migration transaction
+    DB_MIGRATION_CHUNK_PAUSE = 0.05  # seconds to yield to ingestion between chunks
+    DB_APP_USAGE_ROLLUPS = True  # Maintain hourly/daily app usage rollups on ingest
+    DB_ROLLUP_TITLES_KEEP_DAYS = 2  # days the title sets of closed rollup buckets are kept for late events
+    DB_DICTIONARY_ENCODING = True  # Store app names / window titles as lookup table ids
+    DB_DICTIONARY_CACHE_SIZE = 10000  # Cached string -> id entries per lookup table
+    DB_PARTITION_GRANULARITY = None  # None (single file), 'day' or 'week' shard files
+    DB_ARCHIVE_DIR = None  # e.g. DATA_DIR / "archive": keep expired rows in compressed segments
+    DB_ARCHIVE_SEGMENT_ROWS = 50000  # max rows per archive segment file
+    DB_ARCHIVE_BLOCK_ROWS = 4096  # rows per compressed block (time-range skip unit)
+    DB_ARCHIVE_COMPRESSION_LEVEL = 6  # zlib level for archive column chunks
+    DB_FULL_TEXT_SEARCH = False  # FTS5 indexes over window titles and clipboard previews
+    DB_CLIPBOARD_DEDUP = True  # Store each clipboard payload once per content_hash
+    CLIPBOARD_RECENT_HASHES = 1024  # committed payload hashes remembered so the watchdog does not re-queue them
+    DB_SLOW_OPERATION_MS = None  # Log database operations slower than this (None: off)
+    DB_CHECKPOINT_INTERVAL = None  # seconds between WAL checkpoints (None: from DB_DURABILITY)
+    DB_CHECKPOINT_BUSY_QUEUE_ROWS = 500  # defer PASSIVE checkpoints while this many rows are queued
+    DB_CHECKPOINT_BUSY_TIMEOUT = 1.0  # seconds RESTART/TRUNCATE wait for readers
+    DB_WAL_RESTART_BYTES = 64 * 1024 * 1024  # WAL size that escalates to a RESTART checkpoint
+    DB_WAL_TRUNCATE_BYTES = 256 * 1024 * 1024  # WAL size that escalates to a TRUNCATE checkpoint
+    DB_WAL_AUTOCHECKPOINT_PAGES = 16384  # commit-time autocheckpoint backstop with background checkpoints
     
     # Monitoring Settings
     SCREENSHOT_INTERVAL = 1.0  # seconds (1 fps time-lapse)
@@ -175,6 +226,10 @@ class Config:
             'server_url': 'SERVER_URL',
             'api_key': 'API_KEY',
             'sync_interval_seconds': 'SYNC_INTERVAL_SECONDS',
+            'db_durability': 'DB_DURABILITY',
+            'db_write_behind': 'DB_WRITE_BEHIND',
+            'db_batch_max_ms': 'DB_BATCH_MAX_MS',
+            'db_checkpoint_interval': 'DB_CHECKPOINT_INTERVAL',
         }
         
         for config_key, class_attr in mapping.items():
@@ -5,65 +5,897 @@ Handles all SQLite database operations with encryption support
 ENHANCEMENTS:
 - Added 'synced' and 'synced_at' columns to track server sync status
 - Added migration logic to add columns to existing databases
+- Long-lived pooled connections (one writer, N readers) instead of a
+  connect/close per operation
+- Optional write-behind mode: log_* calls are queued and committed by a
+  background writer thread in multi-row transactions
+- Incremental auto-vacuum reclaimed in small steps by a background
+  maintenance thread instead of a full VACUUM under the writer lock
+- Retention deletes run in bounded id-range chunks with a time budget and
+  resume where the previous run stopped
+- Optional time-partitioned layout (see partition_manager.py) where expiry
+  drops whole shard files
+- Migration registry keyed on PRAGMA user_version (MIGRATIONS): startup is
+  a single version check when current; long data rewrites run in the
+  background and every migration's duration lands in system_events
+- Integer epoch-millisecond `ts` columns (schema v2), used by time-range
+  reads, search and retention once backfilled
+- Server sync tracked by a per-table, per-destination high-water-mark id
+  (sync_cursors) with keyset-paginated reads instead of per-row flag updates
+- Per-table counters (table_stats) maintained in the write, retention and
+  sync paths so get_statistics() does not scan the event tables
+- Read API (query, iter_query, iter_events, latest_events) on pooled
+  read-only connections, never taking the writer lock
+- Hourly/daily app usage rollups (duration, sessions, distinct window
+  titles) updated with each app_usage insert
+- App names and window titles dictionary-encoded into app_names /
+  window_titles ids (LRU-cached), with *_view views decoding them;
+  retention deletes ids no row references any more
+- Optional archive (see archive_manager.py): rows are written to compressed,
+  column-oriented segment files before retention deletes them (expired
+  shards are archived whole), readable by time range via iter_archived()
+- Optional FTS5 full-text search (search()) over window titles (indexed
+  once per distinct title through the window_titles dictionary) and
+  clipboard previews, kept current by triggers
+- Clipboard payloads stored once per content_hash in clipboard_content
+  (reference-counted, released by retention); rows carry a content_id
+- Per-operation latency histograms (writer lock wait vs execution, rows
+  affected) via get_operation_timings(), with optional slow-op logging
+- WAL checkpoints run by the maintenance thread (PASSIVE, escalating to
+  RESTART/TRUNCATE as the WAL grows, deferred during ingestion bursts)
+  instead of relying on the commit-time autocheckpoint
+- Durability modes (DB_DURABILITY: strict / balanced / throughput) setting
+  the synchronous level, group-commit window and checkpoint interval
+- Optional memory-mapped reads (DB_READER_MMAP_SIZE) on the read-only
+  connections, so large scans skip copying pages through SQLite's cache
 """
 
 import sqlite3
 import json
+import time
 import logging
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta
-from threading import Lock
-from typing import Dict, List, Any, Optional
+from queue import Queue, Empty, Full
+from threading import Lock, Thread, Event
+from typing import Dict, List, Any, Optional, Callable, Iterator
+
+from config import Config
+from partition_manager import PartitionManager
+from archive_manager import ArchiveManager
 
 logger = logging.getLogger(__name__)
 
+# Schema version stored in PRAGMA user_version (see DatabaseManager.MIGRATIONS)
+SCHEMA_VERSION = 8
+
+# Event tables that are synced to the server
+SYNCED_TABLES = ('screenshots', 'clipboard_events', 'app_usage')
+
+# Destination name used when a sync cursor is not given one
+DEFAULT_SYNC_DESTINATION = 'server'
+
+
+def iso_to_epoch_ms(value: Optional[str]) -> Optional[int]:
+    """
+    Convert an ISO-8601 timestamp to integer epoch milliseconds
+    
+    Naive timestamps (what the agent sends) are taken as local time.
+    Registered as an SQL function on every pooled connection so backfills
+    compute exactly what the write path does.
+    """
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp() * 1000)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+class ConnectionPool:
+    """
+    Pool of long-lived SQLite connections
+
+    Holds a single writer connection (callers serialize on
+    DatabaseManager.lock) and up to ``max_readers`` read-only connections.
+    Each connection is configured once when opened and health-checked on
+    checkout after being idle.
+    """
+    
+    # Ping idle connections older than this before handing them out
+    HEALTH_CHECK_INTERVAL = 60.0  # seconds
+    
+    def __init__(self, db_path: Path, max_readers: int = 4, timeout: float = 10.0,
+                 wal_autocheckpoint: int = 1000, synchronous: str = 'NORMAL',
+                 reader_mmap_size: int = 0):
+        """
+        Initialize connection pool
+        
+        Args:
+            db_path: Path to the SQLite database file
+            max_readers: Maximum number of concurrent read-only connections
+            timeout: SQLite busy timeout in seconds
+            wal_autocheckpoint: WAL pages after which a commit on the
+                writer checkpoints (SQLite's default is 1000)
+            synchronous: Writer PRAGMA synchronous level (FULL, NORMAL, OFF)
+            reader_mmap_size: Bytes of the database file read-only
+                connections memory-map (0 reads through the page cache)
+        """
+        self.db_path = Path(db_path)
+        self.max_readers = max(1, max_readers)
+        self.timeout = timeout
+        self.wal_autocheckpoint = wal_autocheckpoint
+        self.synchronous = synchronous
+        self.reader_mmap_size = max(0, int(reader_mmap_size or 0))
+        # What SQLite actually granted (capped by SQLITE_MAX_MMAP_SIZE)
+        self._reader_mmap_effective: Optional[int] = None
+        
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_last_used = 0.0
+        
+        # Idle readers as (connection, last_used) tuples
+        self._idle_readers: Queue = Queue()
+        self._reader_count = 0
+        self._lock = Lock()
+        self._closed = False
+        
+        self._stats = {
+            'connections_opened': 0,
+            'connections_replaced': 0,
+            'health_check_failures': 0,
+            'writer_checkouts': 0,
+            'reader_checkouts': 0,
+            'reader_waits': 0,
+        }
+    
+    def _configure(self, conn: sqlite3.Connection, read_only: bool):
+        """Apply per-connection pragmas"""
+        cursor = conn.cursor()
+        if not read_only:
+            # auto_vacuum only takes effect on a new file if set before WAL;
+            # existing files are converted by DatabaseManager._init_database
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # Journal mode is persistent in the file; set it from the writer
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={self.synchronous}")
+            cursor.execute(f"PRAGMA wal_autocheckpoint={int(self.wal_autocheckpoint)}")
+        else:
+            cursor.execute("PRAGMA query_only=ON")
+            if self.reader_mmap_size:
+                # Also applies to shards attached to this connection later
+                cursor.execute(f"PRAGMA mmap_size={self.reader_mmap_size}")
+                row = cursor.fetchone()
+                self._reader_mmap_effective = row[0] if row else 0
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")  # 64MB cache
+        cursor.close()
+        
+        conn.create_function("iso_to_epoch_ms", 1, iso_to_epoch_ms, deterministic=True)
+    
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        if read_only:
+            conn = sqlite3.connect(
+                f"{self.db_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                timeout=self.timeout,
+                check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(
+                str(self.db_path),
+                timeout=self.timeout,
+                check_same_thread=False
+            )
+        self._configure(conn, read_only)
+        
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        
+        return conn
+    
+    def _is_healthy(self, conn: sqlite3.Connection, last_used: float) -> bool:
+        """Ping a connection if it has been idle for a while"""
+        if time.monotonic() - last_used < self.HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            return False
+    
+    def _discard(self, conn: sqlite3.Connection):
+        """Close a connection that failed its health check"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._stats['connections_replaced'] += 1
+    
+    def writer(self) -> sqlite3.Connection:
+        """
+        Get the writer connection
+        
+        The caller must hold DatabaseManager.lock for as long as it uses
+        the returned connection.
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        
+        if self._writer is not None and not self._is_healthy(self._writer, self._writer_last_used):
+            self._discard(self._writer)
+            self._writer = None
+        
+        if self._writer is None:
+            self._writer = self._open(read_only=False)
+        
+        self._writer_last_used = time.monotonic()
+        with self._lock:
+            self._stats['writer_checkouts'] += 1
+        
+        return self._writer
+    
+    @contextmanager
+    def reader(self):
+        """Check out a read-only connection for the duration of the block"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        
+        conn = None
+        while conn is None:
+            try:
+                candidate, last_used = self._idle_readers.get_nowait()
+            except Empty:
+                with self._lock:
+                    can_open = self._reader_count < self.max_readers
+                    if can_open:
+                        self._reader_count += 1
+                if can_open:
+                    try:
+                        conn = self._open(read_only=True)
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._reader_count -= 1
+                        raise
+                    break
+                
+                # Pool exhausted - wait for a reader to be returned
+                with self._lock:
+                    self._stats['reader_waits'] += 1
+                candidate, last_used = self._idle_readers.get()
+            
+            if self._is_healthy(candidate, last_used):
+                conn = candidate
+            else:
+                self._discard(candidate)
+                with self._lock:
+                    self._reader_count -= 1
+        
+        with self._lock:
+            self._stats['reader_checkouts'] += 1
+        
+        try:
+            yield conn
+        finally:
+            # End any read transaction so the WAL can be checkpointed
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            
+            if self._closed:
+                conn.close()
+            else:
+                self._idle_readers.put((conn, time.monotonic()))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool statistics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['readers_open'] = self._reader_count
+        stats['readers_idle'] = self._idle_readers.qsize()
+        stats['max_readers'] = self.max_readers
+        stats['writer_open'] = self._writer is not None
+        stats['reader_mmap_size'] = self.reader_mmap_size
+        stats['reader_mmap_effective'] = self._reader_mmap_effective
+        return stats
+    
+    def close(self):
+        """Close all pooled connections"""
+        self._closed = True
+        
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except sqlite3.Error as e:
+                logger.error(f"Error closing writer connection: {e}")
+            self._writer = None
+        
+        while True:
+            try:
+                conn, _ = self._idle_readers.get_nowait()
+            except Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._reader_count -= 1
+
+
+class OperationTimings:
+    """
+    Latency histograms per database operation
+    
+    Each operation keeps a count, rows affected, and for both the time
+    spent waiting for the writer lock and the time spent executing a
+    total, a maximum and counts per fixed millisecond bucket. Recording
+    is a few additions under a lock; percentiles are estimated from the
+    buckets when a snapshot is taken.
+    """
+    
+    # Bucket upper bounds in milliseconds (the last bucket is open-ended)
+    BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    
+    def __init__(self, slow_threshold_ms: Optional[float] = None):
+        self.slow_threshold_ms = slow_threshold_ms
+        self._lock = Lock()
+        self._operations: Dict[str, Dict[str, Any]] = {}
+        self._since = datetime.now().isoformat()
+    
+    def _new_series(self) -> Dict[str, Any]:
+        return {'total_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(self.BUCKETS_MS) + 1)}
+    
+    def _add(self, series: Dict[str, Any], ms: float):
+        series['total_ms'] += ms
+        if ms > series['max_ms']:
+            series['max_ms'] = ms
+        series['buckets'][bisect_left(self.BUCKETS_MS, ms)] += 1
+    
+    def record(self, operation: str, lock_wait: float, elapsed: float, rows: int = 0):
+        """
+        Record one operation
+        
+        Args:
+            operation: Operation name
+            lock_wait: Seconds spent waiting for the writer lock
+            elapsed: Seconds spent executing (lock held, if taken)
+            rows: Rows affected
+        """
+        wait_ms = lock_wait * 1000
+        exec_ms = elapsed * 1000
+        
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {
+                    'count': 0,
+                    'rows': 0,
+                    'lock_wait': self._new_series(),
+                    'exec': self._new_series(),
+                }
+            stats['count'] += 1
+            stats['rows'] += rows
+            self._add(stats['lock_wait'], wait_ms)
+            self._add(stats['exec'], exec_ms)
+        
+        if self.slow_threshold_ms is not None and wait_ms + exec_ms >= self.slow_threshold_ms:
+            logger.warning(
+                f"Slow database operation '{operation}': {wait_ms:.0f} ms waiting for the "
+                f"writer lock, {exec_ms:.0f} ms executing, {rows} rows"
+            )
+    
+    def _summarize(self, series: Dict[str, Any], count: int) -> Dict[str, Any]:
+        """Averages, estimated percentiles and bucket counts of one series"""
+        summary = {
+            'avg_ms': round(series['total_ms'] / count, 3) if count else 0.0,
+            'max_ms': round(series['max_ms'], 3),
+            'total_ms': round(series['total_ms'], 1),
+        }
+        for label, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            target = fraction * count
+            seen = 0
+            for index, bucket in enumerate(series['buckets']):
+                seen += bucket
+                if seen >= target:
+                    break
+            # Upper bound of the bucket holding the percentile, capped at the max
+            summary[label] = min(
+                self.BUCKETS_MS[index] if index < len(self.BUCKETS_MS) else series['max_ms'],
+                round(series['max_ms'], 3)
+            )
+        summary['buckets'] = {
+            (f"<={bound}" if i < len(self.BUCKETS_MS) else f">{self.BUCKETS_MS[-1]}"): n
+            for i, (bound, n) in enumerate(zip(self.BUCKETS_MS + (None,), series['buckets']))
+            if n
+        }
+        return summary
+    
+    def snapshot(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Get per-operation timing summaries
+        
+        Args:
+            reset: Start new histograms after taking the snapshot
+        """
+        with self._lock:
+            operations = {
+                name: {
+                    'count': stats['count'],
+                    'rows': stats['rows'],
+                    'lock_wait': dict(stats['lock_wait'], buckets=list(stats['lock_wait']['buckets'])),
+                    'exec': dict(stats['exec'], buckets=list(stats['exec']['buckets'])),
+                }
+                for name, stats in self._operations.items()
+            }
+            since = self._since
+            if reset:
+                self._operations = {}
+                self._since = datetime.now().isoformat()
+        
+        return {
+            'since': since,
+            'operations': {
+                name: {
+                    'count': stats['count'],
+                    'rows': stats['rows'],
+                    'lock_wait': self._summarize(stats['lock_wait'], stats['count']),
+                    'exec': self._summarize(stats['exec'], stats['count']),
+                }
+                for name, stats in sorted(operations.items())
+            },
+        }
+
+
+class _FlushBarrier:
+    """Marker queued by DatabaseManager.flush() to wait for pending writes"""
+    
+    def __init__(self):
+        self.done = Event()
+
+
+class _EventBatch:
+    """Rows of one table queued as a single write-behind item (DatabaseManager.log_events)"""
+    
+    def __init__(self, table: str, rows: List[tuple]):
+        self.table = table
+        self.rows = rows
+
+
+# Queued by close() to stop the write-behind thread after draining
+_STOP_WRITER = object()
+
 
 class DatabaseManager:
     """Centralized database manager for monitoring data"""
     
-    def __init__(self, db_path: Path, enable_encryption: bool = True):
+    # Inserted columns per event table (parameters built by the log_* methods,
+    # timestamp always first)
+    _EVENT_COLUMNS = {
+        'screenshots': (
+            'timestamp', 'filepath', 'file_size_bytes', 'resolution',
+            'active_window', 'active_app', 'ts'
+        ),
+        'clipboard_events': (
+            'timestamp', 'content_type', 'content_preview',
+            'encrypted_content', 'content_hash', 'source_app', 'ts'
+        ),
+        'app_usage': (
+            'timestamp', 'app_name', 'window_title', 'duration_seconds', 'ts'
+        ),
+        'system_events': (
+            'timestamp', 'event_type', 'severity', 'message', 'details', 'ts'
+        ),
+    }
+    
+    # Text columns stored as ids into a lookup table; the text column is
+    # left '' for encoded rows and the id goes in '<column>_id'
+    _DICT_COLUMNS = {
+        'screenshots': {'active_window': 'window_titles', 'active_app': 'app_names'},
+        'clipboard_events': {'source_app': 'app_names'},
+        'app_usage': {'app_name': 'app_names', 'window_title': 'window_titles'},
+    }
+    
+    DICTIONARIES = ('app_names', 'window_titles')
+    
+    # Schema v1 sync flags, superseded by sync_cursors and no longer updated
+    _LEGACY_SYNC_COLUMNS = ('synced', 'synced_at')
+    
+    # Columns actually inserted: the event columns plus the dictionary ids
+    _PHYSICAL_COLUMNS = {
+        'screenshots': _EVENT_COLUMNS['screenshots'] + ('active_window_id', 'active_app_id'),
+        'clipboard_events': _EVENT_COLUMNS['clipboard_events'] + ('source_app_id', 'content_id'),
+        'app_usage': _EVENT_COLUMNS['app_usage'] + ('app_name_id', 'window_title_id'),
+        'system_events': _EVENT_COLUMNS['system_events'],
+    }
+    
+    _INSERT_SQL = {
+        table: f"INSERT INTO {table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})"
+        for table, columns in _PHYSICAL_COLUMNS.items()
+    }
+    
+    # Approximate stored payload of a row: length of its text/blob values
+    # (matches _row_bytes() for rows built in Python)
+    _ROW_BYTES_SQL = {
+        table: ' + '.join(
+            f"(CASE WHEN typeof({c}) IN ('text', 'blob') THEN LENGTH({c}) ELSE 0 END)"
+            for c in columns
+        )
+        for table, columns in _EVENT_COLUMNS.items()
+    }
+    
+    # Full-text indexes (external content, maintained by triggers):
+    #   index -> (content table, indexed column)
+    SEARCH_INDEXES = {
+        'window_titles_fts': ('window_titles', 'value'),
+        'clipboard_events_fts': ('clipboard_events', 'content_preview'),
+    }
+    
+    # Searchable event tables -> (column, index); window titles are matched
+    # in the dictionary and joined to the rows through '<column>_id'
+    SEARCHABLE = {
+        'app_usage': ('window_title', 'window_titles_fts'),
+        'screenshots': ('active_window', 'window_titles_fts'),
+        'clipboard_events': ('content_preview', 'clipboard_events_fts'),
+    }
+    
+    # App usage rollup tables: granularity -> timestamp prefix length
+    ROLLUP_GRANULARITIES = {'hourly': 13, 'daily': 10}
+    
+    # Schema migrations in PRAGMA user_version order:
+    #   (version, description, startup step, background step)
+    # Steps are method names (or None) and must be idempotent: the startup
+    # step runs in one writer transaction, the background step on the
+    # db-migration thread in short chunks, returning False if interrupted.
+    # user_version only moves past a migration once both have finished.
+    MIGRATIONS = [
+        (1, 'synced columns', '_migrate_synced_columns', None),
+        (2, 'epoch-millisecond ts columns', '_migrate_epoch_ts', '_backfill_epoch_timestamps'),
+        (3, 'sync cursors', '_seed_sync_cursors', None),
+        (4, 'table statistics', '_seed_table_stats', '_build_table_stats'),
+        (5, 'dictionary-encoded text columns', '_migrate_dictionary_ids', '_backfill_dictionary_ids'),
+        (6, 'archive segment catalog', None, None),
+        (7, 'content-addressed clipboard store', '_migrate_content_ids', '_backfill_clipboard_content'),
+        (8, 'rollup title ids', '_migrate_rollup_title_ids', None),
+    ]
+    
+    # Durability modes (DB_DURABILITY): writer synchronous level, whether
+    # log_* calls are group-committed and over what window, and how often
+    # the WAL is checkpointed. With synchronous=NORMAL the WAL is only
+    # synced at checkpoints; with OFF never.
+    DURABILITY_MODES = {
+        # Every log_* call is committed and fsynced before it returns
+        'strict': {
+            'synchronous': 'FULL', 'write_behind': False,
+            'batch_max_ms': 0, 'checkpoint_interval': 10,
+        },
+        # Group commit; a process crash loses at most one batch window
+        'balanced': {
+            'synchronous': 'NORMAL', 'write_behind': True,
+            'batch_max_ms': 200, 'checkpoint_interval': 30,
+        },
+        # Longer batches and no fsync; power loss can lose recent commits
+        'throughput': {
+            'synchronous': 'OFF', 'write_behind': True,
+            'batch_max_ms': 1000, 'checkpoint_interval': 120,
+        },
+    }
+    
+    # How long log_* blocks on a full write-behind queue before dropping
+    WRITE_QUEUE_PUT_TIMEOUT = 5.0  # seconds
+    
+    def __init__(self, db_path: Path, enable_encryption: bool = True,
+                 reader_pool_size: int = Config.DB_READER_POOL_SIZE,
+                 reader_mmap_size: int = Config.DB_READER_MMAP_SIZE,
+                 durability: Optional[str] = None,
+                 write_behind: Optional[bool] = None,
+                 batch_max_rows: int = Config.DB_BATCH_MAX_ROWS,
+                 batch_max_ms: Optional[int] = None,
+                 write_queue_size: int = Config.DB_WRITE_QUEUE_SIZE,
+                 background_maintenance: bool = Config.DB_BACKGROUND_MAINTENANCE,
+                 partition_granularity: Optional[str] = Config.DB_PARTITION_GRANULARITY,
+                 app_usage_rollups: bool = Config.DB_APP_USAGE_ROLLUPS,
+                 dictionary_encoding: bool = Config.DB_DICTIONARY_ENCODING,
+                 archive_dir: Optional[Path] = Config.DB_ARCHIVE_DIR,
+                 full_text_search: bool = Config.DB_FULL_TEXT_SEARCH,
+                 clipboard_dedup: bool = Config.DB_CLIPBOARD_DEDUP):
         self.db_path = Path(db_path)
         self.enable_encryption = enable_encryption
+        self.app_usage_rollups = app_usage_rollups
+        self.dictionary_encoding = dictionary_encoding
+        self.full_text_search = full_text_search
+        self.clipboard_dedup = clipboard_dedup
         self.lock = Lock()
         
+        # Durability mode; explicit settings override the mode's defaults.
+        # Read from Config here, not as default arguments, so settings.json
+        # values loaded after import apply
+        if durability is None:
+            durability = Config.DB_DURABILITY
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.durability = durability
+        mode = self.DURABILITY_MODES[durability]
+        if write_behind is None:
+            write_behind = Config.DB_WRITE_BEHIND
+        if write_behind is None:
+            write_behind = mode['write_behind']
+        if batch_max_ms is None:
+            batch_max_ms = Config.DB_BATCH_MAX_MS
+        if batch_max_ms is None:
+            batch_max_ms = mode['batch_max_ms']
+        self.synchronous = mode['synchronous']
+        self.checkpoint_interval = Config.DB_CHECKPOINT_INTERVAL or mode['checkpoint_interval']
+        
+        # Lock wait / execution histograms per operation
+        self._timings = OperationTimings(Config.DB_SLOW_OPERATION_MS)
+        
+        # string -> id per lookup table, least recently used first
+        # (only touched with self.lock held)
+        self._dict_cache: Dict[str, "OrderedDict[str, int]"] = {
+            name: OrderedDict() for name in self.DICTIONARIES
+        }
+        self._dict_stats = {'hits': 0, 'misses': 0, 'created': 0}
+        # Ids handed out while _collect_dictionaries scans (None otherwise)
+        self._dict_in_use: Optional[Dict[str, set]] = None
+        
+        # content_hash -> clipboard_content id (same rules as _dict_cache)
+        self._content_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._content_stats = {'hits': 0, 'misses': 0, 'created': 0, 'bytes_deduplicated': 0}
+        
+        # Hashes whose payload is committed to clipboard_content, least
+        # recently seen first (see has_stored_payload); hashes given a
+        # payload by the open transaction wait in _pending_payloads
+        self._stored_payloads: "OrderedDict[str, None]" = OrderedDict()
+        self._stored_payloads_lock = Lock()
+        self._pending_payloads: List[str] = []
+        
+        # Columns returned by the read API per table (no *_id columns)
+        self._read_columns: Dict[str, List[str]] = {}
+        
+        # Write-behind (group commit) settings
+        self.write_behind = write_behind
+        self.batch_max_rows = max(1, batch_max_rows)
+        self.batch_max_ms = max(0, batch_max_ms)
+        self._write_queue: Optional[Queue] = None
+        self._writer_thread: Optional[Thread] = None
+        self._write_stats_lock = Lock()
+        self._write_stats = {
+            'rows_written': 0,
+            'batches_committed': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'batch_failures': 0,
+            'rows_failed': 0,
+            'rows_dropped': 0,
+            'queue_high_water': 0,
+        }
+        
+        # Retention job progress (resume positions survive between runs)
+        self._retention_lock = Lock()
+        self._retention_stats = {
+            'runs': 0,
+            'chunks': 0,
+            'last_run': None,
+            'last_run_seconds': 0.0,
+            'last_run_complete': True,
+            'rows_deleted': {},
+            'positions': {},
+            'remaining_ids': {},
+        }
+        
+        # Background maintenance tasks (incremental vacuum, ...)
+        self._maintenance_tasks: List[Dict[str, Any]] = []
+        self._maintenance_thread: Optional[Thread] = None
+        self._shutdown = Event()
+        
+        # Schema v2 background backfill; ts range queries wait for it
+        self._migration_thread: Optional[Thread] = None
+        self._ts_ready = False
+        self._vacuum_stats = {
+            'runs': 0,
+            'pages_reclaimed': 0,
+            'bytes_reclaimed': 0,
+            'last_run': None,
+        }
+        self._checkpoint_stats = {
+            'runs': {'PASSIVE': 0, 'RESTART': 0, 'TRUNCATE': 0},
+            'busy': 0,
+            'deferred': 0,
+            'last_run': None,
+            'last_mode': None,
+            'last_log_frames': 0,
+            'last_checkpointed_frames': 0,
+        }
+        
         # Ensure parent directory exists
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Initialize database schema
-        self._init_database()
+        # Long-lived connections shared by all operations; with the
+        # maintenance thread checkpointing, autocheckpoint is only a backstop
+        self._pool = ConnectionPool(
+            self.db_path,
+            max_readers=reader_pool_size,
+            wal_autocheckpoint=Config.DB_WAL_AUTOCHECKPOINT_PAGES if background_maintenance else 1000,
+            synchronous=self.synchronous,
+            reader_mmap_size=reader_mmap_size
+        )
+        
+        # Optional per-day/week shard files for the event tables
+        self._partitions: Optional[PartitionManager] = None
+        if partition_granularity:
+            self._partitions = PartitionManager(
+                self.db_path.parent / "partitions", partition_granularity,
+                synchronous=self.synchronous
+            )
+        
+        # Optional compressed segments for rows leaving the database
+        self._archive: Optional[ArchiveManager] = None
+        if archive_dir:
+            self._archive = ArchiveManager(
+                archive_dir,
+                block_rows=Config.DB_ARCHIVE_BLOCK_ROWS,
+                compression_level=Config.DB_ARCHIVE_COMPRESSION_LEVEL
+            )
         
-        # Run migrations
+        # Create/upgrade the schema (a single version check when current)
         self._run_migrations()
         
+        if self.full_text_search:
+            self._enable_search_index()
+        
+        # Start the background writer for write-behind mode
+        if self.write_behind:
+            self._write_queue = Queue(maxsize=max(1, write_queue_size))
+            self._writer_thread = Thread(
+                target=self._write_behind_loop,
+                name="db-writer",
+                daemon=True
+            )
+            self._writer_thread.start()
+            logger.info(
+                f"Write-behind enabled (batch {self.batch_max_rows} rows / "
+                f"{self.batch_max_ms} ms, queue {write_queue_size})"
+            )
+        
+        # Start periodic maintenance
+        if background_maintenance:
+            self._schedule_maintenance(
+                'incremental_vacuum', Config.DB_VACUUM_INTERVAL, self.reclaim_space
+            )
+            self._schedule_maintenance(
+                'wal_checkpoint', self.checkpoint_interval, self.checkpoint
+            )
+            self._maintenance_thread = Thread(
+                target=self._maintenance_loop,
+                name="db-maintenance",
+                daemon=True
+            )
+            self._maintenance_thread.start()
+        
         logger.info(f"Database initialized at {self.db_path}")
     
-    def _init_database(self):
-        """Initialize database schema"""
+    @contextmanager
+    def _writer(self, operation: str = 'write'):
+        """
+        Run a write transaction on the pooled writer connection
+        
+        Holds self.lock for the duration of the block, commits on success
+        and rolls back on error. The lock wait, the time the block held
+        the lock and the rows it changed are recorded under operation.
+        """
+        requested = time.perf_counter()
+        with self.lock:
+            acquired = time.perf_counter()
+            conn = self._pool.writer()
+            changes = conn.total_changes
+            try:
+                yield conn
+                conn.commit()
+                if self._pending_payloads:
+                    self._remember_payloads(self._pending_payloads)
+                    self._pending_payloads = []
+            except Exception:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+                # Ids interned in the rolled-back transaction no longer exist
+                for cache in self._dict_cache.values():
+                    cache.clear()
+                self._content_cache.clear()
+                self._pending_payloads = []
+                # ...nor catalog rows of shards it created
+                if self._partitions is not None:
+                    self._partitions.detach_writer(conn)
+                raise
+            finally:
+                self._timings.record(
+                    operation, acquired - requested, time.perf_counter() - acquired,
+                    conn.total_changes - changes
+                )
+    
+    @contextmanager
+    def _locked(self, operation: str):
+        """Hold self.lock for a block that manages the writer itself (timed like _writer)"""
+        requested = time.perf_counter()
         with self.lock:
+            acquired = time.perf_counter()
             try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
+                yield
+            finally:
+                self._timings.record(
+                    operation, acquired - requested, time.perf_counter() - acquired
+                )
+    
+    @contextmanager
+    def _timed(self, operation: str):
+        """Record the duration of a block that does not take the writer lock"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._timings.record(operation, 0.0, time.perf_counter() - start)
+    
+    def get_operation_timings(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Get latency histograms per operation
+        
+        lock_wait is the time spent waiting for the writer lock, exec the
+        time spent running with it held (or in total for reads); rows is
+        the number of rows changed, including by triggers.
+        
+        Args:
+            reset: Start new histograms after this snapshot
+        """
+        return self._timings.snapshot(reset)
+    
+    def _init_database(self):
+        """Initialize database schema"""
+        try:
+            # WAL mode and cache pragmas are applied when the pool opens the writer
+            with self._writer('schema') as conn:
                 cursor = conn.cursor()
                 
-                # Enable WAL mode for better concurrency
-                cursor.execute("PRAGMA journal_mode=WAL")
-                cursor.execute("PRAGMA synchronous=NORMAL")
-                cursor.execute("PRAGMA temp_store=MEMORY")
-                cursor.execute("PRAGMA cache_size=-64000")  # 64MB cache
+                # Switch older files to incremental auto-vacuum
+                self._ensure_incremental_vacuum(cursor)
                 
-                # Create tables
+                # Create tables (indexes follow migrations, which may add columns)
                 self._create_tables(cursor)
-                
-                # Create indexes
-                self._create_indexes(cursor)
-                
-                conn.commit()
-                conn.close()
-                
-                logger.info("Database schema initialized successfully")
-                
-            except sqlite3.Error as e:
-                logger.error(f"Database initialization failed: {e}", exc_info=True)
-                raise
+            
+            logger.info("Database schema initialized successfully")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Database initialization failed: {e}", exc_info=True)
+            raise
+    
+    def _ensure_incremental_vacuum(self, cursor):
+        """
+        One-time conversion of an existing file to auto_vacuum=INCREMENTAL
+        
+        Changing auto_vacuum on a file that already has tables requires a
+        full VACUUM. This runs once at startup before ingestion begins;
+        afterwards space is reclaimed with incremental_vacuum steps.
+        """
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:  # INCREMENTAL
+            return
+        
+        logger.info("Converting database to incremental auto-vacuum (one-time VACUUM)...")
+        start = time.monotonic()
+        
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+        
+        logger.info(f"Auto-vacuum conversion completed in {time.monotonic() - start:.1f}s")
     
     def _create_tables(self, cursor):
         """Create all required tables"""
@@ -73,11 +905,14 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS screenshots (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT NOT NULL,
+                ts INTEGER,
                 filepath TEXT NOT NULL,
                 file_size_bytes INTEGER,
                 resolution TEXT,
                 active_window TEXT,
                 active_app TEXT,
+                active_window_id INTEGER,
+                active_app_id INTEGER,
                 synced INTEGER DEFAULT 0,
                 synced_at TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
@@ -89,11 +924,13 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS clipboard_events (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT NOT NULL,
+                ts INTEGER,
                 content_type TEXT,
                 content_preview TEXT,
                 encrypted_content BLOB,
                 content_hash TEXT,
                 source_app TEXT,
+                source_app_id INTEGER,
                 synced INTEGER DEFAULT 0,
                 synced_at TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
@@ -105,9 +942,12 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS app_usage (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT NOT NULL,
+                ts INTEGER,
                 app_name TEXT NOT NULL,
                 window_title TEXT,
                 duration_seconds REAL,
+                app_name_id INTEGER,
+                window_title_id INTEGER,
                 synced INTEGER DEFAULT 0,
                 synced_at TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
@@ -119,6 +959,7 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS system_events (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp TEXT NOT NULL,
+                ts INTEGER,
                 event_type TEXT NOT NULL,
                 severity TEXT,
                 message TEXT,
@@ -126,6 +967,126 @@ class DatabaseManager:
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        
+        # Catalog of shard files (partitioned layout only)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS partitions (
+                table_name TEXT NOT NULL,
+                partition_key TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                period_end TEXT NOT NULL,
+                row_count INTEGER DEFAULT 0,
+                min_id INTEGER,
+                max_id INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (table_name, partition_key)
+            )
+        """)
+        
+        # Catalog of archive segment files; source is 'main' or a shard key
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archive_segments (
+                filepath TEXT PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                source TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                min_id INTEGER,
+                max_id INTEGER,
+                min_timestamp TEXT,
+                max_timestamp TEXT,
+                file_bytes INTEGER,
+                raw_bytes INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_archive_segments_range
+            ON archive_segments(table_name, min_timestamp)
+        """)
+        
+        # Clipboard payloads, one row per content_hash; ref_count is the
+        # number of clipboard_events rows pointing at it (content_id)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS clipboard_content (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL UNIQUE,
+                encrypted_content BLOB,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                first_seen TEXT,
+                last_seen TEXT
+            )
+        """)
+        
+        # Lookup tables for dictionary-encoded text columns
+        for dictionary in self.DICTIONARIES:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {dictionary} (
+                    id INTEGER PRIMARY KEY,
+                    value TEXT NOT NULL UNIQUE
+                )
+            """)
+        
+        # Highest row id acknowledged per table and sync destination
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_cursors (
+                table_name TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT,
+                PRIMARY KEY (table_name, destination)
+            )
+        """)
+        
+        # Running per-table counters, kept in step with inserts/deletes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_stats (
+                table_name TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                unsynced_count INTEGER NOT NULL DEFAULT 0,
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                oldest_timestamp TEXT,
+                newest_timestamp TEXT,
+                verified_at TEXT
+            )
+        """)
+        
+        # App usage rollups; bucket is 'YYYY-MM-DDTHH' (hour) or 'YYYY-MM-DD' (day)
+        for granularity in self.ROLLUP_GRANULARITIES:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS app_usage_{granularity} (
+                    app_name TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    total_seconds REAL NOT NULL DEFAULT 0,
+                    session_count INTEGER NOT NULL DEFAULT 0,
+                    distinct_titles INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (app_name, bucket)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_app_usage_{granularity}_bucket
+                ON app_usage_{granularity}(bucket)
+            """)
+        
+        self._create_rollup_titles_table(cursor)
+    
+    @staticmethod
+    def _create_rollup_titles_table(cursor):
+        """
+        Window title ids seen per rollup bucket and app (for distinct_titles)
+        
+        Only open and recently closed buckets are kept (see
+        _prune_rollup_titles); distinct_titles holds the count after that.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS app_usage_rollup_titles (
+                bucket TEXT NOT NULL,
+                app_name TEXT NOT NULL,
+                window_title_id INTEGER NOT NULL,
+                PRIMARY KEY (bucket, app_name, window_title_id)
+            ) WITHOUT ROWID
+        """)
     
     def _create_indexes(self, cursor):
         """Create indexes for better query performance"""
@@ -137,13 +1098,8 @@ class DatabaseManager:
         """)
         
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_screenshots_app 
-            ON screenshots(active_app)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_screenshots_synced 
-            ON screenshots(synced)
+            CREATE INDEX IF NOT EXISTS idx_screenshots_app_id 
+            ON screenshots(active_app_id)
         """)
         
         # Clipboard events indexes
@@ -157,11 +1113,6 @@ class DatabaseManager:
             ON clipboard_events(content_type)
         """)
         
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_clipboard_synced 
-            ON clipboard_events(synced)
-        """)
-        
         # App usage indexes
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_app_usage_timestamp 
@@ -169,13 +1120,8 @@ class DatabaseManager:
         """)
         
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_app_usage_name 
-            ON app_usage(app_name)
-        """)
-        
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_app_usage_synced 
-            ON app_usage(synced)
+            CREATE INDEX IF NOT EXISTS idx_app_usage_app_id 
+            ON app_usage(app_name_id)
         """)
         
         # System events indexes
@@ -189,258 +1135,2918 @@ class DatabaseManager:
             ON system_events(event_type)
         """)
     
+    def _enable_search_index(self):
+        """Create the FTS5 indexes and their triggers if they do not exist yet"""
+        if not self.dictionary_encoding:
+            logger.warning("Window title search only covers dictionary-encoded rows")
+        
+        try:
+            with self._writer('schema') as conn:
+                created = self._create_search_index(conn.cursor())
+                populated = [
+                    name for name in created
+                    if conn.execute(
+                        f"SELECT 1 FROM {self.SEARCH_INDEXES[name][0]} LIMIT 1"
+                    ).fetchone()
+                ]
+        except sqlite3.Error as e:
+            logger.error(f"Error creating full-text indexes: {e}", exc_info=True)
+            return
+        
+        if populated:
+            logger.warning(
+                f"Full-text indexes {populated} created empty over existing rows; "
+                f"run rebuild_search_index() to index them"
+            )
+    
+    def _create_search_index(self, cursor) -> List[str]:
+        """
+        Create the external-content FTS5 tables, their triggers and the
+        dictionary id indexes title search joins on
+        
+        Returns:
+            Names of the indexes that did not exist before
+        """
+        created = []
+        for name, (content, column) in self.SEARCH_INDEXES.items():
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            )
+            if cursor.fetchone() is None:
+                created.append(name)
+            
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {name}
+                USING fts5({column}, content='{content}', content_rowid='id')
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {content}
+                BEGIN
+                    INSERT INTO {name} (rowid, {column}) VALUES (new.id, new.{column});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {content}
+                BEGIN
+                    INSERT INTO {name} ({name}, rowid, {column})
+                    VALUES ('delete', old.id, old.{column});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF {column} ON {content}
+                BEGIN
+                    INSERT INTO {name} ({name}, rowid, {column})
+                    VALUES ('delete', old.id, old.{column});
+                    INSERT INTO {name} (rowid, {column}) VALUES (new.id, new.{column});
+                END
+            """)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_screenshots_window_id
+            ON screenshots(active_window_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_app_usage_title_id
+            ON app_usage(window_title_id)
+        """)
+        return created
+    
+    def _create_ts_indexes(self, cursor):
+        """
+        Create epoch-timestamp indexes (schema v2)
+        
+        The synced-flag indexes (standalone and the v2 partial ones) are
+        dropped: since v3 the sync backlog is read by id from the cursor.
+        """
+        for table in self._EVENT_COLUMNS:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(ts)")
+        
+        for index in ('idx_screenshots_synced', 'idx_clipboard_synced',
+                      'idx_app_usage_synced', 'idx_clipboard_events_synced',
+                      'idx_screenshots_unsynced', 'idx_clipboard_events_unsynced',
+                      'idx_app_usage_unsynced'):
+            cursor.execute(f"DROP INDEX IF EXISTS {index}")
+    
     def _run_migrations(self):
         """
-        NEW: Run database migrations
+        Bring the schema up to SCHEMA_VERSION
         
-        This adds the 'synced' and 'synced_at' columns to existing databases
-        that were created with the old schema
+        When the file is current this is one PRAGMA user_version read.
+        Otherwise the tables are created, the pending MIGRATIONS' startup
+        steps run in order, and their background steps are handed to the
+        db-migration thread. Each migration's duration is recorded as a
+        'schema_migration' system event.
         """
-        with self.lock:
-            try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
-                cursor = conn.cursor()
-                
-                # Check if migrations are needed
-                tables_to_migrate = ['screenshots', 'clipboard_events', 'app_usage']
-                
-                for table in tables_to_migrate:
-                    # Check if synced column exists
-                    cursor.execute(f"PRAGMA table_info({table})")
-                    columns = [col[1] for col in cursor.fetchall()]
-                    
-                    if 'synced' not in columns:
-                        logger.info(f"Adding synced columns to {table}")
-                        cursor.execute(f"""
-                            ALTER TABLE {table} 
-                            ADD COLUMN synced INTEGER DEFAULT 0
-                        """)
-                        cursor.execute(f"""
-                            ALTER TABLE {table} 
-                            ADD COLUMN synced_at TEXT
-                        """)
-                        
-                        # Create index
-                        cursor.execute(f"""
-                            CREATE INDEX IF NOT EXISTS idx_{table}_synced 
-                            ON {table}(synced)
-                        """)
-                
-                conn.commit()
-                conn.close()
+        with self._writer('migration') as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        
+        if version >= SCHEMA_VERSION:
+            self._ts_ready = True
+            return
+        
+        logger.info(f"Upgrading database schema from version {version} to {SCHEMA_VERSION}")
+        self._init_database()
+        
+        pending = [m for m in self.MIGRATIONS if m[0] > version]
+        background = []
+        
+        try:
+            for number, description, step, background_step in pending:
+                start = time.monotonic()
+                if step:
+                    with self._writer('migration') as conn:
+                        getattr(self, step)(conn)
+                elapsed = time.monotonic() - start
                 
-            except sqlite3.Error as e:
-                logger.error(f"Migration error: {e}", exc_info=True)
+                if background_step:
+                    background.append((number, description, background_step, elapsed))
+                else:
+                    self._record_migration(number, description, elapsed)
+            
+            with self._writer('migration') as conn:
+                cursor = conn.cursor()
+                self._create_indexes(cursor)
+                self._create_views(cursor)
+                if version >= 2:
+                    self._create_ts_indexes(cursor)
+                if not background:
+                    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Migration error: {e}", exc_info=True)
+            return
+        
+        if version >= 2:
+            self._ts_ready = True
+        
+        if background:
+            self._migration_thread = Thread(
+                target=self._run_background_migrations,
+                args=(background,),
+                name="db-migration",
+                daemon=True
+            )
+            self._migration_thread.start()
     
-    def log_screenshot(self, data: Dict[str, Any]):
-        """Log screenshot metadata"""
-        with self.lock:
+    def _run_background_migrations(self, steps: List[tuple]):
+        """
+        Run the long migration steps in order, raising user_version as they finish
+        
+        After a step completes, the version moves up to just below the next
+        pending background step (startup steps of later migrations have
+        already run). An interrupted or failed step leaves the version
+        where it is, so the work resumes on the next start.
+        """
+        for index, (number, description, step, startup_seconds) in enumerate(steps):
+            start = time.monotonic()
+            if not getattr(self, step)():
+                return
+            elapsed = startup_seconds + time.monotonic() - start
+            
+            reached = steps[index + 1][0] - 1 if index + 1 < len(steps) else SCHEMA_VERSION
             try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT INTO screenshots (
-                        timestamp, filepath, file_size_bytes, resolution,
-                        active_window, active_app
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    data.get('timestamp'),
-                    data.get('filepath'),
-                    data.get('file_size_bytes'),
-                    data.get('resolution'),
-                    data.get('active_window'),
-                    data.get('active_app')
-                ))
-                
-                conn.commit()
-                conn.close()
-                
-                logger.debug(f"Logged screenshot: {data.get('filepath')}")
-                
+                with self._writer('migration') as conn:
+                    conn.execute(f"PRAGMA user_version = {reached}")
             except sqlite3.Error as e:
-                logger.error(f"Error logging screenshot: {e}")
+                logger.error(f"Error recording schema version: {e}", exc_info=True)
+                return
+            
+            self._record_migration(number, description, elapsed, background=True)
+        
+        logger.info(f"Database schema is at version {SCHEMA_VERSION}")
     
-    def log_clipboard_event(self, data: Dict[str, Any]):
-        """Log clipboard event"""
-        with self.lock:
-            try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
-                cursor = conn.cursor()
+    def _record_migration(self, number: int, description: str, seconds: float,
+                          background: bool = False):
+        """Log a finished migration and record it in system_events"""
+        logger.info(f"Schema migration {number} ({description}) applied in {seconds:.2f}s")
+        self._insert_events_bulk('system_events', [self._system_event_row(
+            'schema_migration',
+            'INFO',
+            f'Schema migration {number} applied: {description}',
+            {
+                'version': number,
+                'description': description,
+                'duration_seconds': round(seconds, 3),
+                'background': background,
+            }
+        )])
+    
+    def _migrate_synced_columns(self, conn: sqlite3.Connection):
+        """Schema v1: add 'synced' and 'synced_at' to tables from the old schema"""
+        for table in SYNCED_TABLES:
+            # Check if synced column exists
+            columns = [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+            
+            if 'synced' not in columns:
+                logger.info(f"Adding synced columns to {table}")
+                conn.execute(f"""
+                    ALTER TABLE {table} 
+                    ADD COLUMN synced INTEGER DEFAULT 0
+                """)
+                conn.execute(f"""
+                    ALTER TABLE {table} 
+                    ADD COLUMN synced_at TEXT
+                """)
+    
+    def _migrate_epoch_ts(self, conn: sqlite3.Connection):
+        """Schema v2: add the epoch-millisecond 'ts' column (filled in the background)"""
+        for table in self._EVENT_COLUMNS:
+            columns = [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+            
+            if 'ts' not in columns:
+                logger.info(f"Adding epoch timestamp column to {table}")
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN ts INTEGER")
+    
+    def _seed_table_stats(self, conn: sqlite3.Connection):
+        """Schema v4: create the counter rows; inserts count from here on"""
+        conn.executemany(
+            "INSERT OR IGNORE INTO table_stats (table_name) VALUES (?)",
+            [(table,) for table in self._EVENT_COLUMNS]
+        )
+    
+    def _build_table_stats(self) -> bool:
+        """
+        Schema v4: fill table_stats with one full count
+        
+        Until this finishes, counters only reflect rows inserted since
+        startup; the count (taken with writers held off) replaces them.
+        """
+        try:
+            self._reconcile_statistics()
+        except sqlite3.Error as e:
+            logger.error(f"Error building table statistics: {e}", exc_info=True)
+            return False
+        return True
+    
+    def _migrate_dictionary_ids(self, conn: sqlite3.Connection):
+        """Schema v5: add the dictionary id columns (rows encoded in the background)"""
+        for table, encoded in self._DICT_COLUMNS.items():
+            columns = [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+            
+            for column in encoded:
+                if f"{column}_id" not in columns:
+                    logger.info(f"Adding {column}_id column to {table}")
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}_id INTEGER")
+        
+        # Text indexes replaced by the id indexes
+        conn.execute("DROP INDEX IF EXISTS idx_screenshots_app")
+        conn.execute("DROP INDEX IF EXISTS idx_app_usage_name")
+    
+    def _migrate_content_ids(self, conn: sqlite3.Connection):
+        """Schema v7: add clipboard_events.content_id (payloads moved in the background)"""
+        columns = [col[1] for col in conn.execute("PRAGMA table_info(clipboard_events)")]
+        if 'content_id' not in columns:
+            logger.info("Adding content_id column to clipboard_events")
+            conn.execute("ALTER TABLE clipboard_events ADD COLUMN content_id INTEGER")
+    
+    def _migrate_rollup_title_ids(self, conn: sqlite3.Connection):
+        """
+        Schema v8: rollup title sets reference window_titles ids
+        
+        Title text of buckets that are already prunable is dropped with
+        the old table.
+        """
+        columns = [col[1] for col in conn.execute("PRAGMA table_info(app_usage_rollup_titles)")]
+        if 'window_title_id' in columns:
+            return
+        
+        logger.info("Converting app_usage_rollup_titles to window title ids")
+        keep_from = self._rollup_titles_cutoff()
+        conn.execute("ALTER TABLE app_usage_rollup_titles RENAME TO app_usage_rollup_titles_v7")
+        self._create_rollup_titles_table(conn.cursor())
+        conn.execute("""
+            INSERT OR IGNORE INTO window_titles (value)
+            SELECT DISTINCT window_title FROM app_usage_rollup_titles_v7 WHERE bucket >= ?
+        """, (keep_from,))
+        conn.execute("""
+            INSERT OR IGNORE INTO app_usage_rollup_titles (bucket, app_name, window_title_id)
+            SELECT o.bucket, o.app_name, d.id
+            FROM app_usage_rollup_titles_v7 o
+            JOIN window_titles d ON d.value = o.window_title
+            WHERE o.bucket >= ?
+        """, (keep_from,))
+        conn.execute("DROP TABLE app_usage_rollup_titles_v7")
+    
+    def _create_views(self, cursor):
+        """(Re)create the *_view views that decode dictionary-encoded columns"""
+        for table in self._DICT_COLUMNS:
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [
+                col[1] for col in cursor.fetchall()
+                if col[1] not in self._id_columns(table)
+            ]
+            cursor.execute(f"DROP VIEW IF EXISTS {table}_view")
+            cursor.execute(
+                f"CREATE VIEW {table}_view AS "
+                + self._decoded_select(table, table, columns, schema_prefix=False)
+            )
+    
+    def _id_columns(self, table: str) -> List[str]:
+        """Physical id columns (dictionary ids, content_id) hidden from readers"""
+        columns = [f"{c}_id" for c in self._DICT_COLUMNS.get(table, {})]
+        if table == 'clipboard_events':
+            columns.append('content_id')
+        return columns
+    
+    def _get_read_columns(self, table: str) -> List[str]:
+        """
+        Column list of a table as seen through the read API
+        
+        Leaves out the *_id columns and the legacy synced/synced_at flags,
+        which stopped being updated when sync progress moved to
+        sync_cursors (get_sync_cursor tells what a destination has).
+        """
+        columns = self._read_columns.get(table)
+        if columns is None:
+            hidden = set(self._id_columns(table)) | set(self._LEGACY_SYNC_COLUMNS)
+            with self._pool.reader() as conn:
+                columns = [
+                    row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")
+                    if row[1] not in hidden
+                ]
+            self._read_columns[table] = columns
+        return columns
+    
+    def _decoded_select(self, table: str, source: str, columns: List[str],
+                        schema_prefix: bool = True) -> str:
+        """
+        Build "SELECT ... FROM source t" with encoded columns decoded
+        
+        Rows written before encoding (or with encoding off) have no id and
+        keep their text; clipboard payloads are read from clipboard_content
+        the same way. Callers qualify their own conditions with 't.'.
+        """
+        encoded = self._DICT_COLUMNS.get(table, {})
+        prefix = "main." if schema_prefix else ""
+        expressions, joins = [], []
+        for column in columns:
+            if table == 'clipboard_events' and column == 'encrypted_content':
+                expressions.append(
+                    "CASE WHEN t.content_id IS NULL THEN t.encrypted_content "
+                    "ELSE c.encrypted_content END AS encrypted_content"
+                )
+                joins.append(f"LEFT JOIN {prefix}clipboard_content c ON c.id = t.content_id")
+            elif column in encoded:
+                alias = f"d_{column}"
+                expressions.append(
+                    f"CASE WHEN t.{column}_id IS NULL THEN t.{column} "
+                    f"ELSE {alias}.value END AS {column}"
+                )
+                joins.append(
+                    f"LEFT JOIN {prefix}{encoded[column]} {alias} ON {alias}.id = t.{column}_id"
+                )
+            else:
+                expressions.append(f"t.{column}")
+        return f"SELECT {', '.join(expressions)} FROM {source} t {' '.join(joins)}"
+    
+    def _seed_sync_cursors(self, conn: sqlite3.Connection):
+        """
+        Schema v3: start each table's default cursor below its first unsynced row
+        
+        Rows above that point that were already flagged synced are sent
+        again once; the server side treats uploads as at-least-once.
+        """
+        # Shards are attached while reading, before the first INSERT opens the transaction
+        seeds = []
+        for table in SYNCED_TABLES:
+            if conn.execute(
+                "SELECT 1 FROM sync_cursors WHERE table_name = ? AND destination = ?",
+                (table, DEFAULT_SYNC_DESTINATION)
+            ).fetchone():
+                continue
+            
+            sources = [f"main.{table}"]
+            if self._partitions is not None:
+                for partition in self._partitions.list_partitions(conn, table):
+                    key = partition['partition_key']
+                    self._partitions.prepare_writer(conn, table, [key])
+                    sources.append(f"{self._partitions.schema_name(table, key)}.{table}")
+            
+            first_unsynced = min(
+                (
+                    row[0] for row in (
+                        conn.execute(
+                            f"SELECT MIN(id) FROM {source} WHERE synced IS NOT 1"
+                        ).fetchone()
+                        for source in sources
+                    )
+                    if row[0] is not None
+                ),
+                default=None
+            )
+            
+            if first_unsynced is None:
+                row = conn.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+                ).fetchone()
+                last_id = row[0] if row else 0
+            else:
+                last_id = first_unsynced - 1
+            seeds.append((table, last_id))
+        
+        for table, last_id in seeds:
+            conn.execute("""
+                INSERT INTO sync_cursors (table_name, destination, last_id, updated_at)
+                VALUES (?, ?, ?, ?)
+            """, (table, DEFAULT_SYNC_DESTINATION, last_id, datetime.now().isoformat()))
+            logger.info(f"Sync cursor for {table} starts after id {last_id}")
+    
+    def _backfill_epoch_timestamps(self):
+        """
+        Background part of schema v2
+        
+        Fills 'ts' (and normalizes legacy NULL synced flags to 0) in id-range
+        chunks, yielding the writer lock between chunks, then builds the
+        ts indexes and records the new schema version. Interrupted runs
+        resume on the next start because only rows with NULLs are touched.
+        """
+        logger.info("Schema v2 migration: backfilling epoch timestamps in background")
+        start = time.monotonic()
+        chunk = Config.DB_MIGRATION_CHUNK_ROWS
+        updated = 0
+        
+        try:
+            for table in self._EVENT_COLUMNS:
+                with self._pool.reader() as conn:
+                    min_id, max_id = conn.execute(
+                        f"SELECT MIN(id), MAX(id) FROM main.{table}"
+                    ).fetchone()
                 
-                cursor.execute("""
-                    INSERT INTO clipboard_events (
-                        timestamp, content_type, content_preview,
-                        encrypted_content, content_hash, source_app
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    data.get('timestamp'),
-                    data.get('content_type'),
-                    data.get('content_preview'),
-                    data.get('encrypted_content'),
-                    data.get('content_hash'),
-                    data.get('source_app')
-                ))
+                if max_id is None:
+                    continue
                 
-                conn.commit()
-                conn.close()
+                if table in SYNCED_TABLES:
+                    sql = f"""
+                        UPDATE main.{table}
+                        SET ts = COALESCE(ts, iso_to_epoch_ms(timestamp)),
+                            synced = COALESCE(synced, 0)
+                        WHERE id >= ? AND id < ? AND (ts IS NULL OR synced IS NULL)
+                    """
+                else:
+                    sql = f"""
+                        UPDATE main.{table} SET ts = iso_to_epoch_ms(timestamp)
+                        WHERE id >= ? AND id < ? AND ts IS NULL
+                    """
                 
-                logger.debug(f"Logged clipboard event: {data.get('content_type')}")
+                next_id = min_id
+                while next_id <= max_id:
+                    with self._writer('migration') as conn:
+                        updated += conn.execute(sql, (next_id, next_id + chunk)).rowcount
+                    next_id += chunk
+                    
+                    if self._shutdown.wait(Config.DB_MIGRATION_CHUNK_PAUSE):
+                        logger.info("Schema v2 migration interrupted, will resume on next start")
+                        return False
+            
+            # Shards gain and fill the column when attached
+            if self._partitions is not None:
+                with self._pool.reader() as conn:
+                    catalog = self._partitions.list_partitions(conn)
+                for partition in catalog:
+                    with self._locked('migration'):
+                        self._partitions.prepare_writer(
+                            self._pool.writer(),
+                            partition['table_name'],
+                            [partition['partition_key']]
+                        )
+            
+            with self._writer('migration') as conn:
+                self._create_ts_indexes(conn.cursor())
+            
+        except sqlite3.Error as e:
+            logger.error(f"Schema v2 migration failed: {e}", exc_info=True)
+            return False
+        
+        self._ts_ready = True
+        elapsed = time.monotonic() - start
+        logger.info(f"Schema v2 migration complete: {updated} rows in {elapsed:.1f}s")
+        return True
+    
+    def _backfill_dictionary_ids(self) -> bool:
+        """
+        Background part of schema v5: encode existing rows
+        
+        Moves app names and window titles of rows written before v5 into
+        the lookup tables in id-range chunks (shards included), leaving ''
+        in the text columns. Freed space is returned by incremental vacuum.
+        """
+        logger.info("Schema v5 migration: dictionary-encoding existing rows in background")
+        start = time.monotonic()
+        chunk = Config.DB_MIGRATION_CHUNK_ROWS
+        updated = 0
+        
+        try:
+            sources = [(table, None) for table in self._DICT_COLUMNS]
+            if self._partitions is not None:
+                with self._pool.reader() as conn:
+                    sources += [
+                        (p['table_name'], p['partition_key'])
+                        for p in self._partitions.list_partitions(conn)
+                        if p['table_name'] in self._DICT_COLUMNS
+                    ]
+            
+            for table, key in sources:
+                encoded = list(self._DICT_COLUMNS[table])
+                pending = ' OR '.join(
+                    f"({c}_id IS NULL AND {c} IS NOT NULL AND {c} != '')" for c in encoded
+                )
+                assignments = ', '.join(f"{c} = ?, {c}_id = ?" for c in encoded)
                 
-            except sqlite3.Error as e:
-                logger.error(f"Error logging clipboard event: {e}")
+                with self._locked('migration'):
+                    conn = self._pool.writer()
+                    if key is not None:
+                        self._partitions.prepare_writer(conn, table, [key])
+                    source = f"{'main' if key is None else self._partitions.schema_name(table, key)}.{table}"
+                    min_id, max_id = conn.execute(
+                        f"SELECT MIN(id), MAX(id) FROM {source}"
+                    ).fetchone()
+                
+                if max_id is None:
+                    continue
+                
+                next_id = min_id
+                while next_id <= max_id:
+                    with self._writer('migration') as conn:
+                        if key is not None:
+                            self._partitions.prepare_writer(conn, table, [key])
+                        rows = conn.execute(
+                            f"SELECT id, {', '.join(encoded)} FROM {source} "
+                            f"WHERE id >= ? AND id < ? AND ({pending})",
+                            (next_id, next_id + chunk)
+                        ).fetchall()
+                        
+                        params = []
+                        moved_bytes = 0
+                        for row in rows:
+                            values = []
+                            for column, value in zip(encoded, row[1:]):
+                                text, value_id = self._encode_value(
+                                    conn, self._DICT_COLUMNS[table][column], value
+                                )
+                                if value_id is not None:
+                                    moved_bytes += len(value)
+                                values += [text, value_id]
+                            params.append(tuple(values) + (row[0],))
+                        conn.executemany(
+                            f"UPDATE {source} SET {assignments} WHERE id = ?", params
+                        )
+                        # Text payload moved out of the rows
+                        conn.execute("""
+                            UPDATE table_stats SET total_bytes = MAX(0, total_bytes - ?)
+                            WHERE table_name = ?
+                        """, (moved_bytes, table))
+                        updated += len(params)
+                    next_id += chunk
+                    
+                    if self._shutdown.wait(Config.DB_MIGRATION_CHUNK_PAUSE):
+                        logger.info("Schema v5 migration interrupted, will resume on next start")
+                        return False
+            
+        except sqlite3.Error as e:
+            logger.error(f"Schema v5 migration failed: {e}", exc_info=True)
+            return False
+        
+        elapsed = time.monotonic() - start
+        logger.info(f"Schema v5 migration complete: {updated} rows in {elapsed:.1f}s")
+        return True
     
-    def log_app_usage(self, data: Dict[str, Any]):
-        """Log application usage"""
-        with self.lock:
-            try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
-                cursor = conn.cursor()
+    def _backfill_clipboard_content(self) -> bool:
+        """
+        Background part of schema v7: move existing clipboard payloads
+        
+        Rows written before v7 take a reference on clipboard_content (the
+        first payload per hash is kept) in id-range chunks, shards
+        included; their inline encrypted_content is cleared.
+        """
+        if not self.clipboard_dedup:
+            return True
+        
+        logger.info("Schema v7 migration: moving clipboard payloads to clipboard_content in background")
+        start = time.monotonic()
+        chunk = Config.DB_MIGRATION_CHUNK_ROWS
+        updated = 0
+        
+        try:
+            keys = [None]
+            if self._partitions is not None:
+                with self._pool.reader() as conn:
+                    keys += [
+                        p['partition_key']
+                        for p in self._partitions.list_partitions(conn, 'clipboard_events')
+                    ]
+            
+            for key in keys:
+                with self._locked('migration'):
+                    conn = self._pool.writer()
+                    if key is not None:
+                        self._partitions.prepare_writer(conn, 'clipboard_events', [key])
+                    schema = 'main' if key is None else self._partitions.schema_name('clipboard_events', key)
+                    source = f"{schema}.clipboard_events"
+                    min_id, max_id = conn.execute(
+                        f"SELECT MIN(id), MAX(id) FROM {source}"
+                    ).fetchone()
                 
-                cursor.execute("""
-                    INSERT INTO app_usage (
-                        timestamp, app_name, window_title, duration_seconds
-                    ) VALUES (?, ?, ?, ?)
-                """, (
-                    data.get('timestamp'),
-                    data.get('app_name'),
-                    data.get('window_title'),
-                    data.get('duration_seconds')
-                ))
+                if max_id is None:
+                    continue
                 
-                conn.commit()
-                conn.close()
+                next_id = min_id
+                while next_id <= max_id:
+                    with self._writer('migration') as conn:
+                        if key is not None:
+                            self._partitions.prepare_writer(conn, 'clipboard_events', [key])
+                        rows = conn.execute(
+                            f"SELECT id, content_hash, encrypted_content, timestamp FROM {source} "
+                            f"WHERE id >= ? AND id < ? AND content_id IS NULL AND content_hash IS NOT NULL",
+                            (next_id, next_id + chunk)
+                        ).fetchall()
+                        
+                        params = []
+                        moved_bytes = 0
+                        for row_id, content_hash, content, timestamp in rows:
+                            content_id = self._reference_content(conn, content_hash, content, timestamp)
+                            moved_bytes += len(content or b'')
+                            params.append((content_id, row_id))
+                        conn.executemany(
+                            f"UPDATE {source} SET encrypted_content = NULL, content_id = ? WHERE id = ?",
+                            params
+                        )
+                        # Payload moved out of the rows
+                        conn.execute("""
+                            UPDATE table_stats SET total_bytes = MAX(0, total_bytes - ?)
+                            WHERE table_name = 'clipboard_events'
+                        """, (moved_bytes,))
+                        updated += len(params)
+                    next_id += chunk
+                    
+                    if self._shutdown.wait(Config.DB_MIGRATION_CHUNK_PAUSE):
+                        logger.info("Schema v7 migration interrupted, will resume on next start")
+                        return False
+        
+        except sqlite3.Error as e:
+            logger.error(f"Schema v7 migration failed: {e}", exc_info=True)
+            return False
+        
+        elapsed = time.monotonic() - start
+        logger.info(f"Schema v7 migration complete: {updated} rows in {elapsed:.1f}s")
+        return True
+    
+    def _insert_event(self, table: str, params: tuple):
+        """
+        Insert one event row
+        
+        In write-behind mode the row is queued for the background writer,
+        otherwise it is committed immediately.
+        """
+        if self._write_queue is None:
+            with self._writer('insert') as conn:
+                self._store_rows(conn, {table: [params]})
+            return
+        
+        self._enqueue((table, params))
+    
+    def _enqueue(self, item, rows: int = 1):
+        """Put an item on the write-behind queue, blocking while it is full"""
+        try:
+            self._write_queue.put(item, timeout=self.WRITE_QUEUE_PUT_TIMEOUT)
+        except Full:
+            with self._write_stats_lock:
+                self._write_stats['rows_dropped'] += rows
+            logger.warning(f"Write-behind queue full, dropping {rows} event(s)")
+            return
+        
+        depth = self._write_queue.qsize()
+        with self._write_stats_lock:
+            if depth > self._write_stats['queue_high_water']:
+                self._write_stats['queue_high_water'] = depth
+    
+    def _write_behind_loop(self):
+        """Drain the write queue into multi-row transactions"""
+        logger.info("Write-behind thread started")
+        
+        stopping = False
+        while not stopping:
+            item = self._write_queue.get()
+            batch = []
+            barriers = []
+            
+            # Collect rows until the batch is full or the window expires
+            deadline = time.monotonic() + self.batch_max_ms / 1000.0
+            while True:
+                if item is _STOP_WRITER:
+                    stopping = True
+                elif isinstance(item, _FlushBarrier):
+                    barriers.append(item)
+                elif isinstance(item, _EventBatch):
+                    batch.extend((item.table, row) for row in item.rows)
+                else:
+                    batch.append(item)
                 
-                logger.debug(f"Logged app usage: {data.get('app_name')}")
+                if stopping or barriers or len(batch) >= self.batch_max_rows:
+                    break
                 
-            except sqlite3.Error as e:
-                logger.error(f"Error logging app usage: {e}")
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._write_queue.get(timeout=remaining)
+                    else:
+                        # Window expired - still take rows that are already queued
+                        item = self._write_queue.get_nowait()
+                except Empty:
+                    break
+            
+            if stopping:
+                # Drain whatever is still queued before exiting
+                while True:
+                    try:
+                        item = self._write_queue.get_nowait()
+                    except Empty:
+                        break
+                    if isinstance(item, _FlushBarrier):
+                        barriers.append(item)
+                    elif isinstance(item, _EventBatch):
+                        batch.extend((item.table, row) for row in item.rows)
+                    elif item is not _STOP_WRITER:
+                        batch.append(item)
+            
+            if batch:
+                self._commit_batch(batch)
+            
+            for barrier in barriers:
+                barrier.done.set()
+        
+        logger.info("Write-behind thread stopped")
+    
+    def _store_rows(self, conn: sqlite3.Connection,
+                    grouped: Dict[str, List[tuple]]) -> Dict[str, List[int]]:
+        """
+        Insert rows for one or more tables on the writer connection
+        
+        Must be called before anything else is written in the transaction:
+        the shards the rows need are attached first (at most
+        MAX_WRITER_ATTACHED, see _shard_groups), so the whole call commits
+        or rolls back with the caller's transaction.
+        
+        Returns:
+            Inserted row ids per table, in input order
+        """
+        plans = {}
+        if self._partitions is not None:
+            plans = {
+                table: self._partitions.plan(table, rows)
+                for table, rows in grouped.items()
+                if table in PartitionManager.PARTITIONED_TABLES
+            }
+            self._partitions.prepare_writer_shards(
+                conn, [(table, key) for table, plan in plans.items() for key in plan]
+            )
+        
+        ids = {}
+        stored = {}
+        for table, rows in grouped.items():
+            rows = stored[table] = self._encode_rows(conn, table, rows)
+            
+            if table in plans:
+                table_ids = [0] * len(rows)
+                for index, row_id in self._partitions.insert_rows(
+                    conn, table, self._PHYSICAL_COLUMNS[table], rows, plans[table]
+                ).items():
+                    table_ids[index] = row_id
+                ids[table] = table_ids
+                continue
+            
+            conn.executemany(self._INSERT_SQL[table], rows)
+            # AUTOINCREMENT ids are contiguous while the writer lock is held
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            ids[table] = list(range(last_id - len(rows) + 1, last_id + 1))
+        
+        for table, rows in stored.items():
+            self._count_inserted(conn, table, rows)
+        
+        if self.app_usage_rollups and grouped.get('app_usage'):
+            self._update_app_usage_rollups(conn, grouped['app_usage'])
+        
+        return ids
+    
+    def _shard_groups(self, grouped: Dict[str, List[tuple]]) -> List[Dict[str, List[int]]]:
+        """
+        Split rows into groups that can each be stored in one transaction
+        
+        A transaction can only use shards attached before it starts, so
+        rows spanning more than MAX_WRITER_ATTACHED shards are split by
+        shard (main-table rows go with the first group).
+        
+        Returns:
+            Row indexes per table for each group
+        """
+        everything = {table: list(range(len(rows))) for table, rows in grouped.items()}
+        if self._partitions is None:
+            return [everything]
+        
+        plans = {
+            table: self._partitions.plan(table, rows)
+            for table, rows in grouped.items()
+            if table in PartitionManager.PARTITIONED_TABLES
+        }
+        parts = self._partitions.chunk_plans(plans)
+        if len(parts) == 1:
+            return [everything]
+        
+        groups = [
+            {table: sorted(i for indexes in plan.values() for i in indexes)
+             for table, plan in part.items()}
+            for part in parts
+        ]
+        for table in grouped:
+            if table not in plans:
+                groups[0][table] = everything[table]
+        return groups
+    
+    def _encode_rows(self, conn: sqlite3.Connection, table: str,
+                     rows: List[tuple]) -> List[tuple]:
+        """
+        Turn event rows into stored rows (_PHYSICAL_COLUMNS order)
+        
+        Encoded text columns become '' plus an id appended at the end;
+        with encoding off the ids are NULL and the text is kept. Clipboard
+        payloads move to clipboard_content, leaving a content_id.
+        """
+        encoded = self._DICT_COLUMNS.get(table)
+        if not encoded:
+            return rows
+        
+        columns = self._EVENT_COLUMNS[table]
+        positions = [(columns.index(c), dictionary) for c, dictionary in encoded.items()]
+        
+        stored = []
+        for row in rows:
+            values = list(row)
+            row_ids = []
+            for index, dictionary in positions:
+                if self.dictionary_encoding:
+                    values[index], row_id = self._encode_value(conn, dictionary, row[index])
+                else:
+                    row_id = None
+                row_ids.append(row_id)
+            
+            if table == 'clipboard_events':
+                content_index = columns.index('encrypted_content')
+                content_id = None
+                if self.clipboard_dedup:
+                    content_id = self._reference_content(
+                        conn, row[columns.index('content_hash')], row[content_index], row[0]
+                    )
+                if content_id is not None:
+                    values[content_index] = None
+                row_ids.append(content_id)
+            
+            stored.append(tuple(values) + tuple(row_ids))
+        return stored
+    
+    def _reference_content(self, conn: sqlite3.Connection, content_hash: Optional[str],
+                           content: Optional[bytes], timestamp: Optional[str]) -> Optional[int]:
+        """
+        Take a reference on the stored payload for content_hash (writer, self.lock held)
+        
+        The payload is stored on first sight; later copies only bump
+        ref_count. A row sent without its payload (a duplicate the sender
+        already knew about) still references the entry, and a payload
+        arriving later fills an entry created without one.
+        
+        Returns:
+            clipboard_content id, or None for rows without a hash
+        """
+        if not content_hash:
+            return None
+        
+        content_id = self._content_cache.get(content_hash)
+        if content_id is not None:
+            self._content_cache.move_to_end(content_hash)
+            self._content_stats['hits'] += 1
+        else:
+            self._content_stats['misses'] += 1
+            row = conn.execute(
+                "SELECT id FROM clipboard_content WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row:
+                content_id = row[0]
+        
+        if content_id is None:
+            content_id = conn.execute("""
+                INSERT INTO clipboard_content (
+                    content_hash, encrypted_content, size_bytes, ref_count, first_seen, last_seen
+                ) VALUES (?, ?, ?, 1, ?, ?)
+            """, (content_hash, content, len(content or b''), timestamp, timestamp)).lastrowid
+            self._content_stats['created'] += 1
+        else:
+            conn.execute("""
+                UPDATE clipboard_content
+                SET ref_count = ref_count + 1,
+                    last_seen = MAX(COALESCE(last_seen, ?), ?),
+                    encrypted_content = COALESCE(encrypted_content, ?),
+                    size_bytes = CASE WHEN encrypted_content IS NULL THEN ? ELSE size_bytes END
+                WHERE id = ?
+            """, (timestamp, timestamp, content, len(content or b''), content_id))
+            self._content_stats['bytes_deduplicated'] += len(content or b'')
+        
+        self._content_cache[content_hash] = content_id
+        if len(self._content_cache) > Config.DB_DICTIONARY_CACHE_SIZE:
+            self._content_cache.popitem(last=False)
+        if content is not None:
+            self._pending_payloads.append(content_hash)
+        return content_id
+    
+    def _remember_payloads(self, hashes: List[str]):
+        """Record hashes whose payload was just committed"""
+        with self._stored_payloads_lock:
+            for content_hash in hashes:
+                self._stored_payloads[content_hash] = None
+                self._stored_payloads.move_to_end(content_hash)
+            while len(self._stored_payloads) > Config.CLIPBOARD_RECENT_HASHES:
+                self._stored_payloads.popitem(last=False)
+    
+    def has_stored_payload(self, content_hash: str) -> bool:
+        """
+        Check whether the payload for content_hash was recently committed
+        
+        A sender may then log another copy without its payload. Hashes are
+        only remembered once their payload's transaction has committed and
+        are forgotten when retention deletes content store entries.
+        """
+        with self._stored_payloads_lock:
+            if content_hash not in self._stored_payloads:
+                return False
+            self._stored_payloads.move_to_end(content_hash)
+            return True
+    
+    @staticmethod
+    def _content_references(conn: sqlite3.Connection, source: str,
+                            where: str = "", params: tuple = ()) -> List[tuple]:
+        """(content_id, rows) for the clipboard rows of a table/shard matching where"""
+        condition = f"{where} AND content_id IS NOT NULL" if where else "WHERE content_id IS NOT NULL"
+        return conn.execute(
+            f"SELECT content_id, COUNT(*) FROM {source} {condition} GROUP BY content_id",
+            params
+        ).fetchall()
+    
+    def _release_content(self, conn: sqlite3.Connection, references: List[tuple]):
+        """Drop references of deleted rows; payloads nothing points at are deleted"""
+        if not references:
+            return
+        conn.executemany(
+            "UPDATE clipboard_content SET ref_count = ref_count - ? WHERE id = ?",
+            [(count, content_id) for content_id, count in references]
+        )
+        before = conn.total_changes
+        conn.executemany(
+            "DELETE FROM clipboard_content WHERE id = ? AND ref_count <= 0",
+            [(content_id,) for content_id, _ in references]
+        )
+        if conn.total_changes != before:
+            # Deleted ids must not be handed out from the cache, nor their
+            # payloads be reported as stored
+            self._content_cache.clear()
+            with self._stored_payloads_lock:
+                self._stored_payloads.clear()
+    
+    def get_content_store_stats(self) -> Dict[str, Any]:
+        """Get clipboard content store size and deduplication counters"""
+        with self._pool.reader() as conn:
+            entries, references, size_bytes = conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(ref_count), 0), COALESCE(SUM(size_bytes), 0)
+                FROM clipboard_content
+            """).fetchone()
+        with self.lock:
+            stats = dict(self._content_stats)
+            stats['cached'] = len(self._content_cache)
+        stats.update({'entries': entries, 'references': references, 'size_bytes': size_bytes})
+        return stats
+    
+    def _encode_value(self, conn: sqlite3.Connection, dictionary: str,
+                      value: Optional[str]) -> tuple:
+        """
+        Intern one value (writer connection, self.lock held)
+        
+        Returns:
+            (text to store, lookup id) - None/'' are stored as-is without an id
+        """
+        if not value:
+            return value, None
+        
+        cache = self._dict_cache[dictionary]
+        value_id = cache.get(value)
+        if value_id is not None:
+            cache.move_to_end(value)
+            self._dict_stats['hits'] += 1
+        else:
+            self._dict_stats['misses'] += 1
+            row = conn.execute(f"SELECT id FROM {dictionary} WHERE value = ?", (value,)).fetchone()
+            if row:
+                value_id = row[0]
+            else:
+                value_id = conn.execute(
+                    f"INSERT INTO {dictionary} (value) VALUES (?)", (value,)
+                ).lastrowid
+                self._dict_stats['created'] += 1
+            
+            cache[value] = value_id
+            if len(cache) > Config.DB_DICTIONARY_CACHE_SIZE:
+                cache.popitem(last=False)
+        
+        if self._dict_in_use is not None:
+            self._dict_in_use[dictionary].add(value_id)
+        return '', value_id
+    
+    def get_dictionary_stats(self) -> Dict[str, Any]:
+        """Get lookup table sizes and string cache counters"""
+        with self._pool.reader() as conn:
+            stats = {
+                f'{name}_count': conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                for name in self.DICTIONARIES
+            }
+        with self.lock:
+            stats.update(self._dict_stats)
+            stats['cached'] = sum(len(cache) for cache in self._dict_cache.values())
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+    
+    @staticmethod
+    def _row_bytes(row: tuple) -> int:
+        """Approximate stored payload of a row (see _ROW_BYTES_SQL)"""
+        return sum(len(v) for v in row if isinstance(v, (str, bytes)))
+    
+    def _count_inserted(self, conn: sqlite3.Connection, table: str, rows: List[tuple]):
+        """Add inserted rows to table_stats in the inserting transaction"""
+        timestamps = [row[0] for row in rows if row[0]]
+        oldest = min(timestamps) if timestamps else None
+        newest = max(timestamps) if timestamps else None
+        
+        conn.execute("""
+            UPDATE table_stats
+            SET row_count = row_count + ?,
+                unsynced_count = unsynced_count + ?,
+                total_bytes = total_bytes + ?,
+                oldest_timestamp = MIN(COALESCE(oldest_timestamp, ?), ?),
+                newest_timestamp = MAX(COALESCE(newest_timestamp, ?), ?)
+            WHERE table_name = ?
+        """, (
+            len(rows),
+            len(rows) if table in SYNCED_TABLES else 0,
+            sum(self._row_bytes(row) for row in rows),
+            oldest, oldest, newest, newest,
+            table
+        ))
+    
+    def _commit_batch(self, batch: List[tuple]):
+        """Commit queued rows in one transaction, falling back to row-by-row"""
+        # Group rows per table so each table gets a single executemany
+        grouped: Dict[str, List[tuple]] = {}
+        for table, params in batch:
+            grouped.setdefault(table, []).append(params)
+        
+        for group in self._shard_groups(grouped):
+            self._commit_group({
+                table: [grouped[table][i] for i in indexes]
+                for table, indexes in group.items()
+            })
+    
+    def _commit_group(self, grouped: Dict[str, List[tuple]]):
+        """Commit one _shard_groups group, retrying its rows one by one on failure"""
+        count = sum(len(rows) for rows in grouped.values())
+        try:
+            with self._writer('insert') as conn:
+                self._store_rows(conn, grouped)
+            
+            with self._write_stats_lock:
+                self._write_stats['rows_written'] += count
+                self._write_stats['batches_committed'] += 1
+                self._write_stats['last_batch_size'] = count
+                if count > self._write_stats['max_batch_size']:
+                    self._write_stats['max_batch_size'] = count
+            return
+            
+        except sqlite3.Error as e:
+            logger.error(f"Batch commit of {count} rows failed, retrying row by row: {e}")
+            with self._write_stats_lock:
+                self._write_stats['batch_failures'] += 1
+        
+        # The failed transaction left nothing behind; isolate bad rows so
+        # one invalid event does not lose the batch
+        for table, rows in grouped.items():
+            for params in rows:
+                try:
+                    with self._writer('insert') as conn:
+                        self._store_rows(conn, {table: [params]})
+                    with self._write_stats_lock:
+                        self._write_stats['rows_written'] += 1
+                except sqlite3.Error as e:
+                    logger.error(f"Error writing {table} row: {e}")
+                    with self._write_stats_lock:
+                        self._write_stats['rows_failed'] += 1
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all queued writes are committed
+        
+        Args:
+            timeout: Max seconds to wait, including for room in a full
+                queue (None waits indefinitely)
+            
+        Returns:
+            True if the queue was drained in time
+        """
+        if self._write_queue is None or not self._writer_thread.is_alive():
+            return True
+        
+        barrier = _FlushBarrier()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._write_queue.put(barrier, timeout=timeout)
+        except Full:
+            return False
+        return barrier.done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    
+    def get_write_stats(self) -> Dict[str, Any]:
+        """Get write-behind queue and batch counters"""
+        with self._write_stats_lock:
+            stats = dict(self._write_stats)
+        
+        stats['write_behind'] = self._write_queue is not None
+        stats['queue_depth'] = self._write_queue.qsize() if self._write_queue else 0
+        stats['avg_batch_size'] = (
+            round(stats['rows_written'] / stats['batches_committed'], 1)
+            if stats['batches_committed'] else 0
+        )
+        return stats
+    
+    @staticmethod
+    def _screenshot_row(data: Dict[str, Any]) -> tuple:
+        """Build screenshots INSERT parameters from event data"""
+        return (
+            data.get('timestamp'),
+            data.get('filepath'),
+            data.get('file_size_bytes'),
+            data.get('resolution'),
+            data.get('active_window'),
+            data.get('active_app'),
+            iso_to_epoch_ms(data.get('timestamp'))
+        )
+    
+    @staticmethod
+    def _clipboard_row(data: Dict[str, Any]) -> tuple:
+        """Build clipboard_events INSERT parameters from event data"""
+        return (
+            data.get('timestamp'),
+            data.get('content_type'),
+            data.get('content_preview'),
+            data.get('encrypted_content'),
+            data.get('content_hash'),
+            data.get('source_app'),
+            iso_to_epoch_ms(data.get('timestamp'))
+        )
+    
+    @staticmethod
+    def _app_usage_row(data: Dict[str, Any]) -> tuple:
+        """Build app_usage INSERT parameters from event data"""
+        return (
+            data.get('timestamp'),
+            data.get('app_name'),
+            data.get('window_title'),
+            data.get('duration_seconds'),
+            iso_to_epoch_ms(data.get('timestamp'))
+        )
+    
+    @staticmethod
+    def _system_event_row(event_type: str, severity: str, message: str,
+                          details: Dict = None, timestamp: str = None) -> tuple:
+        """Build system_events INSERT parameters"""
+        timestamp = timestamp or datetime.now().isoformat()
+        return (
+            timestamp,
+            event_type,
+            severity,
+            message,
+            json.dumps(details) if details else None,
+            iso_to_epoch_ms(timestamp)
+        )
+    
+    def log_screenshot(self, data: Dict[str, Any]):
+        """Log screenshot metadata"""
+        try:
+            self._insert_event('screenshots', self._screenshot_row(data))
+            
+            logger.debug(f"Logged screenshot: {data.get('filepath')}")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error logging screenshot: {e}")
+    
+    def log_clipboard_event(self, data: Dict[str, Any]):
+        """Log clipboard event"""
+        try:
+            self._insert_event('clipboard_events', self._clipboard_row(data))
+            
+            logger.debug(f"Logged clipboard event: {data.get('content_type')}")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error logging clipboard event: {e}")
+    
+    def log_app_usage(self, data: Dict[str, Any]):
+        """Log application usage"""
+        try:
+            self._insert_event('app_usage', self._app_usage_row(data))
+            
+            logger.debug(f"Logged app usage: {data.get('app_name')}")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error logging app usage: {e}")
     
     def log_system_event(self, event_type: str, severity: str, message: str, details: Dict = None):
         """Log system event"""
-        with self.lock:
+        try:
+            self._insert_event(
+                'system_events',
+                self._system_event_row(event_type, severity, message, details)
+            )
+            
+            logger.debug(f"Logged system event: {event_type}")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error logging system event: {e}")
+    
+    def log_events(self, table: str, records: List[Dict[str, Any]]):
+        """
+        Log a batch of screenshot, clipboard or app usage events
+        
+        Written like the same events passed one by one to the log_* calls -
+        in order with them, under the durability mode and, in write-behind
+        mode, queued as one item under the same backpressure - but with a
+        single queue put. A row that fails is dropped on its own.
+        """
+        builders = {
+            'screenshots': self._screenshot_row,
+            'clipboard_events': self._clipboard_row,
+            'app_usage': self._app_usage_row,
+        }
+        if table not in builders:
+            raise ValueError(f"Unknown event table: {table}")
+        if not records:
+            return
+        
+        rows = [builders[table](r) for r in records]
+        if self._write_queue is None:
+            self._commit_batch([(table, params) for params in rows])
+        else:
+            self._enqueue(_EventBatch(table, rows), len(rows))
+        
+        logger.debug(f"Logged {len(rows)} {table} events")
+    
+    def _insert_events_bulk(self, table: str, rows: List[tuple]) -> List[Optional[int]]:
+        """
+        Insert many rows into one table in a single transaction
+        
+        Committed directly rather than queued so the new row ids can be
+        returned. In write-behind mode the queue is flushed first, so the
+        rows land after events already queued and the caller waits for
+        the writer the way a full queue would make it wait. Rows spanning
+        more than MAX_WRITER_ATTACHED shards are committed in one
+        transaction per _shard_groups group.
+        
+        Returns:
+            Inserted row ids in input order, None for rows of a failed
+            group (empty list if no group was inserted)
+        """
+        if not rows:
+            return []
+        
+        if self._write_queue is not None:
+            self.flush()
+        
+        ids: List[Optional[int]] = [None] * len(rows)
+        inserted = 0
+        for group in self._shard_groups({table: rows}):
+            indexes = group[table]
             try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    INSERT INTO system_events (
-                        timestamp, event_type, severity, message, details
-                    ) VALUES (?, ?, ?, ?, ?)
-                """, (
-                    datetime.now().isoformat(),
-                    event_type,
-                    severity,
-                    message,
-                    json.dumps(details) if details else None
-                ))
-                
-                conn.commit()
-                conn.close()
-                
-                logger.debug(f"Logged system event: {event_type}")
-                
+                with self._writer('insert') as conn:
+                    stored = self._store_rows(conn, {table: [rows[i] for i in indexes]})[table]
             except sqlite3.Error as e:
-                logger.error(f"Error logging system event: {e}")
+                logger.error(f"Error bulk inserting {len(indexes)} rows into {table}: {e}")
+                continue
+            for index, row_id in zip(indexes, stored):
+                ids[index] = row_id
+            inserted += len(indexes)
+        
+        if not inserted:
+            return []
+        logger.debug(f"Bulk inserted {inserted} rows into {table}")
+        return ids
+    
+    def log_screenshots_bulk(self, records: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Log many screenshot metadata records, returning their row ids (see _insert_events_bulk)"""
+        return self._insert_events_bulk(
+            'screenshots', [self._screenshot_row(r) for r in records]
+        )
+    
+    def log_clipboard_events_bulk(self, records: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Log many clipboard events, returning their row ids (see _insert_events_bulk)"""
+        return self._insert_events_bulk(
+            'clipboard_events', [self._clipboard_row(r) for r in records]
+        )
+    
+    def log_app_usage_bulk(self, records: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Log many application usage records, returning their row ids (see _insert_events_bulk)"""
+        return self._insert_events_bulk(
+            'app_usage', [self._app_usage_row(r) for r in records]
+        )
+    
+    def log_system_events_bulk(self, events: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """
+        Log many system events, returning their row ids
+        
+        Args:
+            events: Dicts with event_type, severity, message and optional
+                details/timestamp keys
+            
+        Returns:
+            Row ids in input order, None for rows that failed (empty list
+            if none were inserted; see _insert_events_bulk)
+        """
+        return self._insert_events_bulk('system_events', [
+            self._system_event_row(
+                e.get('event_type'),
+                e.get('severity'),
+                e.get('message'),
+                e.get('details'),
+                e.get('timestamp')
+            )
+            for e in events
+        ])
+    
+    def get_sync_cursor(self, table: str,
+                        destination: str = DEFAULT_SYNC_DESTINATION) -> int:
+        """Get the highest row id acknowledged by a destination (0 if none)"""
+        with self._pool.reader() as conn:
+            row = conn.execute(
+                "SELECT last_id FROM sync_cursors WHERE table_name = ? AND destination = ?",
+                (table, destination)
+            ).fetchone()
+        return row[0] if row else 0
+    
+    @staticmethod
+    def _synced_through(conn: sqlite3.Connection, table: str) -> int:
+        """Highest row id acknowledged by every destination"""
+        row = conn.execute(
+            "SELECT MIN(last_id) FROM sync_cursors WHERE table_name = ?", (table,)
+        ).fetchone()
+        return row[0] or 0
+    
+    def fetch_unsynced(self, table: str, limit: int = 100,
+                       destination: str = DEFAULT_SYNC_DESTINATION,
+                       columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get the next page of rows a destination has not acknowledged
+        
+        Keyset pagination on the primary key (id > cursor), oldest id
+        first. Pass the last returned id to advance_sync_cursor() once the
+        destination has accepted the page.
+        
+        Args:
+            table: Synced event table
+            limit: Page size
+            destination: Sync destination name
+            columns: Columns to return ('id' is always included)
+        """
+        if table not in SYNCED_TABLES:
+            raise ValueError(f"Table is not synced: {table}")
+        
+        columns = ['id'] + [c for c in (columns or self._EVENT_COLUMNS[table]) if c != 'id']
+        after_id = self.get_sync_cursor(table, destination)
+        
+        def select(source: str) -> str:
+            return self._decoded_select(table, source, columns) + \
+                " WHERE t.id > ? ORDER BY t.id LIMIT ?"
+        
+        with self._timed('sync_fetch'), self._pool.reader() as conn:
+            cursor = conn.execute(select(f"main.{table}"), (after_id, limit))
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+            
+            # Shards holding ids past the cursor, in id order
+            if self._partitions is not None:
+                shards = sorted(
+                    (p for p in self._partitions.list_partitions(conn, table)
+                     if p['max_id'] is not None and p['max_id'] > after_id),
+                    key=lambda p: p['min_id']
+                )
+                for partition in shards:
+                    if len(rows) >= limit and partition['min_id'] > rows[limit - 1][0]:
+                        break
+                    with self._partitions.attached(conn, table, partition['partition_key']) as schema:
+                        if schema is not None:
+                            rows += conn.execute(
+                                select(f"{schema}.{table}"), (after_id, limit)
+                            ).fetchall()
+                    rows.sort(key=lambda r: r[0])
+        
+        return [dict(zip(names, row)) for row in rows[:limit]]
+    
+    def advance_sync_cursor(self, table: str, last_id: int,
+                            destination: str = DEFAULT_SYNC_DESTINATION):
+        """
+        Record that a destination has acknowledged all rows up to last_id
+        
+        One small write per synced page; the cursor never moves backwards.
+        """
+        # Rows that stop counting as unsynced if this moves the slowest cursor
+        with self._pool.reader() as conn:
+            before = self._synced_through(conn, table)
+            cursors = dict(conn.execute(
+                "SELECT destination, last_id FROM sync_cursors WHERE table_name = ?", (table,)
+            ).fetchall())
+            cursors[destination] = max(cursors.get(destination, 0), last_id)
+            after = min(cursors.values())
+            newly_synced = self._count_id_range(conn, table, before, after) if after > before else 0
+        
+        with self._writer('sync_cursor') as conn:
+            conn.execute("""
+                INSERT INTO sync_cursors (table_name, destination, last_id, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (table_name, destination) DO UPDATE SET
+                    last_id = MAX(last_id, excluded.last_id),
+                    updated_at = excluded.updated_at
+            """, (table, destination, last_id, datetime.now().isoformat()))
+            
+            if newly_synced:
+                conn.execute("""
+                    UPDATE table_stats SET unsynced_count = MAX(0, unsynced_count - ?)
+                    WHERE table_name = ?
+                """, (newly_synced, table))
+    
+    def _count_id_range(self, conn: sqlite3.Connection, table: str,
+                        after_id: int, through_id: int) -> int:
+        """Count rows with after_id < id <= through_id, shards included"""
+        count = conn.execute(
+            f"SELECT COUNT(*) FROM main.{table} WHERE id > ? AND id <= ?",
+            (after_id, through_id)
+        ).fetchone()[0]
+        
+        if self._partitions is None or table not in PartitionManager.PARTITIONED_TABLES:
+            return count
+        
+        for partition in self._partitions.list_partitions(conn, table):
+            if partition['max_id'] is None:
+                continue
+            if partition['max_id'] <= after_id or partition['min_id'] > through_id:
+                continue
+            # Shards are only ever dropped whole, so the catalog count is exact
+            if partition['min_id'] > after_id and partition['max_id'] <= through_id:
+                count += partition['row_count'] or 0
+                continue
+            with self._partitions.attached(conn, table, partition['partition_key']) as schema:
+                if schema is not None:
+                    count += conn.execute(
+                        f"SELECT COUNT(*) FROM {schema}.{table} WHERE id > ? AND id <= ?",
+                        (after_id, through_id)
+                    ).fetchone()[0]
+        return count
+    
+    def _update_app_usage_rollups(self, conn: sqlite3.Connection, rows: List[tuple]):
+        """
+        Fold app_usage rows into the hourly/daily rollups
+        
+        Rows are aggregated per (app, bucket) in Python first, so a batch
+        costs one upsert per touched bucket rather than one per row.
+        distinct_titles grows by the titles new to the bucket's title set;
+        a late row for a bucket whose set was already pruned counts its
+        title again.
+        """
+        columns = self._EVENT_COLUMNS['app_usage']
+        ts_i = columns.index('timestamp')
+        app_i = columns.index('app_name')
+        title_i = columns.index('window_title')
+        duration_i = columns.index('duration_seconds')
+        
+        # Titles are kept as window_titles ids whether or not the event
+        # columns are encoded (the cache makes this free after _encode_rows)
+        title_ids: Dict[str, int] = {}
+        for row in rows:
+            title = row[title_i]
+            if title and title not in title_ids:
+                title_ids[title] = self._encode_value(conn, 'window_titles', title)[1]
+        
+        for granularity, prefix in self.ROLLUP_GRANULARITIES.items():
+            # (app, bucket) -> [seconds, sessions, {title ids}]
+            totals: Dict[tuple, list] = {}
+            for row in rows:
+                timestamp, app_name = row[ts_i], row[app_i]
+                if not timestamp or len(timestamp) < prefix or app_name is None:
+                    continue
+                entry = totals.setdefault((app_name, timestamp[:prefix]), [0.0, 0, set()])
+                entry[0] += row[duration_i] or 0
+                entry[1] += 1
+                if row[title_i]:
+                    entry[2].add(title_ids[row[title_i]])
+            
+            if not totals:
+                continue
+            
+            params = []
+            for (app_name, bucket), (seconds, sessions, ids) in totals.items():
+                # Rows actually inserted = titles new to this bucket
+                before = conn.total_changes
+                conn.executemany("""
+                    INSERT OR IGNORE INTO app_usage_rollup_titles (bucket, app_name, window_title_id)
+                    VALUES (?, ?, ?)
+                """, [(bucket, app_name, title_id) for title_id in ids])
+                params.append((app_name, bucket, seconds, sessions, conn.total_changes - before))
+            
+            conn.executemany(f"""
+                INSERT INTO app_usage_{granularity} (
+                    app_name, bucket, total_seconds, session_count, distinct_titles
+                ) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (app_name, bucket) DO UPDATE SET
+                    total_seconds = total_seconds + excluded.total_seconds,
+                    session_count = session_count + excluded.session_count,
+                    distinct_titles = distinct_titles + excluded.distinct_titles
+            """, params)
+    
+    @staticmethod
+    def _rollup_titles_cutoff() -> str:
+        """Oldest bucket whose title set is kept (buckets compare as text)"""
+        return (datetime.now() - timedelta(days=Config.DB_ROLLUP_TITLES_KEEP_DAYS)).date().isoformat()
+    
+    def _prune_rollup_titles(self) -> int:
+        """
+        Delete the title sets of rollup buckets closed for DB_ROLLUP_TITLES_KEEP_DAYS
+        
+        Their distinct_titles is final, and the sets would otherwise keep
+        a reference to every window title past retention.
+        
+        Returns:
+            Title rows deleted
+        """
+        with self._writer('rollup_prune') as conn:
+            return conn.execute(
+                "DELETE FROM app_usage_rollup_titles WHERE bucket < ?",
+                (self._rollup_titles_cutoff(),)
+            ).rowcount
     
-    def cleanup_old_data(self, retention_days: int = 30, screenshot_days: int = 7):
-        """Delete old data based on retention policy"""
+    def backfill_app_usage_rollups(self, since: Optional[str] = None) -> int:
+        """
+        Rebuild the app usage rollups from the raw app_usage rows
+        
+        Buckets from the day of `since` (default: the oldest raw row)
+        onwards are cleared and recomputed; older rollups, whose raw rows
+        may already be gone, are kept. Rows inserted while this runs are
+        folded in by the write path as usual.
+        
+        Returns:
+            Number of app_usage rows processed
+        """
+        if since is None:
+            with self._pool.reader() as conn:
+                row = conn.execute(
+                    "SELECT oldest_timestamp FROM table_stats WHERE table_name = 'app_usage'"
+                ).fetchone()
+            if not row or not row[0]:
+                return 0
+            since = row[0]
+        since = since[:10]
+        
+        # Clear the range and fix the id watermark in one transaction:
+        # rows above it are counted by the write path, rows up to it here
+        with self._writer('rollup_backfill') as conn:
+            for granularity in self.ROLLUP_GRANULARITIES:
+                conn.execute(f"DELETE FROM app_usage_{granularity} WHERE bucket >= ?", (since,))
+            conn.execute("DELETE FROM app_usage_rollup_titles WHERE bucket >= ?", (since,))
+            row = conn.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'app_usage'"
+            ).fetchone()
+            watermark = row[0] if row else 0
+        
+        columns = list(self._EVENT_COLUMNS['app_usage'])
+        processed = 0
+        batch: List[tuple] = []
+        for event in self.iter_events('app_usage', since=since, columns=['id'] + columns):
+            if event['id'] > watermark:
+                continue
+            batch.append(tuple(event[c] for c in columns))
+            if len(batch) >= Config.DB_MIGRATION_CHUNK_ROWS:
+                with self._writer('rollup_backfill') as conn:
+                    self._update_app_usage_rollups(conn, batch)
+                processed += len(batch)
+                batch = []
+        
+        if batch:
+            with self._writer('rollup_backfill') as conn:
+                self._update_app_usage_rollups(conn, batch)
+            processed += len(batch)
+        
+        logger.info(f"App usage rollups rebuilt from {since}: {processed} rows")
+        return processed
+    
+    def get_app_usage_rollup(self, granularity: str = 'daily', since: str = None,
+                             until: str = None, app_name: str = None) -> List[Dict[str, Any]]:
+        """
+        Get app usage totals per app and hour/day
+        
+        Args:
+            granularity: 'hourly' or 'daily'
+            since: Inclusive ISO-8601 lower bound (compared on the bucket)
+            until: Exclusive ISO-8601 upper bound
+            app_name: Restrict to one application
+            
+        Returns:
+            Rows with app_name, bucket, total_seconds, session_count and
+            distinct_titles, ordered by bucket then app
+        """
+        if granularity not in self.ROLLUP_GRANULARITIES:
+            raise ValueError(f"Unknown rollup granularity: {granularity}")
+        
+        prefix = self.ROLLUP_GRANULARITIES[granularity]
+        conditions = []
+        params: List[Any] = []
+        if since:
+            conditions.append("bucket >= ?")
+            params.append(since[:prefix])
+        if until:
+            conditions.append("bucket < ?")
+            params.append(until[:prefix])
+        if app_name:
+            conditions.append("app_name = ?")
+            params.append(app_name)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        return self.query(f"""
+            SELECT app_name, bucket, total_seconds, session_count, distinct_titles
+            FROM app_usage_{granularity} {where}
+            ORDER BY bucket, app_name
+        """, tuple(params))
+    
+    def cleanup_old_data(self, retention_days: int = 30, screenshot_days: int = 7,
+                         time_budget: float = Config.DB_RETENTION_TIME_BUDGET) -> Dict[str, Any]:
+        """
+        Delete old data based on retention policy
+        
+        Rows are deleted in bounded id-range chunks, one short transaction
+        per chunk, yielding the writer lock in between. When the time
+        budget runs out the pass stops and the next call resumes from the
+        saved position. With an archive configured, rows are only deleted
+        once they have been written to an archive segment.
+        
+        Returns:
+            Summary with rows deleted per table and whether the pass completed
+        """
+        # Calculate cutoff dates
+        cutoff_date = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        screenshot_cutoff = (datetime.now() - timedelta(days=screenshot_days)).isoformat()
+        
+        # Rows at or below every destination's cursor count as synced
+        with self._pool.reader() as conn:
+            synced_through = {table: self._synced_through(conn, table) for table in SYNCED_TABLES}
+        
+        # (table, condition, parameters) - the cutoff comes first (see _delete_in_chunks)
+        column, convert = self._range_column()
+        targets = [
+            # Screenshot metadata past the screenshot threshold, synced or not
+            ('screenshots', f"{column} < ?", (convert(screenshot_cutoff),)),
+            # Clipboard events and app usage only once synced
+            ('clipboard_events', f"{column} < ? AND id <= ?",
+             (convert(cutoff_date), synced_through['clipboard_events'])),
+            ('app_usage', f"{column} < ? AND id <= ?",
+             (convert(cutoff_date), synced_through['app_usage'])),
+            ('system_events', f"{column} < ?", (convert(cutoff_date),)),
+        ]
+        
+        start = time.monotonic()
+        deadline = start + time_budget
+        deleted: Dict[str, int] = {}
+        partitions_dropped: Dict[str, int] = {}
+        complete = True
+        
+        try:
+            # Whole expired shards are dropped first (partitioned layout)
+            if self._partitions is not None:
+                partitions_dropped = self._drop_expired_partitions({
+                    'screenshots': (screenshot_cutoff, None),
+                    'clipboard_events': (cutoff_date, synced_through['clipboard_events']),
+                    'app_usage': (cutoff_date, synced_through['app_usage']),
+                })
+                if partitions_dropped:
+                    logger.info(f"Dropped expired partitions, rows per table: {partitions_dropped}")
+            
+            for table, condition, params in targets:
+                archive_done = True
+                if self._archive is not None:
+                    archived_through, archive_done = self._archive_expired(
+                        table, condition, params, deadline
+                    )
+                    condition += " AND id <= ?"
+                    params += (archived_through,)
+                
+                deleted[table], table_done = self._delete_in_chunks(
+                    table, column, condition, params, deadline
+                )
+                deleted[table] += partitions_dropped.get(table, 0)
+                if not (table_done and archive_done):
+                    complete = False
+                    break
+            
+            if self.app_usage_rollups:
+                deleted['app_usage_rollup_titles'] = self._prune_rollup_titles()
+            
+            # Only after a full pass; rows still due for deletion hold references
+            if complete:
+                deleted.update(self._collect_dictionaries())
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error during cleanup: {e}")
+            complete = False
+        
+        elapsed = time.monotonic() - start
+        self._timings.record('cleanup', 0.0, elapsed, sum(deleted.values()))
+        
+        with self._retention_lock:
+            self._retention_stats['runs'] += 1
+            self._retention_stats['last_run'] = datetime.now().isoformat()
+            self._retention_stats['last_run_seconds'] = round(elapsed, 2)
+            self._retention_stats['last_run_complete'] = complete
+            for table, count in deleted.items():
+                self._retention_stats['rows_deleted'][table] = \
+                    self._retention_stats['rows_deleted'].get(table, 0) + count
+        
+        logger.info(
+            f"Cleanup {'complete' if complete else 'paused (will resume)'} in {elapsed:.1f}s - "
+            f"Deleted: {deleted.get('screenshots', 0)} screenshots, "
+            f"{deleted.get('clipboard_events', 0)} clipboard events, "
+            f"{deleted.get('app_usage', 0)} app usage records, "
+            f"{deleted.get('system_events', 0)} system events"
+        )
+        
+        # Freed pages are returned to the OS by the maintenance thread;
+        # without it, reclaim them now in small steps
+        if self._maintenance_thread is None:
+            self.reclaim_space()
+        
+        return {'deleted': deleted, 'complete': complete, 'elapsed_seconds': round(elapsed, 2)}
+    
+    def _collect_dictionaries(self) -> Dict[str, int]:
+        """
+        Delete app name / window title ids nothing references any more
+        
+        References (event tables and their shards, rollup title sets) are
+        gathered on a reader without holding the writer lock; ids the
+        writer hands out meanwhile are tracked in _dict_in_use and kept.
+        Skipped while a background migration may still be encoding rows.
+        
+        Returns:
+            Ids deleted per dictionary
+        """
+        if self._migration_thread is not None and self._migration_thread.is_alive():
+            return {}
+        
         with self.lock:
+            self._dict_in_use = {name: set() for name in self.DICTIONARIES}
+        try:
+            referenced = {name: set() for name in self.DICTIONARIES}
+            with self._pool.reader() as conn:
+                for table, columns in self._DICT_COLUMNS.items():
+                    for source in self._table_sources(conn, table):
+                        for column, dictionary in columns.items():
+                            referenced[dictionary].update(row[0] for row in conn.execute(
+                                f"SELECT DISTINCT {column}_id FROM {source} WHERE {column}_id IS NOT NULL"
+                            ))
+                referenced['window_titles'].update(row[0] for row in conn.execute(
+                    "SELECT DISTINCT window_title_id FROM app_usage_rollup_titles"
+                ))
+                unused = {
+                    name: [row[0] for row in conn.execute(f"SELECT id FROM {name}")
+                           if row[0] not in referenced[name]]
+                    for name in self.DICTIONARIES
+                }
+            
+            deleted = {}
+            with self._writer('dictionary_gc') as conn:
+                for name, ids in unused.items():
+                    ids = [value_id for value_id in ids if value_id not in self._dict_in_use[name]]
+                    conn.executemany(f"DELETE FROM {name} WHERE id = ?", [(value_id,) for value_id in ids])
+                    deleted[name] = len(ids)
+                if any(deleted.values()):
+                    # Deleted ids must not be handed out from the cache
+                    for cache in self._dict_cache.values():
+                        cache.clear()
+        finally:
+            with self.lock:
+                self._dict_in_use = None
+        
+        if any(deleted.values()):
+            logger.info(f"Deleted unreferenced dictionary entries: {deleted}")
+        return deleted
+    
+    def _drop_expired_partitions(self, cutoffs: Dict[str, tuple]) -> Dict[str, int]:
+        """
+        Drop shards whose whole period is older than the table's cutoff
+        
+        Args:
+            cutoffs: table -> (ISO cutoff timestamp, id all rows must be
+                synced through, or None if unsynced rows may be dropped)
+            
+        Returns:
+            Rows removed per table with the dropped shards
+        """
+        with self._pool.reader() as conn:
+            catalog = self._partitions.list_partitions(conn)
+        
+        dropped: Dict[str, int] = {}
+        for partition in catalog:
+            table = partition['table_name']
+            if table not in cutoffs:
+                continue
+            cutoff, synced_through = cutoffs[table]
+            if partition['period_end'] > cutoff[:10]:
+                continue
+            
+            if synced_through is not None and (partition['max_id'] or 0) > synced_through:
+                logger.debug(f"Keeping partition {table}/{partition['partition_key']}: unsynced rows")
+                continue
+            
+            segments = []
+            with self._pool.reader() as conn:
+                with self._partitions.attached(conn, table, partition['partition_key']) as schema:
+                    removed = self._source_totals(conn, f"{schema}.{table}", table) \
+                        if schema is not None else None
+                    references = self._content_references(conn, f"{schema}.{table}") \
+                        if schema is not None and table == 'clipboard_events' else []
+                    if schema is not None and self._archive is not None:
+                        segments = self._archive_source(
+                            conn, table, f"{schema}.{table}", "", ()
+                        )
+            
+            with self._locked('partition_drop'):
+                conn = self._pool.writer()
+                # Cataloged before the drop; re-archiving after a failed drop
+                # rewrites the same segment files
+                if segments:
+                    self._record_segments(conn, segments, partition['partition_key'])
+                    conn.commit()
+                self._partitions.drop_partition(conn, table, partition['partition_key'])
+                if removed is not None:
+                    self._count_deleted(conn, table, removed)
+                    self._release_content(conn, references)
+                    conn.commit()
+            dropped[table] = dropped.get(table, 0) + (partition['row_count'] or 0)
+        
+        if dropped:
+            self._refresh_time_bounds(list(dropped))
+        
+        return dropped
+    
+    def _archive_expired(self, table: str, condition: str, params: tuple,
+                         deadline: float) -> tuple:
+        """
+        Write rows of the main table up to the newest expired one to the archive
+        
+        Every row with an id between the previous archive watermark and the
+        newest row matching condition is archived (a row that arrived out
+        of timestamp order may stay in the database after being archived;
+        it is deleted later without being archived again). Each segment is
+        written and cataloged before the next one is read.
+        
+        Returns:
+            (id through which rows are archived, True if caught up)
+        """
+        with self._pool.reader() as conn:
+            archived_through = conn.execute("""
+                SELECT COALESCE(MAX(max_id), 0) FROM archive_segments
+                WHERE table_name = ? AND source = 'main'
+            """, (table,)).fetchone()[0]
+            eligible = conn.execute(
+                f"SELECT MAX(id) FROM {table} WHERE {condition}", params
+            ).fetchone()[0]
+        
+        while eligible is not None and archived_through < eligible:
+            if time.monotonic() >= deadline:
+                return archived_through, False
+            
+            with self._pool.reader() as conn:
+                segments = self._archive_source(
+                    conn, table, f"main.{table}", "WHERE t.id > ? AND t.id <= ?",
+                    (archived_through, eligible), limit=Config.DB_ARCHIVE_SEGMENT_ROWS
+                )
+            if not segments:
+                break
+            
+            with self._writer('archive') as conn:
+                self._record_segments(conn, segments, 'main')
+            archived_through = segments[-1]['max_id']
+        
+        return archived_through, True
+    
+    def _archive_source(self, conn: sqlite3.Connection, table: str, source: str,
+                        where: str, params: tuple, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Write the (decoded) rows of one table/shard to archive segments
+        
+        Args:
+            source: Qualified table, e.g. 'main.app_usage' or a shard schema
+            where: Condition on 't.' columns
+            limit: Stop after this many rows (one segment); all rows if None
+            
+        Returns:
+            Segment summaries in id order (not yet in the catalog)
+        """
+        columns = self._get_read_columns(table)
+        select = f"{self._decoded_select(table, source, columns)} {where} ORDER BY t.id"
+        if limit:
+            select += f" LIMIT {int(limit)}"
+        
+        segments = []
+        cursor = conn.execute(select, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(Config.DB_ARCHIVE_SEGMENT_ROWS)
+                if not rows:
+                    break
+                segments.append(self._archive.write_segment(
+                    table, columns, [dict(zip(columns, row)) for row in rows]
+                ))
+        finally:
+            cursor.close()
+        return segments
+    
+    @staticmethod
+    def _record_segments(conn: sqlite3.Connection, segments: List[Dict[str, Any]], source: str):
+        """Add written segments to the archive_segments catalog"""
+        conn.executemany("""
+            INSERT OR REPLACE INTO archive_segments (
+                filepath, table_name, source, row_count, min_id, max_id,
+                min_timestamp, max_timestamp, file_bytes, raw_bytes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                s['filepath'], s['table_name'], source, s['row_count'], s['min_id'], s['max_id'],
+                s['min_timestamp'], s['max_timestamp'], s['file_bytes'], s['raw_bytes']
+            )
+            for s in segments
+        ])
+    
+    def _delete_in_chunks(self, table: str, column: str, condition: str, params: tuple,
+                          deadline: float) -> tuple:
+        """
+        Delete rows matching condition in id ranges of DB_RETENTION_CHUNK_ROWS
+        
+        Resumes from the position saved by an earlier pass that ran out of
+        time. The pass covers ids up to the newest row older than the cutoff,
+        which is params[0] compared against column (see _range_column).
+        
+        Returns:
+            (rows deleted, True if the table pass finished)
+        """
+        chunk = Config.DB_RETENTION_CHUNK_ROWS
+        
+        with self._pool.reader() as conn:
+            # Highest id that can match (ts/timestamp index); the pass stops there
+            max_id = conn.execute(
+                f"SELECT MAX(id) FROM {table} WHERE {column} < ?", params[:1]
+            ).fetchone()[0]
+            min_id = conn.execute(f"SELECT MIN(id) FROM {table}").fetchone()[0]
+        
+        if max_id is None:
+            self._set_retention_position(table, None)
+            return 0, True
+        
+        with self._retention_lock:
+            saved = self._retention_stats['positions'].get(table)
+        next_id = max(saved or 0, min_id or 0)
+        
+        deleted = 0
+        while next_id <= max_id:
+            if time.monotonic() >= deadline:
+                self._set_retention_position(table, next_id, max_id)
+                return deleted, False
+            
+            with self._writer('retention_delete') as conn:
+                chunk_params = (next_id, next_id + chunk) + params
+                removed = self._source_totals(
+                    conn, f"main.{table}", table,
+                    f"WHERE id >= ? AND id < ? AND {condition}", chunk_params
+                )
+                references = self._content_references(
+                    conn, f"main.{table}", f"WHERE id >= ? AND id < ? AND {condition}", chunk_params
+                ) if table == 'clipboard_events' else []
+                cursor = conn.execute(
+                    f"DELETE FROM {table} WHERE id >= ? AND id < ? AND {condition}",
+                    chunk_params
+                )
+                deleted += cursor.rowcount
+                self._count_deleted(conn, table, removed)
+                self._release_content(conn, references)
+            
+            next_id += chunk
+            with self._retention_lock:
+                self._retention_stats['chunks'] += 1
+            self._set_retention_position(table, next_id, max_id)
+            
+            # Let queued ingestion writes take the lock
+            time.sleep(Config.DB_RETENTION_CHUNK_PAUSE)
+        
+        # Pass finished - start again from the oldest row next time
+        self._set_retention_position(table, None)
+        if deleted:
+            self._refresh_time_bounds([table])
+        return deleted, True
+    
+    def _source_totals(self, conn: sqlite3.Connection, source: str, table: str,
+                       where: str = "", params: tuple = ()) -> Dict[str, Any]:
+        """
+        Compute table_stats fields for the rows of one table/shard
+        
+        Unsynced rows are those past the slowest destination's cursor;
+        system_events is never synced and reports 0.
+        """
+        synced_through = self._synced_through(conn, table) if table in SYNCED_TABLES else None
+        row = conn.execute(f"""
+            SELECT COUNT(*),
+                   {'SUM(id > ?)' if synced_through is not None else '0'},
+                   SUM({self._ROW_BYTES_SQL[table]}),
+                   MIN(timestamp), MAX(timestamp)
+            FROM {source} {where}
+        """, ((synced_through,) if synced_through is not None else ()) + tuple(params)).fetchone()
+        return {
+            'row_count': row[0],
+            'unsynced_count': row[1] or 0,
+            'total_bytes': row[2] or 0,
+            'oldest_timestamp': row[3],
+            'newest_timestamp': row[4],
+        }
+    
+    @staticmethod
+    def _count_deleted(conn: sqlite3.Connection, table: str, removed: Dict[str, Any]):
+        """Subtract removed rows from table_stats (time bounds refreshed separately)"""
+        conn.execute("""
+            UPDATE table_stats
+            SET row_count = MAX(0, row_count - ?),
+                unsynced_count = MAX(0, unsynced_count - ?),
+                total_bytes = MAX(0, total_bytes - ?)
+            WHERE table_name = ?
+        """, (removed['row_count'], removed['unsynced_count'], removed['total_bytes'], table))
+    
+    def _table_sources(self, conn: sqlite3.Connection, table: str) -> Iterator[str]:
+        """Yield the main table and each shard (attached while it is yielded)"""
+        yield f"main.{table}"
+        if self._partitions is None or table not in PartitionManager.PARTITIONED_TABLES:
+            return
+        for partition in self._partitions.list_partitions(conn, table):
+            with self._partitions.attached(conn, table, partition['partition_key']) as schema:
+                if schema is not None:
+                    yield f"{schema}.{table}"
+    
+    def _refresh_time_bounds(self, tables: List[str]):
+        """Recompute oldest/newest timestamps after rows were removed (index lookups)"""
+        # Under the lock so a concurrent insert cannot be overwritten
+        with self._locked('statistics_bounds'):
+            with self._pool.reader() as conn:
+                bounds = {}
+                for table in tables:
+                    oldest, newest = [], []
+                    for source in self._table_sources(conn, table):
+                        low, high = conn.execute(
+                            f"SELECT MIN(timestamp), MAX(timestamp) FROM {source}"
+                        ).fetchone()
+                        if low is not None:
+                            oldest.append(low)
+                            newest.append(high)
+                    bounds[table] = (min(oldest, default=None), max(newest, default=None))
+            
+            conn = self._pool.writer()
+            for table, (oldest, newest) in bounds.items():
+                conn.execute("""
+                    UPDATE table_stats SET oldest_timestamp = ?, newest_timestamp = ?
+                    WHERE table_name = ?
+                """, (oldest, newest, table))
+            conn.commit()
+    
+    def _reconcile_statistics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Recount table_stats from the tables themselves (full scans)
+        
+        Writers are held off for the duration so no insert lands between
+        the count and the update; queued ingestion waits meanwhile.
+        
+        Returns:
+            Fields that had drifted, per table, as (stored, actual)
+        """
+        with self._locked('statistics_reconcile'):
+            with self._pool.reader() as conn:
+                actual = {}
+                for table in self._EVENT_COLUMNS:
+                    totals = None
+                    for source in self._table_sources(conn, table):
+                        part = self._source_totals(conn, source, table)
+                        if totals is None:
+                            totals = part
+                            continue
+                        for key in ('row_count', 'unsynced_count', 'total_bytes'):
+                            totals[key] += part[key]
+                        if part['oldest_timestamp'] is not None:
+                            totals['oldest_timestamp'] = min(
+                                filter(None, (totals['oldest_timestamp'], part['oldest_timestamp']))
+                            )
+                            totals['newest_timestamp'] = max(
+                                filter(None, (totals['newest_timestamp'], part['newest_timestamp']))
+                            )
+                    actual[table] = totals
+            
+            conn = self._pool.writer()
             try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
-                cursor = conn.cursor()
-                
-                # Calculate cutoff dates
-                cutoff_date = (datetime.now() - timedelta(days=retention_days)).isoformat()
-                screenshot_cutoff = (datetime.now() - timedelta(days=screenshot_days)).isoformat()
-                
-                # Delete old screenshots metadata (only if synced or older than threshold)
-                cursor.execute("""
-                    DELETE FROM screenshots 
-                    WHERE timestamp < ? AND (synced = 1 OR timestamp < ?)
-                """, (screenshot_cutoff, screenshot_cutoff))
-                screenshots_deleted = cursor.rowcount
-                
-                # Delete old clipboard events (only if synced)
-                cursor.execute("""
-                    DELETE FROM clipboard_events 
-                    WHERE timestamp < ? AND synced = 1
-                """, (cutoff_date,))
-                clipboard_deleted = cursor.rowcount
-                
-                # Delete old app usage (only if synced)
-                cursor.execute("""
-                    DELETE FROM app_usage 
-                    WHERE timestamp < ? AND synced = 1
-                """, (cutoff_date,))
-                app_usage_deleted = cursor.rowcount
-                
-                # Delete old system events
-                cursor.execute("""
-                    DELETE FROM system_events WHERE timestamp < ?
-                """, (cutoff_date,))
-                system_events_deleted = cursor.rowcount
+                stored = {
+                    row[0]: dict(zip(('row_count', 'unsynced_count', 'total_bytes',
+                                      'oldest_timestamp', 'newest_timestamp'), row[1:]))
+                    for row in conn.execute("""
+                        SELECT table_name, row_count, unsynced_count, total_bytes,
+                               oldest_timestamp, newest_timestamp
+                        FROM table_stats
+                    """)
+                }
                 
+                verified_at = datetime.now().isoformat()
+                for table, totals in actual.items():
+                    conn.execute("""
+                        INSERT OR REPLACE INTO table_stats (
+                            table_name, row_count, unsynced_count, total_bytes,
+                            oldest_timestamp, newest_timestamp, verified_at
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        table, totals['row_count'], totals['unsynced_count'], totals['total_bytes'],
+                        totals['oldest_timestamp'], totals['newest_timestamp'], verified_at
+                    ))
                 conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        drift = {}
+        for table, totals in actual.items():
+            if table not in stored:
+                continue
+            changed = {
+                key: (stored[table][key], value)
+                for key, value in totals.items()
+                if stored[table][key] != value
+            }
+            if changed:
+                drift[table] = changed
+        return drift
+    
+    def _set_retention_position(self, table: str, next_id: Optional[int], max_id: int = None):
+        """Record where the retention pass for a table should resume"""
+        with self._retention_lock:
+            positions = self._retention_stats['positions']
+            remaining = self._retention_stats['remaining_ids']
+            if next_id is None:
+                positions.pop(table, None)
+                remaining.pop(table, None)
+            else:
+                positions[table] = next_id
+                remaining[table] = max(0, max_id - next_id + 1)
+    
+    def get_retention_progress(self) -> Dict[str, Any]:
+        """Get retention job progress and counters"""
+        with self._retention_lock:
+            stats = dict(self._retention_stats)
+            stats['rows_deleted'] = dict(stats['rows_deleted'])
+            stats['positions'] = dict(stats['positions'])
+            stats['remaining_ids'] = dict(stats['remaining_ids'])
+        return stats
+    
+    def incremental_vacuum(self, max_pages: int = Config.DB_VACUUM_STEP_PAGES) -> int:
+        """
+        Return up to max_pages free pages to the filesystem
+        
+        Each call is one short write transaction, so ingestion can
+        interleave between calls.
+        
+        Returns:
+            Number of pages reclaimed
+        """
+        with self._writer('vacuum') as conn:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if before == 0:
+                return 0
+            
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            
+            # execute() would only step the pragma once (one page);
+            # executescript runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+            
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            reclaimed = before - after
+            
+            self._vacuum_stats['pages_reclaimed'] += reclaimed
+            self._vacuum_stats['bytes_reclaimed'] += reclaimed * page_size
+        
+        return reclaimed
+    
+    def reclaim_space(self, time_budget: float = Config.DB_VACUUM_TIME_BUDGET) -> int:
+        """
+        Run incremental vacuum steps until the freelist is empty or the
+        time budget is spent, yielding the writer lock between steps
+        
+        Returns:
+            Number of pages reclaimed
+        """
+        start = time.monotonic()
+        total = 0
+        
+        try:
+            while True:
+                reclaimed = self.incremental_vacuum()
+                total += reclaimed
                 
-                # Vacuum to reclaim space
-                cursor.execute("VACUUM")
+                if reclaimed == 0 or time.monotonic() - start >= time_budget:
+                    break
                 
-                conn.close()
+                # Let queued ingestion writes take the lock
+                if self._shutdown.wait(Config.DB_VACUUM_STEP_PAUSE):
+                    break
+        
+        except sqlite3.Error as e:
+            logger.error(f"Error during incremental vacuum: {e}")
+        
+        self._vacuum_stats['runs'] += 1
+        self._vacuum_stats['last_run'] = datetime.now().isoformat()
+        
+        if total:
+            logger.info(
+                f"Incremental vacuum reclaimed {total} pages "
+                f"in {time.monotonic() - start:.2f}s"
+            )
+        
+        return total
+    
+    def get_wal_size(self) -> int:
+        """Current size of the main database's WAL file in bytes"""
+        try:
+            return Path(f"{self.db_path}-wal").stat().st_size
+        except FileNotFoundError:
+            return 0
+    
+    def checkpoint(self, mode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Checkpoint the WAL (main database and attached shards)
+        
+        Without a mode, PASSIVE is used while the WAL is below
+        DB_WAL_RESTART_BYTES, RESTART above it and TRUNCATE above
+        DB_WAL_TRUNCATE_BYTES. A PASSIVE checkpoint is skipped while the
+        write-behind queue holds at least DB_CHECKPOINT_BUSY_QUEUE_ROWS
+        rows; RESTART/TRUNCATE wait at most DB_CHECKPOINT_BUSY_TIMEOUT
+        for readers to move past the WAL.
+        
+        Returns:
+            Checkpoint result (mode, busy, log/checkpointed frames, WAL
+            size before and after), or None if deferred
+        """
+        wal_bytes = self.get_wal_size()
+        if mode is None:
+            if wal_bytes >= Config.DB_WAL_TRUNCATE_BYTES:
+                mode = 'TRUNCATE'
+            elif wal_bytes >= Config.DB_WAL_RESTART_BYTES:
+                mode = 'RESTART'
+            else:
+                mode = 'PASSIVE'
+            
+            if mode == 'PASSIVE' and self._write_queue is not None and \
+                    self._write_queue.qsize() >= Config.DB_CHECKPOINT_BUSY_QUEUE_ROWS:
+                self._checkpoint_stats['deferred'] += 1
+                logger.debug("Ingestion burst in progress, deferring WAL checkpoint")
+                return None
+        
+        mode = mode.upper()
+        if mode not in self._checkpoint_stats['runs']:
+            raise ValueError(f"Unsupported checkpoint mode: {mode}")
+        
+        with self._writer('checkpoint') as conn:
+            if mode != 'PASSIVE':
+                conn.execute(f"PRAGMA busy_timeout = {int(Config.DB_CHECKPOINT_BUSY_TIMEOUT * 1000)}")
+            try:
+                busy, log_frames, checkpointed = conn.execute(
+                    f"PRAGMA wal_checkpoint({mode})"
+                ).fetchone()
+            finally:
+                if mode != 'PASSIVE':
+                    conn.execute(f"PRAGMA busy_timeout = {int(self._pool.timeout * 1000)}")
+        
+        stats = self._checkpoint_stats
+        stats['runs'][mode] += 1
+        stats['busy'] += 1 if busy else 0
+        stats['last_run'] = datetime.now().isoformat()
+        stats['last_mode'] = mode
+        stats['last_log_frames'] = log_frames
+        stats['last_checkpointed_frames'] = checkpointed
+        
+        result = {
+            'mode': mode,
+            'busy': bool(busy),
+            'log_frames': log_frames,
+            'checkpointed_frames': checkpointed,
+            'wal_bytes_before': wal_bytes,
+            'wal_bytes_after': self.get_wal_size(),
+        }
+        if busy or mode != 'PASSIVE':
+            logger.info(f"WAL checkpoint: {result}")
+        return result
+    
+    def get_durability(self) -> Dict[str, Any]:
+        """
+        Get the effective durability settings and the window of
+        acknowledged log_* calls that can be lost
+        
+        process_crash_loss_ms covers the watchdog dying (rows still in the
+        write-behind queue); power_loss_window_ms an OS crash or power cut
+        (commits not yet synced to disk), None meaning unbounded. Both are
+        nominal: they assume the writer keeps up with the queue and every
+        scheduled checkpoint runs.
+        
+        The *_max_calls values are the real upper bounds, in acknowledged
+        log_* / log_events calls: a crash loses the whole queue plus the
+        batch being committed. With synchronous=NORMAL every commit since
+        the last checkpoint is at risk, and PASSIVE checkpoints are skipped
+        while the queue holds checkpoint_deferred_from_rows rows, so a
+        sustained burst extends the window until the WAL reaches
+        DB_WAL_RESTART_BYTES - that bound is None (unbounded).
+        """
+        if self.write_behind:
+            queue_window = self.batch_max_ms
+            # Each queued item is one call; a batch in commit holds at most batch_max_rows calls
+            crash_calls = self._write_queue.maxsize + self.batch_max_rows
+            deferred_from = Config.DB_CHECKPOINT_BUSY_QUEUE_ROWS
+        else:
+            queue_window = 0
+            crash_calls = 0
+            deferred_from = None
+        
+        if self.synchronous == 'FULL':
+            power_window = queue_window
+            power_calls = crash_calls
+        elif self.synchronous == 'NORMAL':
+            # WAL is synced when checkpointed (maintenance thread or backstop)
+            power_window = queue_window + self.checkpoint_interval * 1000 \
+                if self._maintenance_thread is not None else None
+            power_calls = None
+        else:
+            power_window = None
+            power_calls = None
+        
+        return {
+            'mode': self.durability,
+            'synchronous': self.synchronous,
+            'write_behind': self.write_behind,
+            'batch_max_rows': self.batch_max_rows,
+            'batch_max_ms': self.batch_max_ms,
+            'checkpoint_interval': self.checkpoint_interval,
+            'checkpoint_deferred_from_rows': deferred_from,
+            'process_crash_loss_ms': queue_window,
+            'process_crash_loss_max_calls': crash_calls,
+            'power_loss_window_ms': power_window,
+            'power_loss_max_calls': power_calls,
+        }
+    
+    def get_checkpoint_stats(self) -> Dict[str, Any]:
+        """Get WAL size, checkpoint lag and checkpoint counters"""
+        stats = dict(self._checkpoint_stats)
+        stats['runs'] = dict(stats['runs'])
+        stats['wal_size_mb'] = round(self.get_wal_size() / (1024 * 1024), 2)
+        # WAL frames written but not yet copied into the database
+        stats['lag_frames'] = max(0, stats['last_log_frames'] - stats['last_checkpointed_frames'])
+        return stats
+    
+    def _schedule_maintenance(self, name: str, interval: float, func: Callable[[], Any]):
+        """Register a periodic task for the maintenance thread"""
+        self._maintenance_tasks.append({
+            'name': name,
+            'interval': interval,
+            'func': func,
+            'next_run': time.monotonic() + interval,
+        })
+    
+    def _maintenance_loop(self):
+        """Run scheduled maintenance tasks until close()"""
+        logger.info("Database maintenance thread started")
+        
+        while not self._shutdown.is_set():
+            for task in self._maintenance_tasks:
+                if self._shutdown.is_set():
+                    break
+                if time.monotonic() < task['next_run']:
+                    continue
                 
-                logger.info(
-                    f"Cleanup complete - Deleted: {screenshots_deleted} screenshots, "
-                    f"{clipboard_deleted} clipboard events, {app_usage_deleted} app usage records, "
-                    f"{system_events_deleted} system events"
-                )
+                try:
+                    task['func']()
+                except Exception as e:
+                    logger.error(f"Maintenance task {task['name']} failed: {e}")
                 
-            except sqlite3.Error as e:
-                logger.error(f"Error during cleanup: {e}")
+                task['next_run'] = time.monotonic() + task['interval']
+            
+            next_run = min((t['next_run'] for t in self._maintenance_tasks), default=None)
+            wait = 1.0 if next_run is None else next_run - time.monotonic()
+            self._shutdown.wait(min(max(wait, 0.1), 60.0))
+        
+        logger.info("Database maintenance thread stopped")
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get database statistics"""
-        with self.lock:
-            try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
+    def get_statistics(self, verify: bool = False) -> Dict[str, Any]:
+        """
+        Get database statistics
+        
+        Row counts, unsynced counts, payload bytes and time ranges come
+        from the incrementally maintained table_stats rows.
+        
+        Args:
+            verify: Recount every table first and correct any drift (slow,
+                full scans; the drift found is returned under 'stats_drift')
+        """
+        try:
+            drift = self._reconcile_statistics() if verify else None
+            if drift:
+                logger.warning(f"table_stats drift corrected: {drift}")
+            
+            # WAL readers see a consistent snapshot without blocking the writer
+            with self._timed('statistics'), self._pool.reader() as conn:
                 cursor = conn.cursor()
                 
                 stats = {}
                 
-                # Count records in each table
-                for table in ['screenshots', 'clipboard_events', 'app_usage', 'system_events']:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                    stats[f'{table}_count'] = cursor.fetchone()[0]
-                    
-                    # Count unsynced records
-                    if table != 'system_events':
-                        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE synced = 0")
-                        stats[f'{table}_unsynced'] = cursor.fetchone()[0]
+                for table, row_count, unsynced, total_bytes, oldest, newest in cursor.execute("""
+                    SELECT table_name, row_count, unsynced_count, total_bytes,
+                           oldest_timestamp, newest_timestamp
+                    FROM table_stats
+                """).fetchall():
+                    stats[f'{table}_count'] = row_count
+                    if table in SYNCED_TABLES:
+                        stats[f'{table}_unsynced'] = unsynced
+                    stats[f'{table}_bytes'] = total_bytes
+                    stats[f'{table}_oldest'] = oldest
+                    stats[f'{table}_newest'] = newest
+                
+                if self._partitions is not None:
+                    cursor.execute("SELECT COUNT(*) FROM partitions")
+                    stats['partition_count'] = cursor.fetchone()[0]
+                
+                if self._archive is not None:
+                    cursor.execute("""
+                        SELECT COUNT(*), COALESCE(SUM(row_count), 0),
+                               COALESCE(SUM(file_bytes), 0), COALESCE(SUM(raw_bytes), 0),
+                               MIN(min_timestamp)
+                        FROM archive_segments
+                    """)
+                    segments, rows, file_bytes, raw_bytes, oldest = cursor.fetchone()
+                    stats['archive'] = {
+                        'segments': segments,
+                        'rows': rows,
+                        'size_mb': round(file_bytes / (1024 * 1024), 2),
+                        'compression_ratio': round(raw_bytes / file_bytes, 2) if file_bytes else None,
+                        'oldest_timestamp': oldest,
+                    }
                 
                 # Get database size
                 cursor.execute("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()")
                 size_bytes = cursor.fetchone()[0]
                 stats['database_size_mb'] = round(size_bytes / (1024 * 1024), 2)
                 
-                # Get date range
-                cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM screenshots")
-                result = cursor.fetchone()
-                if result[0]:
-                    stats['oldest_screenshot'] = result[0]
-                    stats['newest_screenshot'] = result[1]
+                # Free pages awaiting incremental vacuum
+                cursor.execute("PRAGMA freelist_count")
+                stats['freelist_pages'] = cursor.fetchone()[0]
                 
-                conn.close()
+                # Get date range
+                if stats.get('screenshots_oldest'):
+                    stats['oldest_screenshot'] = stats['screenshots_oldest']
+                    stats['newest_screenshot'] = stats['screenshots_newest']
                 
-                return stats
+                cursor.close()
+            
+            stats['connection_pool'] = self.get_pool_stats()
+            stats['write_behind'] = self.get_write_stats()
+            stats['vacuum_pages_reclaimed'] = self._vacuum_stats['pages_reclaimed']
+            stats['vacuum_bytes_reclaimed'] = self._vacuum_stats['bytes_reclaimed']
+            stats['vacuum_last_run'] = self._vacuum_stats['last_run']
+            stats['wal'] = self.get_checkpoint_stats()
+            stats['durability'] = self.get_durability()
+            stats['retention'] = self.get_retention_progress()
+            stats['dictionaries'] = self.get_dictionary_stats()
+            stats['clipboard_content'] = self.get_content_store_stats()
+            stats['operation_timings'] = self.get_operation_timings()
+            if drift is not None:
+                stats['stats_drift'] = drift
+            
+            return stats
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error getting statistics: {e}")
+            return {}
+    
+    def list_archive_segments(self, table: str = None) -> List[Dict[str, Any]]:
+        """List archive segment files in the catalog, oldest first per table"""
+        where, params = ("WHERE table_name = ?", (table,)) if table else ("", ())
+        return self.query(f"""
+            SELECT * FROM archive_segments {where}
+            ORDER BY table_name, min_timestamp, min_id
+        """, params)
+    
+    def iter_archived(self, table: str, since: str = None, until: str = None,
+                      columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate archived rows with since <= timestamp < until
+        
+        Segments are picked from the catalog by their time range; within a
+        segment only blocks overlapping the range are decompressed. Rows are
+        in timestamp order per segment, segments oldest first.
+        
+        Args:
+            table: Event table name
+            since: Inclusive ISO-8601 lower bound (None for unbounded)
+            until: Exclusive ISO-8601 upper bound (None for unbounded)
+            columns: Columns to return (all archived columns if None)
+        """
+        if table not in self._EVENT_COLUMNS:
+            raise ValueError(f"Unknown event table: {table}")
+        if self._archive is None:
+            return
+        
+        conditions = ["table_name = ?"]
+        params: List[Any] = [table]
+        if since:
+            conditions.append("max_timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("min_timestamp < ?")
+            params.append(until)
+        segments = self.query(f"""
+            SELECT filepath FROM archive_segments
+            WHERE {' AND '.join(conditions)}
+            ORDER BY min_timestamp, min_id
+        """, tuple(params))
+        
+        yield from self._archive.scan(
+            table, since, until, columns, paths=[Path(s['filepath']) for s in segments]
+        )
+    
+    def list_partitions(self, table: str = None) -> List[Dict[str, Any]]:
+        """List shard files in the partition catalog (empty if not partitioned)"""
+        with self._pool.reader() as conn:
+            return PartitionManager.list_partitions(conn, table)
+    
+    def query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """
+        Run a read-only query and return all rows as dicts
+        
+        Runs on a pooled reader (query_only, WAL snapshot), so it never
+        waits for the writer lock; statements that write are rejected by
+        SQLite. Use iter_query() for large results.
+        """
+        with self._pool.reader() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def iter_query(self, sql: str, params: tuple = (),
+                   batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Stream a read-only query's rows as dicts
+        
+        The reader connection is held until the iterator is exhausted or
+        closed.
+        """
+        with self._pool.reader() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(zip(columns, row))
+            finally:
+                cursor.close()
+    
+    def latest_events(self, table: str, limit: int = 100,
+                      columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get the newest rows of an event table, newest first
+        
+        In the partitioned layout shards are read newest period first and
+        the scan stops once older shards cannot contribute.
+        
+        Args:
+            table: Event table name
+            limit: Maximum rows
+            columns: Columns to return (all but the legacy sync flags if None;
+                'timestamp' is always included)
+        """
+        if table not in self._EVENT_COLUMNS:
+            raise ValueError(f"Unknown event table: {table}")
+        
+        if columns and 'timestamp' not in columns:
+            columns = ['timestamp'] + list(columns)
+        columns = columns or self._get_read_columns(table)
+        
+        def select(source: str) -> str:
+            return self._decoded_select(table, source, columns) + \
+                " ORDER BY t.timestamp DESC, t.id DESC LIMIT ?"
+        
+        with self._pool.reader() as conn:
+            cursor = conn.execute(select(f"main.{table}"), (limit,))
+            names = [d[0] for d in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+            
+            if self._partitions is not None and table in PartitionManager.PARTITIONED_TABLES:
+                for partition in reversed(self._partitions.list_partitions(conn, table)):
+                    if len(rows) >= limit and \
+                            partition['period_end'] <= (rows[limit - 1]['timestamp'] or '')[:10]:
+                        break
+                    with self._partitions.attached(conn, table, partition['partition_key']) as schema:
+                        if schema is None:
+                            continue
+                        cursor = conn.execute(select(f"{schema}.{table}"), (limit,))
+                        rows += [dict(zip(names, row)) for row in cursor.fetchall()]
+                    rows.sort(key=lambda r: r['timestamp'] or '', reverse=True)
+        
+        return rows[:limit]
+    
+    def iter_events(self, table: str, since: str = None, until: str = None,
+                    batch_size: int = 500,
+                    columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate event rows with since <= timestamp < until, oldest first
+        
+        Reads the main table and, in the partitioned layout, each shard
+        overlapping the range in period order, on a read-only connection.
+        
+        Args:
+            table: Event table name
+            since: Inclusive ISO-8601 lower bound (None for unbounded)
+            until: Exclusive ISO-8601 upper bound (None for unbounded)
+            batch_size: Rows fetched per round trip
+            columns: Columns to return (all but the legacy sync flags if None)
+        """
+        if table not in self._EVENT_COLUMNS:
+            raise ValueError(f"Unknown event table: {table}")
+        columns = columns or self._get_read_columns(table)
+        
+        column, convert = self._range_column()
+        
+        conditions = []
+        params: List[Any] = []
+        if since:
+            conditions.append(f"t.{column} >= ?")
+            params.append(convert(since))
+        if until:
+            conditions.append(f"t.{column} < ?")
+            params.append(convert(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f"t.{column}, t.id"
+        
+        with self._pool.reader() as conn:
+            sources = [None]
+            if self._partitions is not None and table in PartitionManager.PARTITIONED_TABLES:
+                sources += [
+                    p['partition_key']
+                    for p in self._partitions.list_partitions(conn, table, since, until)
+                ]
+            
+            for key in sources:
+                if key is None:
+                    yield from self._iter_source(
+                        conn, self._decoded_select(table, f"main.{table}", columns),
+                        where, order, params, batch_size
+                    )
+                    continue
+                with self._partitions.attached(conn, table, key) as schema:
+                    if schema is not None:
+                        yield from self._iter_source(
+                            conn, self._decoded_select(table, f"{schema}.{table}", columns),
+                            where, order, params, batch_size
+                        )
+    
+    def _range_column(self) -> tuple:
+        """
+        Column for timestamp range predicates and the converter for its bounds
+        
+        The indexed epoch ts once the v2 backfill is done, the ISO text
+        before (rows not yet backfilled have no ts).
+        """
+        if self._ts_ready:
+            return 'ts', iso_to_epoch_ms
+        return 'timestamp', str
+    
+    @staticmethod
+    def _iter_source(conn: sqlite3.Connection, select: str, where: str, order: str,
+                     params: List[Any], batch_size: int) -> Iterator[Dict[str, Any]]:
+        """Stream rows of one table/shard (a _decoded_select) as dicts"""
+        cursor = conn.execute(f"{select} {where} ORDER BY {order}", params)
+        columns = [d[0] for d in cursor.description]
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        """
+        Turn free text into an FTS5 query: every word must match, a
+        trailing '*' makes a word a prefix
+        """
+        terms = []
+        for word in text.split():
+            prefix = word.endswith('*')
+            word = word.rstrip('*').replace('"', '""')
+            if word:
+                terms.append(f'"{word}"' + ('*' if prefix else ''))
+        return ' '.join(terms)
+    
+    def search(self, text: str, since: str = None, until: str = None,
+               tables: Optional[List[str]] = None, limit: int = 50,
+               offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Full-text search over window titles and clipboard previews
+        
+        Results are ranked by BM25 relevance (rows sharing a matching
+        window title rank equally and come newest first) and paginated
+        with limit/offset. Each source returns at most offset + limit
+        rows, which are merged here.
+        
+        Args:
+            text: Words to search for (all must match; 'word*' for a prefix)
+            since: Inclusive ISO-8601 lower bound (None for unbounded)
+            until: Exclusive ISO-8601 upper bound (None for unbounded)
+            tables: Tables to search (all of SEARCHABLE if None)
+            limit: Page size
+            offset: Rows to skip
+            
+        Returns:
+            Hits with table, id, timestamp, column, text, snippet and rank
+        """
+        if not self.full_text_search:
+            logger.warning("search() called with full-text search disabled")
+            return []
+        
+        tables = tables or list(self.SEARCHABLE)
+        for table in tables:
+            if table not in self.SEARCHABLE:
+                raise ValueError(f"Table is not searchable: {table}")
+        
+        match = self._fts_query(text)
+        if not match:
+            return []
+        
+        column, convert = self._range_column()
+        conditions = []
+        params: List[Any] = []
+        if since:
+            conditions.append(f"t.{column} >= ?")
+            params.append(convert(since))
+        if until:
+            conditions.append(f"t.{column} < ?")
+            params.append(convert(until))
+        
+        top = offset + limit
+        hits = []
+        with self._timed('search'), self._pool.reader() as conn:
+            for table in tables:
+                hits += self._search_source(conn, table, 'main', match, conditions, params, top)
                 
-            except sqlite3.Error as e:
-                logger.error(f"Error getting statistics: {e}")
-                return {}
+                if self._partitions is None or table not in PartitionManager.PARTITIONED_TABLES:
+                    continue
+                for partition in self._partitions.list_partitions(conn, table, since, until):
+                    with self._partitions.attached(conn, table, partition['partition_key']) as schema:
+                        if schema is not None:
+                            hits += self._search_source(
+                                conn, table, schema, match, conditions, params, top
+                            )
+        
+        # Best rank first, newest first among equal ranks
+        hits.sort(key=lambda hit: hit['timestamp'] or '', reverse=True)
+        hits.sort(key=lambda hit: hit['rank'])
+        return hits[offset:top]
+    
+    def _search_source(self, conn: sqlite3.Connection, table: str, schema: str, match: str,
+                       conditions: List[str], params: List[Any], top: int) -> List[Dict[str, Any]]:
+        """Top matching rows of one table/shard, best rank first"""
+        column, index = self.SEARCHABLE[table]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        if index == 'window_titles_fts':
+            # Match distinct titles once, then join to the rows using them
+            sql = f"""
+                WITH hits AS (
+                    SELECT rowid AS match_id, bm25({index}) AS rank,
+                           snippet({index}, 0, '[', ']', '...', 12) AS snippet
+                    FROM main.{index} WHERE {index} MATCH ?
+                )
+                SELECT t.id, t.timestamp, d.value, hits.snippet, hits.rank
+                FROM hits
+                JOIN main.window_titles d ON d.id = hits.match_id
+                JOIN {schema}.{table} t ON t.{column}_id = hits.match_id
+                {where}
+                ORDER BY hits.rank, t.timestamp DESC
+                LIMIT ?
+            """
+        else:
+            if not conn.execute(
+                f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                (index,)
+            ).fetchone():
+                logger.debug(f"No full-text index in {schema}, skipping")
+                return []
+            sql = f"""
+                WITH hits AS (
+                    SELECT rowid AS match_id, bm25({index}) AS rank,
+                           snippet({index}, 0, '[', ']', '...', 12) AS snippet
+                    FROM {schema}.{index} WHERE {index} MATCH ?
+                )
+                SELECT t.id, t.timestamp, t.{column}, hits.snippet, hits.rank
+                FROM hits
+                JOIN {schema}.{table} t ON t.id = hits.match_id
+                {where}
+                ORDER BY hits.rank, t.timestamp DESC
+                LIMIT ?
+            """
+        
+        return [
+            {
+                'table': table,
+                'id': row_id,
+                'timestamp': timestamp,
+                'column': column,
+                'text': value,
+                'snippet': snippet,
+                'rank': rank,
+            }
+            for row_id, timestamp, value, snippet, rank
+            in conn.execute(sql, [match] + params + [top]).fetchall()
+        ]
+    
+    def rebuild_search_index(self) -> Dict[str, int]:
+        """
+        Re-index every row from the content tables
+        
+        Needed once after enabling full-text search on an existing
+        database. Each index (and each shard's) is rebuilt in one
+        transaction holding the writer; log_* calls queue meanwhile.
+        
+        Returns:
+            Rows indexed per index
+        """
+        if not self.full_text_search:
+            logger.warning("rebuild_search_index() called with full-text search disabled")
+            return {}
+        
+        start = time.monotonic()
+        indexed: Dict[str, int] = {}
+        
+        try:
+            with self._writer('search_rebuild') as conn:
+                self._create_search_index(conn.cursor())
+                for name, (content, column) in self.SEARCH_INDEXES.items():
+                    conn.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+                    indexed[name] = conn.execute(f"SELECT COUNT(*) FROM {content}").fetchone()[0]
+            
+            # Shards carry their own index (created when a shard is attached)
+            if self._partitions is not None:
+                name = 'clipboard_events_fts'
+                with self._locked('search_rebuild'):
+                    conn = self._pool.writer()
+                    try:
+                        for partition in self._partitions.list_partitions(conn, 'clipboard_events'):
+                            key = partition['partition_key']
+                            self._partitions.prepare_writer(conn, 'clipboard_events', [key])
+                            schema = PartitionManager.schema_name('clipboard_events', key)
+                            conn.execute(f"INSERT INTO {schema}.{name} ({name}) VALUES ('rebuild')")
+                            conn.commit()
+                            indexed[name] += partition['row_count'] or 0
+                    except Exception:
+                        conn.rollback()
+                        raise
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error rebuilding full-text indexes: {e}", exc_info=True)
+            return indexed
+        
+        logger.info(f"Rebuilt full-text indexes in {time.monotonic() - start:.1f}s: {indexed}")
+        return indexed
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool statistics"""
+        return self._pool.get_stats()
     
     def optimize_database(self):
         """Optimize database performance"""
-        with self.lock:
-            try:
-                conn = sqlite3.connect(str(self.db_path), timeout=10.0)
+        try:
+            with self._writer('optimize') as conn:
                 cursor = conn.cursor()
                 
                 # Analyze tables
@@ -448,14 +4054,24 @@ class DatabaseManager:
                 
                 # Optimize
                 cursor.execute("PRAGMA optimize")
-                
-                conn.close()
-                
-                logger.info("Database optimized")
-                
-            except sqlite3.Error as e:
-                logger.error(f"Error optimizing database: {e}")
+            
+            logger.info("Database optimized")
+            
+        except sqlite3.Error as e:
+            logger.error(f"Error optimizing database: {e}")
     
     def close(self):
-        """Close database connections"""
-        logger.info("Database manager closed")
\ No newline at end of file
+        """Drain pending writes and close database connections"""
+        self._shutdown.set()
+        if self._maintenance_thread is not None:
+            self._maintenance_thread.join()
+        if self._migration_thread is not None:
+            self._migration_thread.join()
+        
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            self._write_queue.put(_STOP_WRITER)
+            self._writer_thread.join()
+        
+        with self.lock:
+            self._pool.close()
+        logger.info("Database manager closed")
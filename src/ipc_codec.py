@@ -0,0 +1,281 @@
+"""
+IPC Codec
+Wire formats for IPC message frames
+
+The codec of a connection is chosen by a handshake when the User Agent
+connects (see IPCClient.connect):
+
+- json: the original format (field names, auth token and float timestamp
+  as text). Always available; used with peers that predate the handshake
+- binary: versioned struct layout with one schema per msg_type - numeric
+  fields fixed-width, strings length-prefixed, anything outside the
+  schema carried in a JSON tail - and no auth token, because the
+  connection was authenticated by the handshake
+- msgpack: optional, offered only when the msgpack package is installed
+
+JSON frames always start with '{' and binary/msgpack frames never do, so
+the receiver can accept a JSON frame on any connection. Decoders take any
+bytes-like object (bytes, bytearray, memoryview).
+
+A batch frame carries several messages encoded with the connection's
+codec: a 0x00 marker, a u32 message count, then each body as a u32 length
+followed by the bytes. It is only sent to servers that announced batch
+support in the handshake.
+"""
+
+import json
+import struct
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# (msg_type, data, auth_token, timestamp)
+Fields = Tuple[str, Dict[str, Any], Optional[str], float]
+
+
+class JSONCodec:
+    """Self-describing JSON frames (the original wire format)"""
+    
+    name = 'json'
+    
+    def encode(self, msg_type: str, data: Dict[str, Any],
+               auth_token: Optional[str], timestamp: float) -> bytes:
+        """Encode message fields to a frame body"""
+        return json.dumps({
+            'msg_type': msg_type,
+            'data': data,
+            'auth_token': auth_token,
+            'timestamp': timestamp
+        }, default=str).encode('utf-8')
+    
+    def decode(self, buf) -> Fields:
+        """Decode a frame body to (msg_type, data, auth_token, timestamp)"""
+        if not isinstance(buf, (bytes, bytearray)):
+            buf = str(buf, 'utf-8')  # json.loads does not take memoryviews
+        obj = json.loads(buf)
+        return obj['msg_type'], obj['data'], obj.get('auth_token'), obj.get('timestamp')
+
+
+class BinaryCodec:
+    """
+    Schema-per-msg_type binary frames
+    
+    Layout (little endian):
+        version (u8) | schema id (u8) | present bitmap (u16) | timestamp (f64)
+        | present fields in schema order | extras (str)
+    
+    Strings are a u32 byte length followed by UTF-8; 'q' fields are i64 and
+    'd' fields f64. A field is written in place only if its value has the
+    schema type; None values, other types and keys the schema does not
+    know go into the extras JSON object, so every payload round-trips
+    exactly. Messages without a schema (schema id 0) carry msg_type and
+    the whole payload as JSON.
+    """
+    
+    name = 'binary'
+    VERSION = 1
+    
+    HEADER = struct.Struct('<BBHd')
+    LENGTH = struct.Struct('<I')
+    NUMBERS = {'q': struct.Struct('<q'), 'd': struct.Struct('<d')}
+    
+    # msg_type -> (schema id, ((field, type), ...)); at most 16 fields.
+    # Append new fields at the end and new types with a new id - the
+    # layout of an existing id must never change within a VERSION.
+    SCHEMAS = {
+        'screenshot': (1, (
+            ('timestamp', 's'), ('filepath', 's'), ('file_size_bytes', 'q'),
+            ('resolution', 's'), ('active_window', 's'), ('active_app', 's'),
+        )),
+        'clipboard': (2, (
+            ('timestamp', 's'), ('content_type', 's'), ('content_preview', 's'),
+            ('encrypted_content', 's'), ('content_hash', 's'), ('source_app', 's'),
+        )),
+        'app_usage': (3, (
+            ('timestamp', 's'), ('app_name', 's'), ('window_title', 's'),
+            ('duration_seconds', 'd'),
+        )),
+        'ping': (4, (
+            ('agent_id', 's'),
+        )),
+    }
+    
+    _BY_ID = {schema_id: (msg_type, fields) for msg_type, (schema_id, fields) in SCHEMAS.items()}
+    
+    @staticmethod
+    def _fits(value: Any, kind: str) -> bool:
+        """Check whether a value can be stored in a field of this type"""
+        if kind == 's':
+            return isinstance(value, str)
+        if kind == 'q':
+            return type(value) is int and -2 ** 63 <= value < 2 ** 63
+        return type(value) is float
+    
+    def _pack_str(self, parts: List[bytes], value: str):
+        """Append a length-prefixed UTF-8 string"""
+        encoded = value.encode('utf-8')
+        parts.append(self.LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    
+    def _unpack_str(self, buf, offset: int) -> Tuple[str, int]:
+        """Read a length-prefixed string, returning it and the next offset"""
+        length = self.LENGTH.unpack_from(buf, offset)[0]
+        offset += self.LENGTH.size
+        end = offset + length
+        if end > len(buf):
+            raise ValueError("Truncated binary IPC frame")
+        return str(buf[offset:end], 'utf-8'), end
+    
+    def encode(self, msg_type: str, data: Dict[str, Any],
+               auth_token: Optional[str], timestamp: float) -> bytes:
+        """Encode message fields to a frame body (auth_token is not sent)"""
+        schema = self.SCHEMAS.get(msg_type)
+        parts = [b'']
+        present = 0
+        
+        if schema is None or not isinstance(data, dict):
+            schema_id = 0
+            self._pack_str(parts, msg_type)
+            self._pack_str(parts, json.dumps(data, default=str))
+        else:
+            schema_id, fields = schema
+            extras = dict(data)
+            for bit, (field, kind) in enumerate(fields):
+                value = extras.get(field)
+                if value is None or not self._fits(value, kind):
+                    continue
+                del extras[field]
+                present |= 1 << bit
+                if kind == 's':
+                    self._pack_str(parts, value)
+                else:
+                    parts.append(self.NUMBERS[kind].pack(value))
+            self._pack_str(parts, json.dumps(extras, default=str) if extras else '')
+        
+        parts[0] = self.HEADER.pack(self.VERSION, schema_id, present, float(timestamp or 0.0))
+        return b''.join(parts)
+    
+    def decode(self, buf) -> Fields:
+        """Decode a frame body to (msg_type, data, None, timestamp)"""
+        version, schema_id, present, timestamp = self.HEADER.unpack_from(buf, 0)
+        if version != self.VERSION:
+            raise ValueError(f"Unsupported binary IPC version: {version}")
+        offset = self.HEADER.size
+        
+        if schema_id == 0:
+            msg_type, offset = self._unpack_str(buf, offset)
+            payload, offset = self._unpack_str(buf, offset)
+            return msg_type, json.loads(payload), None, timestamp
+        
+        if schema_id not in self._BY_ID:
+            raise ValueError(f"Unknown binary IPC schema: {schema_id}")
+        msg_type, fields = self._BY_ID[schema_id]
+        
+        data = {}
+        unpack_length = self.LENGTH.unpack_from
+        for bit, (field, kind) in enumerate(fields):
+            if not present & (1 << bit):
+                continue
+            if kind == 's':
+                length = unpack_length(buf, offset)[0]
+                offset += 4
+                data[field] = str(buf[offset:offset + length], 'utf-8')
+                offset += length
+            else:
+                number = self.NUMBERS[kind]
+                data[field] = number.unpack_from(buf, offset)[0]
+                offset += number.size
+        
+        extras, offset = self._unpack_str(buf, offset)
+        if extras:
+            data.update(json.loads(extras))
+        if offset != len(buf):
+            raise ValueError("Malformed binary IPC frame")
+        return msg_type, data, None, timestamp
+
+
+class MsgpackCodec:
+    """msgpack frames: [msg_type, timestamp, data] (needs the msgpack package)"""
+    
+    name = 'msgpack'
+    
+    def encode(self, msg_type: str, data: Dict[str, Any],
+               auth_token: Optional[str], timestamp: float) -> bytes:
+        """Encode message fields to a frame body (auth_token is not sent)"""
+        return msgpack.packb([msg_type, timestamp, data], use_bin_type=True, default=str)
+    
+    def decode(self, buf) -> Fields:
+        """Decode a frame body to (msg_type, data, None, timestamp)"""
+        msg_type, timestamp, data = msgpack.unpackb(buf, raw=False)
+        return msg_type, data, None, timestamp
+
+
+CODECS = {'json': JSONCodec(), 'binary': BinaryCodec()}
+if msgpack is not None:
+    CODECS['msgpack'] = MsgpackCodec()
+
+
+def get_codec(name: str):
+    """Look up a codec by name (KeyError if unknown or not installed)"""
+    return CODECS[name]
+
+
+def available_codecs(preference) -> List[str]:
+    """
+    Installed codecs in preference order, always ending with json
+    
+    Args:
+        preference: Codec names, most preferred first (e.g. Config.IPC_CODECS)
+    """
+    names = [name for name in preference if name in CODECS and name != 'json']
+    return names + ['json']
+
+
+def negotiate(offered, preference) -> str:
+    """Pick the first codec of our preference the peer also offered (json if none)"""
+    offered = set(offered or ())
+    for name in available_codecs(preference):
+        if name in offered:
+            return name
+    return 'json'
+
+
+def is_json_frame(buf) -> bool:
+    """Check whether a frame body is JSON (possible on any connection)"""
+    return len(buf) > 0 and buf[0] == 0x7b  # '{'
+
+
+BATCH_MARKER = 0x00
+_BATCH_HEADER = struct.Struct('<BI')
+_BATCH_LENGTH = struct.Struct('<I')
+
+
+def encode_batch(bodies: List[bytes]) -> bytes:
+    """Pack encoded message bodies into one batch frame body"""
+    parts = [_BATCH_HEADER.pack(BATCH_MARKER, len(bodies))]
+    for body in bodies:
+        parts.append(_BATCH_LENGTH.pack(len(body)))
+        parts.append(body)
+    return b''.join(parts)
+
+
+def is_batch_frame(buf) -> bool:
+    """Check whether a frame body is a batch"""
+    return len(buf) > 0 and buf[0] == BATCH_MARKER
+
+
+def iter_batch(buf) -> Iterator[memoryview]:
+    """Yield the message bodies of a batch frame (views into buf, no copies)"""
+    view = memoryview(buf)
+    marker, count = _BATCH_HEADER.unpack_from(view, 0)
+    offset = _BATCH_HEADER.size
+    for _ in range(count):
+        length = _BATCH_LENGTH.unpack_from(view, offset)[0]
+        offset += _BATCH_LENGTH.size
+        if offset + length > len(view):
+            raise ValueError("Truncated IPC batch frame")
+        yield view[offset:offset + length]
+        offset += length
@@ -1,21 +1,45 @@
 """
 IPC Manager
 Handles socket-based communication between Service Watchdog and User Agent
+
+Frames are a 4-byte big-endian length followed by a body encoded by one of
+the codecs in ipc_codec. On connect the client sends a JSON 'hello' frame
+with its auth token and the codecs it supports; the server answers with
+the codec to use for the rest of the connection. A server that predates
+the handshake never answers, and the client stays on JSON.
+
+Servers that answer the handshake also accept batch frames: the client
+holds events for up to IPC_BATCH_LINGER_MS and sends them together, and
+the server hands runs of same-type messages to batch handlers.
+
+Two server implementations share the protocol code: IPCServer (a thread
+per connection) and AsyncIPCServer (one asyncio event loop for all
+connections, handlers run on a small thread pool). create_ipc_server()
+picks one from Config.IPC_SERVER_MODE. Both run over a transport from
+ipc_transport (loopback TCP, or a Unix domain socket), as does IPCClient.
 """
 
 import socket
 import json
 import struct
+import asyncio
 import threading
 import time
-from typing import Dict, Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional, List, Tuple
 import logging
-from queue import Queue, Full
+from itertools import groupby
+from queue import Queue, Full, Empty
 
 from config import Config
+import ipc_codec
+from ipc_transport import create_transport
 
 logger = logging.getLogger(__name__)
 
+# Handshake message type (sent as JSON so any server can parse it)
+HELLO = 'hello'
+
 
 class IPCMessage:
     """IPC message structure"""
@@ -54,6 +78,115 @@ class IPCMessage:
         )
         msg.timestamp = obj.get('timestamp', time.time())
         return msg
+    
+    def encode(self, codec: str = 'json') -> bytes:
+        """Encode message to a frame body with the named codec"""
+        return ipc_codec.get_codec(codec).encode(
+            self.msg_type, self.data, self.auth_token, self.timestamp
+        )
+    
+    @classmethod
+    def decode(cls, buf, codec: str = 'json') -> 'IPCMessage':
+        """
+        Create message from a frame body
+        
+        JSON bodies are recognized whatever the connection's codec. Binary
+        and msgpack bodies carry no auth token (auth_token is None).
+        """
+        if ipc_codec.is_json_frame(buf):
+            codec = 'json'
+        elif codec == 'json':
+            raise ValueError("Non-JSON frame on a connection without a negotiated codec")
+        msg_type, data, auth_token, timestamp = ipc_codec.get_codec(codec).decode(buf)
+        msg = cls(msg_type, data)
+        msg.auth_token = auth_token
+        msg.timestamp = timestamp if timestamp is not None else time.time()
+        return msg
+
+
+class FrameReader:
+    """
+    Buffered reader of length-prefixed frames from a blocking socket
+    
+    Receives with recv_into into one reusable bytearray, so a single recv
+    can yield several frames and no per-chunk bytes objects are built.
+    Frame bodies are returned as memoryviews into that buffer. The buffer
+    grows for frames larger than itself, up to max_frame_bytes; a length
+    prefix above that raises ValueError before anything is allocated.
+    """
+    
+    HEADER = struct.Struct('!I')
+    
+    def __init__(self, sock: socket.socket, max_frame_bytes: int = Config.IPC_MAX_FRAME_BYTES,
+                 buffer_size: int = Config.IPC_RECV_BUFFER_BYTES):
+        """
+        Initialize frame reader
+        
+        Args:
+            sock: Connected socket to read from
+            max_frame_bytes: Largest accepted frame body
+            buffer_size: Initial (and idle) receive buffer size
+        """
+        self.sock = sock
+        self.max_frame_bytes = max_frame_bytes
+        self.buffer_size = buffer_size
+        self._buf = bytearray(buffer_size)
+        self._start = 0  # first unconsumed byte
+        self._end = 0  # end of received data
+    
+    def read_frame(self) -> Optional[memoryview]:
+        """
+        Read the next frame body
+        
+        The returned view is only valid until the next call, which may
+        reuse that part of the buffer.
+        
+        Returns:
+            Frame body, or None once the peer has closed the connection
+        """
+        while True:
+            available = self._end - self._start
+            needed = self.HEADER.size
+            
+            if available >= needed:
+                length = self.HEADER.unpack_from(self._buf, self._start)[0]
+                if length > self.max_frame_bytes:
+                    raise ValueError(
+                        f"Frame of {length} bytes exceeds limit of {self.max_frame_bytes}"
+                    )
+                needed += length
+                if available >= needed:
+                    body_start = self._start + self.HEADER.size
+                    self._start += needed
+                    return memoryview(self._buf)[body_start:self._start]
+            
+            self._make_room(needed)
+            received = self.sock.recv_into(memoryview(self._buf)[self._end:])
+            if not received:
+                return None
+            self._end += received
+    
+    def _make_room(self, needed: int):
+        """Ensure the buffer can hold `needed` bytes from the unconsumed start"""
+        pending = self._end - self._start
+        
+        if pending == 0 and len(self._buf) > self.buffer_size:
+            # Back to the normal size after a large frame
+            self._buf = bytearray(self.buffer_size)
+        elif self._start + needed <= len(self._buf):
+            return
+        
+        if needed > len(self._buf):
+            # A new buffer: views handed out earlier keep the old one alive
+            grown = bytearray(max(needed, len(self._buf) * 2))
+            grown[:pending] = self._buf[self._start:self._end]
+            self._buf = grown
+        elif pending:
+            # Same-size slice assignment moves the bytes in place
+            self._buf[:pending] = self._buf[self._start:self._end]
+        
+        self._start = 0
+        self._end = pending
 
 
 class IPCServer:
@@ -62,23 +195,28 @@ class IPCServer:
     Listens for connections from User Agent and processes messages
     """
     
-    def __init__(self, host: str = Config.IPC_HOST, port: int = Config.IPC_PORT):
+    def __init__(self, host: str = Config.IPC_HOST, port: int = Config.IPC_PORT,
+                 transport=None):
         """
         Initialize IPC server
         
         Args:
             host: Host to bind to (localhost)
             port: Port to listen on
+            transport: Transport to listen on (default: Config.IPC_TRANSPORT)
         """
         self.host = host
         self.port = port
+        self.transport = transport or create_transport(host, port)
         self.running = False
         self.server_socket: Optional[socket.socket] = None
         self.server_thread: Optional[threading.Thread] = None
         self.message_handlers: Dict[str, Callable] = {}
+        self.batch_handlers: Dict[str, Callable] = {}
         self.connected_clients = []
+        self._clients_lock = threading.Lock()
         
-        logger.info(f"IPC Server initialized on {host}:{port}")
+        logger.info(f"IPC Server initialized on {self.transport.describe()}")
     
     def register_handler(self, msg_type: str, handler: Callable[[Dict[str, Any]], None]):
         """
@@ -91,6 +229,20 @@ class IPCServer:
         self.message_handlers[msg_type] = handler
         logger.info(f"Registered handler for message type: {msg_type}")
     
+    def register_batch_handler(self, msg_type: str, handler: Callable[[List[Dict[str, Any]]], None]):
+        """
+        Register handler for runs of one message type from a batch frame
+        
+        Messages without a batch handler are passed one at a time to the
+        handler registered with register_handler.
+        
+        Args:
+            msg_type: Message type to handle
+            handler: Callback function to process a list of message data
+        """
+        self.batch_handlers[msg_type] = handler
+        logger.info(f"Registered batch handler for message type: {msg_type}")
+    
     def start(self):
         """Start IPC server"""
         if self.running:
@@ -113,9 +265,12 @@ class IPCServer:
                 self.server_socket.close()
             except Exception:
                 pass
+        self.transport.close()
         
         # Close all client connections
-        for client in self.connected_clients:
+        with self._clients_lock:
+            clients = list(self.connected_clients)
+        for client in clients:
             try:
                 client.close()
             except Exception:
@@ -127,19 +282,16 @@ class IPCServer:
         """Main server loop"""
         try:
             # Create server socket
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket = self.transport.listen(5)
             self.server_socket.settimeout(1.0)  # Non-blocking accept
             
-            logger.info(f"IPC Server listening on {self.host}:{self.port}")
+            logger.info(f"IPC Server listening on {self.transport.describe()}")
             
             while self.running:
                 try:
                     # Accept connection
                     client_socket, address = self.server_socket.accept()
-                    logger.info(f"Client connected from {address}")
+                    logger.info(f"Client connected from {address or self.transport.describe()}")
                     
                     # Handle client in separate thread
                     client_thread = threading.Thread(
@@ -163,36 +315,25 @@ class IPCServer:
     
     def _handle_client(self, client_socket: socket.socket):
         """Handle client connection"""
-        self.connected_clients.append(client_socket)
+        with self._clients_lock:
+            self.connected_clients.append(client_socket)
+        
+        # JSON until the client negotiates a codec in its hello frame
+        session = self._new_session()
+        
+        reader = FrameReader(client_socket)
         
         try:
             while self.running:
-                # Receive message length (4 bytes)
-                length_data = self._recv_exact(client_socket, 4)
-                if not length_data:
+                # Receive the next length-prefixed message
+                msg_data = reader.read_frame()
+                if msg_data is None:
                     break
                 
-                msg_length = struct.unpack('!I', length_data)[0]
-                
-                # Receive message data
-                msg_data = self._recv_exact(client_socket, msg_length)
-                if not msg_data:
-                    break
-                
-                # Process message
-                try:
-                    message = IPCMessage.from_json(msg_data.decode('utf-8'))
-                    
-                    # Verify auth token
-                    if message.auth_token != Config.IPC_AUTH_TOKEN:
-                        logger.warning("Invalid auth token received")
-                        continue
-                    
-                    # Handle message
-                    self._process_message(message)
-                    
-                except Exception as e:
-                    logger.error(f"Message processing error: {e}")
+                # Process message (answering a handshake)
+                reply = self._handle_frame(msg_data, session)
+                if reply is not None:
+                    client_socket.sendall(struct.pack('!I', len(reply)) + reply)
         
         except Exception as e:
             logger.error(f"Client handler error: {e}")
@@ -202,24 +343,99 @@ class IPCServer:
             except Exception:
                 pass
             
-            if client_socket in self.connected_clients:
-                self.connected_clients.remove(client_socket)
+            with self._clients_lock:
+                if client_socket in self.connected_clients:
+                    self.connected_clients.remove(client_socket)
             
             logger.info("Client disconnected")
     
-    def _recv_exact(self, sock: socket.socket, n: int) -> bytes:
-        """Receive exactly n bytes from socket"""
-        data = b''
-        while len(data) < n:
-            try:
-                chunk = sock.recv(n - len(data))
-                if not chunk:
-                    return b''
-                data += chunk
-            except Exception as e:
-                logger.error(f"Socket receive error: {e}")
-                return b''
-        return data
+    @staticmethod
+    def _new_session() -> Dict[str, Any]:
+        """Per-connection protocol state"""
+        return {'codec': 'json', 'authenticated': False}
+    
+    def _handle_frame(self, msg_data, session: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Decode, authorize and dispatch one frame body
+        
+        Args:
+            msg_data: Frame body (without the length prefix)
+            session: Connection state from _new_session (updated by a hello)
+        
+        Returns:
+            Reply frame body to send back (handshake), or None
+        """
+        try:
+            if ipc_codec.is_batch_frame(msg_data):
+                self._process_batch(
+                    self._decode_batch(msg_data, session['codec'], session['authenticated'])
+                )
+                return None
+            
+            message = IPCMessage.decode(msg_data, session['codec'])
+            
+            # Verify auth token (binary frames rely on the handshake)
+            if not self._is_authorized(message, session['authenticated']):
+                logger.warning("Invalid auth token received")
+                return None
+            
+            if message.msg_type == HELLO:
+                session['codec'], reply = self._handshake(message)
+                session['authenticated'] = True
+                return reply
+            
+            # Handle message
+            self._process_message(message)
+            
+        except Exception as e:
+            logger.error(f"Message processing error: {e}")
+        return None
+    
+    def _handshake(self, message: IPCMessage) -> Tuple[str, bytes]:
+        """Choose a codec from the client's hello; returns it and the reply body"""
+        codec = ipc_codec.negotiate(message.data.get('codecs'), Config.IPC_CODECS)
+        reply = IPCMessage(HELLO, {'codec': codec, 'batch': True}).encode('json')
+        logger.info(f"Client negotiated {codec} codec")
+        return codec, reply
+    
+    @staticmethod
+    def _is_authorized(message: IPCMessage, authenticated: bool) -> bool:
+        """Check a message's token (binary frames rely on the handshake)"""
+        if authenticated and message.auth_token is None:
+            return True
+        return message.auth_token == Config.IPC_AUTH_TOKEN
+    
+    def _decode_batch(self, msg_data, codec: str, authenticated: bool) -> List[IPCMessage]:
+        """Decode the authorized messages of a batch frame"""
+        if not authenticated:
+            logger.warning("Batch frame received before handshake")
+            return []
+        
+        messages = []
+        for body in ipc_codec.iter_batch(msg_data):
+            message = IPCMessage.decode(body, codec)
+            if message.msg_type == HELLO:
+                continue
+            if not self._is_authorized(message, authenticated):
+                logger.warning("Invalid auth token received")
+                continue
+            messages.append(message)
+        return messages
+    
+    def _process_batch(self, messages: List[IPCMessage]):
+        """Process batched messages, in order, by runs of one type"""
+        for msg_type, run in groupby(messages, key=lambda m: m.msg_type):
+            run = list(run)
+            handler = self.batch_handlers.get(msg_type)
+            
+            if handler:
+                try:
+                    handler([message.data for message in run])
+                except Exception as e:
+                    logger.error(f"Batch handler error for {msg_type}: {e}")
+            else:
+                for message in run:
+                    self._process_message(message)
     
     def _process_message(self, message: IPCMessage):
         """Process received message"""
@@ -234,30 +450,201 @@ class IPCServer:
             logger.warning(f"No handler registered for message type: {message.msg_type}")
 
 
+class AsyncIPCServer(IPCServer):
+    """
+    asyncio IPC Server (Used by Service Watchdog)
+    Serves every connection from one event loop thread, so hundreds of
+    agents (terminal-server hosts) do not need hundreds of threads
+    
+    Frames are read with asyncio streams. IPC_ASYNC_BUFFER_BYTES is the
+    stream's flow-control limit: the transport pauses while about twice
+    that much is read ahead. A frame being read is buffered whole, so a
+    connection can hold up to IPC_MAX_FRAME_BYTES; larger frames close
+    the connection. Decoding and handlers run on a thread pool of
+    IPC_ASYNC_WORKERS threads, one frame at a time per connection so
+    each agent's messages stay in order. stop() waits for running
+    handlers, so the database can be closed after it returns.
+    """
+    
+    def __init__(self, host: str = Config.IPC_HOST, port: int = Config.IPC_PORT,
+                 transport=None):
+        """
+        Initialize asyncio IPC server
+        
+        Args:
+            host: Host to bind to (localhost)
+            port: Port to listen on
+            transport: Transport to listen on (default: Config.IPC_TRANSPORT)
+        """
+        super().__init__(host, port, transport)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._client_tasks = set()
+    
+    def start(self):
+        """Start IPC server"""
+        if self.running:
+            logger.warning("IPC Server already running")
+            return
+        
+        self.running = True
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.IPC_ASYNC_WORKERS, thread_name_prefix='ipc-handler'
+        )
+        self.server_thread = threading.Thread(target=self._server_loop, daemon=True)
+        self.server_thread.start()
+        
+        logger.info("IPC Server started (asyncio)")
+    
+    def stop(self):
+        """Stop IPC server, cancelling every connection and waiting for running handlers"""
+        if not self.running:
+            return
+        self.running = False
+        
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._request_stop)
+            except RuntimeError:
+                pass  # loop already closed
+        if self.server_thread is not None:
+            self.server_thread.join(timeout=5.0)
+        if self._executor is not None:
+            # Cancelling a connection does not stop a handler already running
+            self._executor.shutdown(wait=True)
+        
+        logger.info("IPC Server stopped")
+    
+    def _server_loop(self):
+        """Run the event loop until stop()"""
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        except Exception as e:
+            logger.error(f"Server loop error: {e}")
+        finally:
+            self._loop.close()
+            logger.info("Server loop ended")
+    
+    def _request_stop(self):
+        """Wake _serve (runs on the event loop)"""
+        if self._stopping is not None:
+            self._stopping.set()
+    
+    async def _serve(self):
+        """Accept connections until stop(), then cancel them"""
+        self._stopping = asyncio.Event()
+        server = await self.transport.start_server(
+            self._handle_connection, limit=Config.IPC_ASYNC_BUFFER_BYTES
+        )
+        logger.info(f"IPC Server listening on {self.transport.describe()} (asyncio)")
+        
+        try:
+            # stop() may have run before the event existed
+            if self.running:
+                await self._stopping.wait()
+        finally:
+            server.close()
+            for task in list(self._client_tasks):
+                task.cancel()
+            if self._client_tasks:
+                await asyncio.gather(*self._client_tasks, return_exceptions=True)
+            await server.wait_closed()
+            self.transport.close()
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read, dispatch and answer the frames of one connection"""
+        task = asyncio.current_task()
+        self._client_tasks.add(task)
+        self.connected_clients.append(writer)
+        logger.info(
+            f"Client connected from {writer.get_extra_info('peername') or self.transport.describe()}"
+        )
+        
+        session = self._new_session()
+        loop = asyncio.get_running_loop()
+        
+        try:
+            while self.running:
+                msg_length = struct.unpack('!I', await reader.readexactly(4))[0]
+                if msg_length > Config.IPC_MAX_FRAME_BYTES:
+                    logger.warning(f"Closing connection: {msg_length} byte frame exceeds limit")
+                    break
+                msg_data = await reader.readexactly(msg_length)
+                
+                reply = await loop.run_in_executor(
+                    self._executor, self._handle_frame, msg_data, session
+                )
+                if reply is not None:
+                    writer.write(struct.pack('!I', len(reply)) + reply)
+                    await writer.drain()
+        
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Client handler error: {e}")
+        finally:
+            self._client_tasks.discard(task)
+            if writer in self.connected_clients:
+                self.connected_clients.remove(writer)
+            writer.close()
+            
+            logger.info("Client disconnected")
+
+
+def create_ipc_server(host: str = Config.IPC_HOST, port: int = Config.IPC_PORT,
+                      transport=None) -> IPCServer:
+    """Create the IPC server implementation selected by Config.IPC_SERVER_MODE"""
+    if Config.IPC_SERVER_MODE == 'asyncio':
+        return AsyncIPCServer(host, port, transport)
+    if Config.IPC_SERVER_MODE != 'threaded':
+        raise ValueError(f"Unknown IPC server mode: {Config.IPC_SERVER_MODE}")
+    return IPCServer(host, port, transport)
+
+
 class IPCClient:
     """
     IPC Client (Used by User Agent)
     Connects to Service Watchdog and sends monitoring data
     """
     
-    def __init__(self, host: str = Config.IPC_HOST, port: int = Config.IPC_PORT):
+    def __init__(self, host: str = Config.IPC_HOST, port: int = Config.IPC_PORT,
+                 transport=None):
         """
         Initialize IPC client
         
         Args:
             host: Server host
             port: Server port
+            transport: Transport to connect over (default: Config.IPC_TRANSPORT)
         """
         self.host = host
         self.port = port
+        self.transport = transport or create_transport(host, port)
         self.socket: Optional[socket.socket] = None
         self.connected = False
         self.lock = threading.Lock()
         
+        # Frame codec and batch support negotiated on connect
+        self.codec = 'json'
+        self.batching = False
+        
         # Message queue for when disconnected
         self.message_queue = Queue(maxsize=Config.MAX_QUEUE_SIZE)
         
-        logger.info(f"IPC Client initialized for {host}:{port}")
+        # Events waiting for the next batch frame as (message, encoded body)
+        self._batch: List[Tuple[IPCMessage, bytes]] = []
+        self._batch_bytes = 0
+        self._batch_started = 0.0
+        self._batch_codec = 'json'
+        self._batch_cond = threading.Condition()
+        self._batch_thread: Optional[threading.Thread] = None
+        
+        logger.info(f"IPC Client initialized for {self.transport.describe()}")
     
     def connect(self) -> bool:
         """
@@ -271,25 +658,85 @@ class IPCClient:
                 return True
             
             try:
-                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.socket.settimeout(Config.IPC_TIMEOUT)
-                self.socket.connect((self.host, self.port))
+                self.socket = self.transport.connect(Config.IPC_TIMEOUT)
+                self.codec, self.batching = self._negotiate()
                 self.connected = True
                 
-                logger.info(f"Connected to IPC server at {self.host}:{self.port}")
-                
-                # Flush queued messages
-                self._flush_queue()
-                
-                return True
+                logger.info(
+                    f"Connected to IPC server at {self.transport.describe()} "
+                    f"({self.codec} codec{', batching' if self.batching else ''})"
+                )
                 
             except Exception as e:
                 logger.error(f"Connection failed: {e}")
                 self.connected = False
                 return False
+        
+        if self.batching and self._batch_thread is None:
+            self._batch_thread = threading.Thread(target=self._batch_loop, daemon=True)
+            self._batch_thread.start()
+        
+        # Flush queued messages (sending takes the lock itself)
+        self._flush_queue()
+        
+        return True
+    
+    def _negotiate(self) -> Tuple[str, bool]:
+        """
+        Offer our codecs to the server
+        
+        Falls back to JSON without batching if binary codecs and batching
+        are disabled or the server does not answer within
+        IPC_HANDSHAKE_TIMEOUT (older watchdog).
+        
+        Returns:
+            (codec picked by the server, whether it accepts batch frames)
+        """
+        offered = ipc_codec.available_codecs(Config.IPC_CODECS)
+        want_batching = Config.IPC_BATCH_MAX_MESSAGES > 1
+        if offered == ['json'] and not want_batching:
+            return 'json', False
+        
+        self._send_frame(IPCMessage(HELLO, {'codecs': offered}).encode('json'))
+        
+        self.socket.settimeout(Config.IPC_HANDSHAKE_TIMEOUT)
+        try:
+            length = struct.unpack('!I', self._recv_exact(4))[0]
+            if length > Config.IPC_MAX_FRAME_BYTES:
+                raise ValueError(f"Handshake reply of {length} bytes exceeds limit")
+            reply = IPCMessage.decode(self._recv_exact(length))
+            if reply.msg_type != HELLO:
+                return 'json', False
+            codec = reply.data.get('codec', 'json')
+            if codec not in offered:
+                codec = 'json'
+            return codec, want_batching and bool(reply.data.get('batch'))
+        except socket.timeout:
+            logger.info("No handshake reply from IPC server, using JSON frames")
+            return 'json', False
+        finally:
+            self.socket.settimeout(Config.IPC_TIMEOUT)
+    
+    def _send_frame(self, body: bytes):
+        """Write one length-prefixed frame (caller holds the lock)"""
+        self.socket.sendall(struct.pack('!I', len(body)) + body)
+    
+    def _recv_exact(self, n: int) -> bytes:
+        """Receive exactly n bytes from the server"""
+        data = b''
+        while len(data) < n:
+            chunk = self.socket.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("IPC server closed the connection")
+            data += chunk
+        return data
     
     def disconnect(self):
         """Disconnect from server"""
+        # Send what is waiting for the linger window first
+        while self._batch and self.connected:
+            self._send_batch(*self._take_batch())
+        
         with self.lock:
             if self.socket:
                 try:
@@ -324,6 +771,10 @@ class IPCClient:
                 logger.warning(f"Message queue full, dropping message: {msg_type}")
                 return False
         
+        # Coalesce with other events of the linger window
+        if self.batching:
+            return self._add_to_batch(message)
+        
         # Send message
         return self._send_message_direct(message)
     
@@ -334,13 +785,8 @@ class IPCClient:
                 if not self.connected or not self.socket:
                     return False
                 
-                # Serialize message
-                msg_data = message.to_json().encode('utf-8')
-                msg_length = len(msg_data)
-                
-                # Send length (4 bytes) + data
-                length_bytes = struct.pack('!I', msg_length)
-                self.socket.sendall(length_bytes + msg_data)
+                # Serialize message and send length (4 bytes) + data
+                self._send_frame(message.encode(self.codec))
                 
                 logger.debug(f"Sent message: {message.msg_type}")
                 return True
@@ -350,10 +796,116 @@ class IPCClient:
                 self.connected = False
                 return False
     
+    def _add_to_batch(self, message: IPCMessage) -> bool:
+        """Add a message to the batch the sender thread writes next"""
+        codec = self.codec
+        body = message.encode(codec)
+        
+        with self._batch_cond:
+            if not self._batch:
+                self._batch_started = time.monotonic()
+                self._batch_codec = codec
+            self._batch.append((message, body))
+            self._batch_bytes += len(body)
+            self._batch_cond.notify()
+        
+        logger.debug(f"Batched message: {message.msg_type}")
+        return True
+    
+    def _batch_full(self) -> bool:
+        """Check the batch against the count/size limits (caller holds _batch_cond)"""
+        return (len(self._batch) >= Config.IPC_BATCH_MAX_MESSAGES
+                or self._batch_bytes >= Config.IPC_BATCH_MAX_BYTES)
+    
+    def _take_batch(self) -> Tuple[List[Tuple[IPCMessage, bytes]], str]:
+        """
+        Remove up to one frame's worth of pending messages
+        
+        Returns:
+            (messages with their encoded bodies, codec of the bodies)
+        """
+        with self._batch_cond:
+            count = 0
+            size = 0
+            while (count < len(self._batch) and count < Config.IPC_BATCH_MAX_MESSAGES
+                   and size < Config.IPC_BATCH_MAX_BYTES):
+                size += len(self._batch[count][1])
+                count += 1
+            
+            batch = self._batch[:count]
+            del self._batch[:count]
+            self._batch_bytes -= size
+            # The rest starts a new linger window
+            self._batch_started = time.monotonic()
+            return batch, self._batch_codec
+    
+    def _batch_loop(self):
+        """Send the pending batch when it is full or its linger window ends"""
+        linger = Config.IPC_BATCH_LINGER_MS / 1000.0
+        
+        while True:
+            with self._batch_cond:
+                while not self._batch:
+                    self._batch_cond.wait()
+                while not self._batch_full():
+                    remaining = self._batch_started + linger - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._batch_cond.wait(remaining)
+            
+            self._send_batch(*self._take_batch())
+    
+    def _send_batch(self, batch: List[Tuple[IPCMessage, bytes]], codec: str) -> bool:
+        """
+        Send messages as one batch frame (a single message as a plain frame)
+        
+        On failure the messages go back to the offline queue, since
+        send_message already reported them as accepted.
+        """
+        if not batch:
+            return True
+        
+        with self.lock:
+            try:
+                if not self.connected or not self.socket:
+                    raise ConnectionError("Not connected to IPC server")
+                
+                # Bodies encoded before a reconnect may use another codec
+                if codec != self.codec:
+                    bodies = [message.encode(self.codec) for message, _ in batch]
+                else:
+                    bodies = [body for _, body in batch]
+                
+                self._send_frame(bodies[0] if len(bodies) == 1 else ipc_codec.encode_batch(bodies))
+                
+                logger.debug(f"Sent batch of {len(batch)} messages")
+                return True
+                
+            except Exception as e:
+                logger.error(f"Batch send error: {e}")
+                self.connected = False
+        
+        dropped = 0
+        for message, _ in batch:
+            try:
+                self.message_queue.put_nowait(message)
+            except Full:
+                dropped += 1
+        if dropped:
+            logger.warning(f"Message queue full, dropped {dropped} batched messages")
+        return False
+    
     def _flush_queue(self):
-        """Send all queued messages"""
+        """Send all queued messages (in batch frames if the server accepts them)"""
         count = 0
         while not self.message_queue.empty():
+            if self.batching:
+                batch = self._drain_queue_batch()
+                if not batch or not self._send_batch(batch, self.codec):
+                    break
+                count += len(batch)
+                continue
+            
             try:
                 message = self.message_queue.get_nowait()
                 if self._send_message_direct(message):
@@ -368,6 +920,20 @@ class IPCClient:
         if count > 0:
             logger.info(f"Flushed {count} queued messages")
     
+    def _drain_queue_batch(self) -> List[Tuple[IPCMessage, bytes]]:
+        """Take up to one batch worth of messages from the offline queue"""
+        batch = []
+        size = 0
+        while len(batch) < Config.IPC_BATCH_MAX_MESSAGES and size < Config.IPC_BATCH_MAX_BYTES:
+            try:
+                message = self.message_queue.get_nowait()
+            except Empty:
+                break
+            body = message.encode(self.codec)
+            batch.append((message, body))
+            size += len(body)
+        return batch
+    
     def is_connected(self) -> bool:
         """Check if connected to server"""
         return self.connected
@@ -0,0 +1,183 @@
+"""
+IPC Transport
+Stream socket backends under IPCServer / IPCClient
+
+- tcp: loopback TCP on IPC_HOST:IPC_PORT (the original transport, and the
+  only one on Windows)
+- unix: AF_UNIX stream socket at IPC_SOCKET_PATH. Skips the TCP stack and
+  exposes no port; who may connect is decided by the socket file's mode
+  (IPC_SOCKET_MODE) and group (IPC_SOCKET_GROUP), on top of the auth token
+
+Framing, codecs and the handshake are the same on every transport.
+"""
+
+import os
+import stat
+import socket
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional
+
+from config import Config
+
+try:
+    import grp
+except ImportError:  # Windows
+    grp = None
+
+logger = logging.getLogger(__name__)
+
+
+class TCPTransport:
+    """Loopback TCP transport"""
+    
+    name = 'tcp'
+    
+    def __init__(self, host: str = Config.IPC_HOST, port: int = Config.IPC_PORT):
+        """
+        Initialize TCP transport
+        
+        Args:
+            host: Host to bind to / connect to (localhost)
+            port: TCP port
+        """
+        self.host = host
+        self.port = port
+    
+    def describe(self) -> str:
+        """Address for log messages"""
+        return f"{self.host}:{self.port}"
+    
+    def listen(self, backlog: int = 5) -> socket.socket:
+        """Create the bound, listening server socket"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(backlog)
+        return sock
+    
+    def connect(self, timeout: float) -> socket.socket:
+        """Open a client connection"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect((self.host, self.port))
+        # Frames are already coalesced by the client's batching
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+    
+    async def start_server(self, client_connected_cb, limit: int):
+        """Start an asyncio server on this transport"""
+        return await asyncio.start_server(client_connected_cb, sock=self.listen(100), limit=limit)
+    
+    def close(self):
+        """Release transport resources after the server stops"""
+
+
+class UnixTransport:
+    """AF_UNIX stream socket transport (not available on Windows)"""
+    
+    name = 'unix'
+    
+    def __init__(self, path: Path = Config.IPC_SOCKET_PATH, mode: int = Config.IPC_SOCKET_MODE,
+                 group: Optional[str] = Config.IPC_SOCKET_GROUP):
+        """
+        Initialize Unix domain socket transport
+        
+        Args:
+            path: Socket file path
+            mode: Permission bits of the socket file (connect needs write access)
+            group: Group owning the socket file (None keeps the server's group)
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError("Unix domain sockets are not supported on this platform")
+        
+        self.path = Path(path)
+        self.mode = mode
+        self.group = group
+        self._bound = False
+    
+    def describe(self) -> str:
+        """Address for log messages"""
+        return f"unix:{self.path}"
+    
+    def listen(self, backlog: int = 5) -> socket.socket:
+        """
+        Create the bound, listening server socket
+        
+        The socket is bound under a temporary name, given its mode and
+        group and then renamed into place, so it is never reachable with
+        the default (umask) permissions. A stale socket file left by a
+        previous run is replaced.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            if not stat.S_ISSOCK(self.path.stat().st_mode):
+                raise RuntimeError(f"IPC socket path exists and is not a socket: {self.path}")
+            if self._is_live():
+                raise RuntimeError(f"Another IPC server is listening on {self.path}")
+        
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+        
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(str(tmp_path))
+            os.chmod(tmp_path, self.mode)
+            if self.group is not None:
+                os.chown(tmp_path, -1, grp.getgrnam(self.group).gr_gid)
+            os.replace(tmp_path, self.path)
+            sock.listen(backlog)
+        except Exception:
+            sock.close()
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        
+        self._bound = True
+        return sock
+    
+    def _is_live(self) -> bool:
+        """Check whether a server accepts connections on the socket file"""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.settimeout(1.0)
+            probe.connect(str(self.path))
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+    
+    def connect(self, timeout: float) -> socket.socket:
+        """Open a client connection"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(str(self.path))
+        return sock
+    
+    async def start_server(self, client_connected_cb, limit: int):
+        """Start an asyncio server on this transport"""
+        return await asyncio.start_unix_server(client_connected_cb, sock=self.listen(100), limit=limit)
+    
+    def close(self):
+        """Remove the socket file this transport bound"""
+        if not self._bound:
+            return
+        self._bound = False
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove IPC socket {self.path}: {e}")
+
+
+def create_transport(host: str = Config.IPC_HOST, port: int = Config.IPC_PORT):
+    """Create the transport selected by Config.IPC_TRANSPORT"""
+    if Config.IPC_TRANSPORT == 'unix':
+        return UnixTransport(Config.IPC_SOCKET_PATH, Config.IPC_SOCKET_MODE, Config.IPC_SOCKET_GROUP)
+    if Config.IPC_TRANSPORT != 'tcp':
+        raise ValueError(f"Unknown IPC transport: {Config.IPC_TRANSPORT}")
+    return TCPTransport(host, port)
@@ -0,0 +1,451 @@
+"""
+Partition Manager
+Time-partitioned storage for the monitoring event tables
+
+Each (table, day|week) pair lives in its own SQLite shard file in a
+`partitions` directory next to the main database. Shards are ATTACHed on
+demand, listed in the main database's `partitions` catalog, and expired
+by detaching and deleting the whole file instead of row-by-row DELETEs.
+
+Row ids stay globally unique across the main tables and all shards: they
+are allocated from the main database's sqlite_sequence, so the main tables
+never reuse an id handed out to a shard.
+"""
+
+import re
+import sqlite3
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionManager:
+    """Routes event rows to per-period shard databases"""
+    
+    # Tables stored in shards (system_events stays in the main database)
+    PARTITIONED_TABLES = ('screenshots', 'clipboard_events', 'app_usage')
+    
+    GRANULARITIES = ('day', 'week')
+    
+    # SQLite allows 10 attached databases per connection by default; leave
+    # room on the writer for migration and maintenance attaches
+    MAX_WRITER_ATTACHED = 6
+    
+    def __init__(self, partition_dir: Path, granularity: str = 'day',
+                 synchronous: str = 'NORMAL'):
+        """
+        Initialize partition manager
+        
+        Args:
+            partition_dir: Directory holding shard files
+            granularity: 'day' or 'week'
+            synchronous: PRAGMA synchronous level for shards on the writer
+        """
+        if granularity not in self.GRANULARITIES:
+            raise ValueError(f"Unsupported partition granularity: {granularity}")
+        
+        self.partition_dir = Path(partition_dir)
+        self.granularity = granularity
+        self.synchronous = synchronous
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Schemas attached to the writer connection, least recently used first
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._writer_attached: "OrderedDict[str, None]" = OrderedDict()
+        
+        logger.info(f"Partitioned storage enabled ({granularity}) at {self.partition_dir}")
+    
+    # ------------------------------------------------------------------
+    # Naming
+    # ------------------------------------------------------------------
+    
+    def partition_key(self, timestamp: Optional[str]) -> Optional[str]:
+        """
+        Get the partition key for an ISO-8601 timestamp
+        
+        Returns:
+            'YYYYMMDD' (day) or 'YYYYWww' (ISO week), None if unparsable
+        """
+        if not timestamp or len(timestamp) < 10:
+            return None
+        try:
+            day = date.fromisoformat(timestamp[:10])
+        except ValueError:
+            return None
+        
+        if self.granularity == 'day':
+            return day.strftime('%Y%m%d')
+        
+        year, week, _ = day.isocalendar()
+        return f"{year}W{week:02d}"
+    
+    def period_bounds(self, key: str) -> Tuple[str, str]:
+        """Get the [start, end) ISO dates covered by a partition key"""
+        if self.granularity == 'day':
+            start = datetime.strptime(key, '%Y%m%d').date()
+            end = start + timedelta(days=1)
+        else:
+            year, week = key.split('W')
+            start = date.fromisocalendar(int(year), int(week), 1)
+            end = start + timedelta(days=7)
+        return start.isoformat(), end.isoformat()
+    
+    @staticmethod
+    def schema_name(table: str, key: str) -> str:
+        """Schema name a shard is attached under"""
+        return f"p_{table}_{key}"
+    
+    def shard_path(self, table: str, key: str) -> Path:
+        """Shard file path for a table/partition"""
+        return self.partition_dir / f"{table}_{key}.db"
+    
+    # ------------------------------------------------------------------
+    # Write path (writer connection, DatabaseManager.lock held)
+    # ------------------------------------------------------------------
+    
+    def plan(self, table: str, rows: List[tuple]) -> Dict[Optional[str], List[int]]:
+        """
+        Group row indexes by partition key
+        
+        The timestamp must be the first parameter of each row. Rows with a
+        missing or unparsable timestamp map to None (main table).
+        """
+        plan: Dict[Optional[str], List[int]] = {}
+        for index, row in enumerate(rows):
+            plan.setdefault(self.partition_key(row[0]), []).append(index)
+        return plan
+    
+    def chunk_plans(self, plans: Dict[str, Dict[Optional[str], List[int]]]
+                    ) -> List[Dict[str, Dict[Optional[str], List[int]]]]:
+        """
+        Split per-table plans so each part needs at most MAX_WRITER_ATTACHED shards
+        
+        Main-table rows (key None) go with the first part.
+        """
+        shards = [(table, key) for table, plan in plans.items() for key in plan if key is not None]
+        if len(shards) <= self.MAX_WRITER_ATTACHED:
+            return [plans]
+        
+        parts = []
+        for i in range(0, len(shards), self.MAX_WRITER_ATTACHED):
+            part: Dict[str, Dict[Optional[str], List[int]]] = {}
+            for table, key in shards[i:i + self.MAX_WRITER_ATTACHED]:
+                part.setdefault(table, {})[key] = plans[table][key]
+            parts.append(part)
+        
+        for table, plan in plans.items():
+            if None in plan:
+                parts[0].setdefault(table, {})[None] = plan[None]
+        return parts
+    
+    def prepare_writer(self, conn: sqlite3.Connection, table: str, keys: Iterable[Optional[str]]):
+        """Attach (and create if needed) the shards for keys of one table on the writer"""
+        self.prepare_writer_shards(conn, [(table, key) for key in keys])
+    
+    def prepare_writer_shards(self, conn: sqlite3.Connection,
+                              shards: Iterable[Tuple[str, Optional[str]]]):
+        """
+        Attach (and create if needed) shards on the writer
+        
+        SQLite cannot ATTACH or DETACH inside a transaction, so every shard
+        a write needs must be attached before its first statement; this
+        raises instead of committing the caller's work. Catalog rows for
+        new shards (and the ts fill of shards that just gained the column)
+        are written in the caller's transaction, so they are committed or
+        rolled back with the rows written to the shard (see detach_writer).
+        """
+        # A replaced writer connection starts with nothing attached
+        if conn is not self._writer_conn:
+            self._writer_conn = conn
+            self._writer_attached.clear()
+        
+        shards = [(table, key) for table, key in shards if key is not None]
+        needed = {self.schema_name(table, key) for table, key in shards}
+        if len(needed) > self.MAX_WRITER_ATTACHED:
+            raise ValueError(
+                f"{len(needed)} shards needed at once, at most {self.MAX_WRITER_ATTACHED} can be attached"
+            )
+        
+        attached = []
+        fill_ts = []
+        for table, key in shards:
+            schema = self.schema_name(table, key)
+            if schema in self._writer_attached:
+                self._writer_attached.move_to_end(schema)
+                continue
+            
+            if conn.in_transaction:
+                raise sqlite3.OperationalError(
+                    f"Cannot attach partition {table}/{key} inside a transaction"
+                )
+            
+            # Make room by detaching the least recently used shard not needed now
+            for old_schema in list(self._writer_attached):
+                if len(self._writer_attached) < self.MAX_WRITER_ATTACHED:
+                    break
+                if old_schema not in needed:
+                    del self._writer_attached[old_schema]
+                    conn.execute(f"DETACH DATABASE {old_schema}")
+            
+            path = self.shard_path(table, key)
+            is_new = not path.exists()
+            conn.execute("ATTACH DATABASE ? AS " + schema, (str(path),))
+            self._writer_attached[schema] = None
+            
+            if is_new:
+                conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+                logger.info(f"Created partition {table}/{key}")
+            # Per connection and schema, so set on every attach
+            conn.execute(f"PRAGMA {schema}.synchronous={self.synchronous}")
+            if self._sync_shard_schema(conn, table, schema):
+                fill_ts.append(f"{schema}.{table}")
+            attached.append((table, key, path))
+        
+        # After all ATTACHes - the first DML statement opens the caller's transaction
+        for source in fill_ts:
+            # Shards are small enough to fill the epoch timestamp in one go
+            conn.execute(f"UPDATE {source} SET ts = iso_to_epoch_ms(timestamp)")
+        
+        for table, key, path in attached:
+            if conn.execute(
+                "SELECT 1 FROM partitions WHERE table_name = ? AND partition_key = ?",
+                (table, key)
+            ).fetchone():
+                continue
+            start, end = self.period_bounds(key)
+            conn.execute("""
+                INSERT INTO partitions (
+                    table_name, partition_key, filepath, period_start, period_end
+                ) VALUES (?, ?, ?, ?, ?)
+            """, (table, key, str(path), start, end))
+    
+    def detach_writer(self, conn: sqlite3.Connection):
+        """
+        Detach every shard from the writer after a rollback
+        
+        A rolled-back transaction may have taken catalog rows of shards it
+        created with it; attaching them again re-checks the catalog.
+        """
+        if conn is not self._writer_conn:
+            return
+        for schema in list(self._writer_attached):
+            try:
+                conn.execute(f"DETACH DATABASE {schema}")
+                del self._writer_attached[schema]
+            except sqlite3.Error as e:
+                logger.warning(f"Could not detach {schema}: {e}")
+    
+    def _sync_shard_schema(self, conn: sqlite3.Connection, table: str, schema: str) -> bool:
+        """
+        Create the shard table or add columns the main table gained since
+        
+        The shard mirrors the main table's DDL (including columns added by
+        later migrations), its indexes and its full-text index/triggers.
+        Only DDL is run, so no transaction is opened.
+        
+        Returns:
+            True if the existing shard table gained the ts column (left
+            for the caller to fill)
+        """
+        added_ts = False
+        main_sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+            (table,)
+        ).fetchone()[0]
+        
+        shard_columns = [
+            row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")
+        ]
+        
+        if not shard_columns:
+            shard_sql = re.sub(
+                r'^\s*CREATE TABLE\s+(IF NOT EXISTS\s+)?"?' + table + r'"?',
+                f"CREATE TABLE IF NOT EXISTS {schema}.{table}",
+                main_sql,
+                count=1,
+                flags=re.IGNORECASE
+            )
+            conn.execute(shard_sql)
+        else:
+            for cid, name, col_type, notnull, default, pk in conn.execute(
+                f"PRAGMA main.table_info({table})"
+            ).fetchall():
+                if name in shard_columns:
+                    continue
+                definition = f"{name} {col_type}"
+                if default is not None:
+                    definition += f" DEFAULT {default}"
+                conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {definition}")
+                added_ts = added_ts or name == 'ts'
+        
+        for (index_sql,) in conn.execute(
+            "SELECT sql FROM main.sqlite_master "
+            "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        ).fetchall():
+            conn.execute(re.sub(
+                r'^\s*CREATE INDEX\s+(IF NOT EXISTS\s+)?',
+                f"CREATE INDEX IF NOT EXISTS {schema}.",
+                index_sql,
+                count=1,
+                flags=re.IGNORECASE
+            ))
+        
+        # Full-text index over the table and the triggers maintaining it
+        # (unqualified names in a shard trigger resolve inside the shard)
+        for object_type, keyword in (('table', 'VIRTUAL TABLE'), ('trigger', 'TRIGGER')):
+            name_filter = "name = ?" if object_type == 'table' else "tbl_name = ?"
+            for (object_sql,) in conn.execute(
+                f"SELECT sql FROM main.sqlite_master WHERE type = ? AND {name_filter}",
+                (object_type, f"{table}_fts" if object_type == 'table' else table)
+            ).fetchall():
+                conn.execute(re.sub(
+                    r'^\s*CREATE ' + keyword + r'\s+(IF NOT EXISTS\s+)?',
+                    f"CREATE {keyword} IF NOT EXISTS {schema}.",
+                    object_sql,
+                    count=1,
+                    flags=re.IGNORECASE
+                ))
+        
+        return added_ts
+    
+    @staticmethod
+    def allocate_ids(conn: sqlite3.Connection, table: str, count: int) -> int:
+        """
+        Reserve count consecutive row ids from the main sqlite_sequence
+        
+        Returns:
+            First reserved id
+        """
+        row = conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+        ).fetchone()
+        
+        if row is None:
+            max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM main.{table}").fetchone()[0]
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                (table, max_id + count)
+            )
+            return max_id + 1
+        
+        conn.execute(
+            "UPDATE sqlite_sequence SET seq = seq + ? WHERE name = ?", (count, table)
+        )
+        return row[0] + 1
+    
+    def insert_rows(self, conn: sqlite3.Connection, table: str, columns: Tuple[str, ...],
+                    rows: List[tuple], plan: Dict[Optional[str], List[int]]) -> Dict[int, int]:
+        """
+        Insert the planned rows into their shards with allocated ids
+        
+        Rows without a partition key go to the main table. The shards in
+        the plan must already be attached with prepare_writer().
+        
+        Returns:
+            Mapping of row index -> inserted row id
+        """
+        indexes = sorted(i for planned in plan.values() for i in planned)
+        first_id = self.allocate_ids(conn, table, len(indexes))
+        ids = {index: first_id + n for n, index in enumerate(indexes)}
+        
+        column_sql = ', '.join(('id',) + columns)
+        placeholders = ', '.join('?' * (len(columns) + 1))
+        
+        for key, planned in plan.items():
+            schema = 'main' if key is None else self.schema_name(table, key)
+            conn.executemany(
+                f"INSERT INTO {schema}.{table} ({column_sql}) VALUES ({placeholders})",
+                [(ids[i],) + rows[i] for i in planned]
+            )
+            
+            if key is not None:
+                low = min(ids[i] for i in planned)
+                high = max(ids[i] for i in planned)
+                conn.execute("""
+                    UPDATE partitions
+                    SET row_count = row_count + ?,
+                        min_id = MIN(COALESCE(min_id, ?), ?),
+                        max_id = MAX(COALESCE(max_id, ?), ?)
+                    WHERE table_name = ? AND partition_key = ?
+                """, (len(planned), low, low, high, high, table, key))
+        
+        return ids
+    
+    def drop_partition(self, conn: sqlite3.Connection, table: str, key: str):
+        """Detach a shard, remove it from the catalog and delete its files"""
+        schema = self.schema_name(table, key)
+        if conn is self._writer_conn and schema in self._writer_attached:
+            del self._writer_attached[schema]
+            conn.execute(f"DETACH DATABASE {schema}")
+        
+        conn.execute(
+            "DELETE FROM partitions WHERE table_name = ? AND partition_key = ?",
+            (table, key)
+        )
+        conn.commit()
+        
+        path = self.shard_path(table, key)
+        for suffix in ('', '-wal', '-shm'):
+            shard_file = Path(str(path) + suffix)
+            try:
+                shard_file.unlink()
+            except FileNotFoundError:
+                pass
+    
+    # ------------------------------------------------------------------
+    # Catalog and read path
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def list_partitions(conn: sqlite3.Connection, table: str = None,
+                        since: str = None, until: str = None) -> List[Dict[str, Any]]:
+        """
+        List catalog entries, optionally for one table and overlapping
+        the [since, until) timestamp range, oldest first
+        """
+        query = "SELECT * FROM partitions WHERE 1 = 1"
+        params: List[Any] = []
+        if table:
+            query += " AND table_name = ?"
+            params.append(table)
+        if since:
+            query += " AND period_end > ?"
+            params.append(since[:10])
+        if until:
+            query += " AND period_start <= ?"
+            params.append(until[:10])
+        query += " ORDER BY period_start, table_name"
+        
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    @contextmanager
+    def attached(self, conn: sqlite3.Connection, table: str, key: str):
+        """
+        Attach a shard read-only to a reader connection for a block
+        
+        Yields:
+            Schema name, or None if the shard file no longer exists
+        """
+        path = self.shard_path(table, key)
+        if not path.exists():
+            yield None
+            return
+        
+        schema = self.schema_name(table, key)
+        conn.execute(
+            "ATTACH DATABASE ? AS " + schema,
+            (f"{path.resolve().as_uri()}?mode=ro",)
+        )
+        try:
+            yield schema
+        finally:
+            conn.rollback()
+            conn.execute(f"DETACH DATABASE {schema}")
@@ -22,6 +22,7 @@ import time
 import logging
 import threading
 import subprocess
+import shutil
 import json
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -32,7 +33,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from config import Config
 from db_manager import DatabaseManager
-from ipc_manager import IPCServer
+from ipc_manager import create_ipc_server
 from crypto_manager import CryptoManager
 
 
@@ -80,7 +81,7 @@ class ServiceWatchdog:
             
             # IPC server
             logger.info("Initializing IPC server...")
-            self.ipc_server = IPCServer()
+            self.ipc_server = create_ipc_server()
             
             # Register message handlers
             self._register_ipc_handlers()
@@ -111,6 +112,11 @@ class ServiceWatchdog:
         # NEW: Command handlers for sync and export
         self.ipc_server.register_handler('command', self._handle_command)
         
+        # Batch frames: one write-behind queue item per run of events
+        self.ipc_server.register_batch_handler('screenshot', self._handle_screenshot_batch)
+        self.ipc_server.register_batch_handler('clipboard', self._handle_clipboard_batch)
+        self.ipc_server.register_batch_handler('app_usage', self._handle_app_usage_batch)
+        
         logger.info("IPC handlers registered")
     
     def _handle_screenshot(self, data: dict):
@@ -121,15 +127,38 @@ class ServiceWatchdog:
         except Exception as e:
             logger.error(f"Error handling screenshot: {e}")
     
+    def _handle_screenshot_batch(self, records: list):
+        """Handle a batch of screenshots from User Agent"""
+        try:
+            logger.debug(f"Received {len(records)} screenshots")
+            self.db.log_events('screenshots', records)
+        except Exception as e:
+            logger.error(f"Error handling screenshot batch: {e}")
+    
     def _handle_clipboard(self, data: dict):
         """Handle clipboard data from User Agent - FIXED"""
         try:
             logger.debug(f"Received clipboard: {data.get('content_type')}")
             # FIXED: Was calling log_clipboard, now calls log_clipboard_event
-            self.db.log_clipboard_event(data)
+            self.db.log_clipboard_event(self._dedupe_clipboard(data))
         except Exception as e:
             logger.error(f"Error handling clipboard: {e}")
     
+    def _handle_clipboard_batch(self, records: list):
+        """Handle a batch of clipboard events from User Agent"""
+        try:
+            logger.debug(f"Received {len(records)} clipboard events")
+            self.db.log_events('clipboard_events', [self._dedupe_clipboard(r) for r in records])
+        except Exception as e:
+            logger.error(f"Error handling clipboard batch: {e}")
+    
+    def _dedupe_clipboard(self, data: dict) -> dict:
+        """Drop the payload of a clipboard event whose payload is already stored"""
+        content_hash = data.get('content_hash')
+        if content_hash and self.db.clipboard_dedup and self.db.has_stored_payload(content_hash):
+            return dict(data, encrypted_content=None)
+        return data
+    
     def _handle_app_usage(self, data: dict):
         """Handle app usage data from User Agent"""
         try:
@@ -138,6 +167,14 @@ class ServiceWatchdog:
         except Exception as e:
             logger.error(f"Error handling app usage: {e}")
     
+    def _handle_app_usage_batch(self, records: list):
+        """Handle a batch of app usage records from User Agent"""
+        try:
+            logger.debug(f"Received {len(records)} app usage records")
+            self.db.log_events('app_usage', records)
+        except Exception as e:
+            logger.error(f"Error handling app usage batch: {e}")
+    
     def _handle_ping(self, data: dict):
         """Handle ping/health check from User Agent"""
         logger.debug(f"Received ping from User Agent: {data.get('agent_id', 'unknown')}")
@@ -158,9 +195,26 @@ class ServiceWatchdog:
                 threading.Thread(target=self.export_data_to_json, daemon=True).start()
                 logger.info("Data export triggered")
                 
+            elif cmd == 'backfill_rollups':
+                # Rebuild app usage rollups from raw rows (optional 'since')
+                threading.Thread(
+                    target=self.db.backfill_app_usage_rollups,
+                    args=(data.get('since'),),
+                    daemon=True
+                ).start()
+                logger.info("App usage rollup backfill triggered")
+                
+            elif cmd == 'rebuild_search_index':
+                # Index existing rows after enabling full-text search
+                threading.Thread(target=self.db.rebuild_search_index, daemon=True).start()
+                logger.info("Full-text index rebuild triggered")
+                
             elif cmd == 'get_stats':
-                # Return database statistics
-                stats = self.db.get_statistics()
+                # Return database statistics ('verify' recounts the tables,
+                # 'reset_timings' starts new latency histograms afterwards)
+                stats = self.db.get_statistics(verify=bool(data.get('verify')))
+                if data.get('reset_timings'):
+                    self.db.get_operation_timings(reset=True)
                 logger.info(f"Statistics requested: {stats}")
                 
             else:
@@ -174,10 +228,10 @@ class ServiceWatchdog:
         NEW: Sync unsynced data to remote server (Grammarly-style)
         
         This method:
-        1. Queries for unsynced records (where synced = 0 or NULL)
+        1. Reads records past the table's sync cursor (keyset by id)
         2. Batches them into chunks
         3. Sends to Config.SERVER_URL with API authentication
-        4. Marks records as synced on success
+        4. Advances the sync cursor to the last id on success
         5. Implements retry logic with exponential backoff
         """
         try:
@@ -192,10 +246,6 @@ class ServiceWatchdog:
                 logger.warning("requests library not installed - sync will be mocked")
                 requests = None
             
-            import sqlite3
-            conn = sqlite3.connect(str(Config.DATABASE_PATH), timeout=10.0)
-            cursor = conn.cursor()
-            
             # Track sync statistics
             sync_stats = {
                 'clipboard_events': 0,
@@ -204,151 +254,46 @@ class ServiceWatchdog:
                 'failed': 0
             }
             
-            # Sync clipboard events
-            cursor.execute("""
-                SELECT id, timestamp, content_type, content_preview, 
-                       encrypted_content, content_hash, source_app
-                FROM clipboard_events
-                WHERE synced IS NULL OR synced = 0
-                ORDER BY timestamp ASC
-                LIMIT 100
-            """)
-            
-            clipboard_records = cursor.fetchall()
-            
-            if clipboard_records:
-                logger.info(f"Found {len(clipboard_records)} unsynced clipboard events")
-                
-                # Prepare payload
-                payload = {
-                    'data_type': 'clipboard_events',
-                    'records': []
-                }
-                
-                for record in clipboard_records:
-                    payload['records'].append({
-                        'id': record[0],
-                        'timestamp': record[1],
-                        'content_type': record[2],
-                        'content_preview': record[3],
-                        'encrypted_content': record[4],
-                        'content_hash': record[5],
-                        'source_app': record[6]
-                    })
+            # (table, fields sent, label for logging)
+            sync_tables = [
+                ('clipboard_events',
+                 ['timestamp', 'content_type', 'content_preview',
+                  'encrypted_content', 'content_hash', 'source_app'],
+                 'clipboard events'),
+                ('app_usage',
+                 ['timestamp', 'app_name', 'window_title', 'duration_seconds'],
+                 'app usage records'),
+                ('screenshots',
+                 ['timestamp', 'filepath', 'file_size_bytes',
+                  'resolution', 'active_window', 'active_app'],
+                 'screenshot records'),
+            ]
+            
+            for table, fields, label in sync_tables:
+                records = self.db.fetch_unsynced(table, limit=100, columns=fields)
                 
-                # Send to server (MOCKED - uncomment when ready to test)
-                success = self._send_to_server(payload, requests)
-                
-                if success:
-                    # Mark as synced
-                    record_ids = [r[0] for r in clipboard_records]
-                    placeholders = ','.join('?' * len(record_ids))
-                    cursor.execute(f"""
-                        UPDATE clipboard_events 
-                        SET synced = 1, synced_at = ? 
-                        WHERE id IN ({placeholders})
-                    """, [datetime.now().isoformat()] + record_ids)
-                    conn.commit()
-                    sync_stats['clipboard_events'] = len(clipboard_records)
-                    logger.info(f"✓ Synced {len(clipboard_records)} clipboard events")
-                else:
-                    sync_stats['failed'] += len(clipboard_records)
-                    logger.warning(f"✗ Failed to sync clipboard events")
-            
-            # Sync app usage
-            cursor.execute("""
-                SELECT id, timestamp, app_name, window_title, duration_seconds
-                FROM app_usage
-                WHERE synced IS NULL OR synced = 0
-                ORDER BY timestamp ASC
-                LIMIT 100
-            """)
-            
-            app_usage_records = cursor.fetchall()
-            
-            if app_usage_records:
-                logger.info(f"Found {len(app_usage_records)} unsynced app usage records")
-                
-                payload = {
-                    'data_type': 'app_usage',
-                    'records': []
-                }
-                
-                for record in app_usage_records:
-                    payload['records'].append({
-                        'id': record[0],
-                        'timestamp': record[1],
-                        'app_name': record[2],
-                        'window_title': record[3],
-                        'duration_seconds': record[4]
-                    })
-                
-                success = self._send_to_server(payload, requests)
+                if not records:
+                    continue
                 
-                if success:
-                    record_ids = [r[0] for r in app_usage_records]
-                    placeholders = ','.join('?' * len(record_ids))
-                    cursor.execute(f"""
-                        UPDATE app_usage 
-                        SET synced = 1, synced_at = ? 
-                        WHERE id IN ({placeholders})
-                    """, [datetime.now().isoformat()] + record_ids)
-                    conn.commit()
-                    sync_stats['app_usage'] = len(app_usage_records)
-                    logger.info(f"✓ Synced {len(app_usage_records)} app usage records")
-                else:
-                    sync_stats['failed'] += len(app_usage_records)
-                    logger.warning(f"✗ Failed to sync app usage records")
-            
-            # Sync screenshot metadata
-            cursor.execute("""
-                SELECT id, timestamp, filepath, file_size_bytes, 
-                       resolution, active_window, active_app
-                FROM screenshots
-                WHERE synced IS NULL OR synced = 0
-                ORDER BY timestamp ASC
-                LIMIT 100
-            """)
-            
-            screenshot_records = cursor.fetchall()
-            
-            if screenshot_records:
-                logger.info(f"Found {len(screenshot_records)} unsynced screenshot records")
+                logger.info(f"Found {len(records)} unsynced {label}")
                 
+                # Prepare payload
                 payload = {
-                    'data_type': 'screenshots',
-                    'records': []
+                    'data_type': table,
+                    'records': records
                 }
                 
-                for record in screenshot_records:
-                    payload['records'].append({
-                        'id': record[0],
-                        'timestamp': record[1],
-                        'filepath': record[2],
-                        'file_size_bytes': record[3],
-                        'resolution': record[4],
-                        'active_window': record[5],
-                        'active_app': record[6]
-                    })
-                
+                # Send to server (MOCKED - uncomment when ready to test)
                 success = self._send_to_server(payload, requests)
                 
                 if success:
-                    record_ids = [r[0] for r in screenshot_records]
-                    placeholders = ','.join('?' * len(record_ids))
-                    cursor.execute(f"""
-                        UPDATE screenshots 
-                        SET synced = 1, synced_at = ? 
-                        WHERE id IN ({placeholders})
-                    """, [datetime.now().isoformat()] + record_ids)
-                    conn.commit()
-                    sync_stats['screenshots'] = len(screenshot_records)
-                    logger.info(f"✓ Synced {len(screenshot_records)} screenshot records")
+                    # One cursor write per batch instead of a flag per row
+                    self.db.advance_sync_cursor(table, records[-1]['id'])
+                    sync_stats[table] = len(records)
+                    logger.info(f"✓ Synced {len(records)} {label}")
                 else:
-                    sync_stats['failed'] += len(screenshot_records)
-                    logger.warning(f"✗ Failed to sync screenshot records")
-            
-            conn.close()
+                    sync_stats['failed'] += len(records)
+                    logger.warning(f"✗ Failed to sync {label}")
             
             # Log sync results
             logger.info("="*60)
@@ -439,10 +384,6 @@ class ServiceWatchdog:
             logger.info("EXPORTING DATA TO JSON")
             logger.info("="*60)
             
-            import sqlite3
-            conn = sqlite3.connect(str(Config.DATABASE_PATH), timeout=10.0)
-            cursor = conn.cursor()
-            
             export_data = {
                 'export_timestamp': datetime.now().isoformat(),
                 'version': Config.VERSION,
@@ -452,83 +393,25 @@ class ServiceWatchdog:
                 'system_events': []
             }
             
-            # Export clipboard events (last 100)
-            cursor.execute("""
-                SELECT timestamp, content_type, content_preview, 
-                       content_hash, source_app, created_at
-                FROM clipboard_events
-                ORDER BY timestamp DESC
-                LIMIT 100
-            """)
-            
-            for row in cursor.fetchall():
-                export_data['clipboard_events'].append({
-                    'timestamp': row[0],
-                    'content_type': row[1],
-                    'content_preview': row[2],
-                    'content_hash': row[3],
-                    'source_app': row[4],
-                    'created_at': row[5]
-                })
-            
-            # Export app usage (last 100)
-            cursor.execute("""
-                SELECT timestamp, app_name, window_title, 
-                       duration_seconds, created_at
-                FROM app_usage
-                ORDER BY timestamp DESC
-                LIMIT 100
-            """)
-            
-            for row in cursor.fetchall():
-                export_data['app_usage'].append({
-                    'timestamp': row[0],
-                    'app_name': row[1],
-                    'window_title': row[2],
-                    'duration_seconds': row[3],
-                    'created_at': row[4]
-                })
-            
-            # Export screenshot metadata (last 50)
-            cursor.execute("""
-                SELECT timestamp, filepath, file_size_bytes, 
-                       resolution, active_window, active_app, created_at
-                FROM screenshots
-                ORDER BY timestamp DESC
-                LIMIT 50
-            """)
-            
-            for row in cursor.fetchall():
-                export_data['screenshots'].append({
-                    'timestamp': row[0],
-                    'filepath': row[1],
-                    'file_size_bytes': row[2],
-                    'resolution': row[3],
-                    'active_window': row[4],
-                    'active_app': row[5],
-                    'created_at': row[6]
-                })
-            
-            # Export system events (last 50)
-            cursor.execute("""
-                SELECT timestamp, event_type, severity, 
-                       message, details, created_at
-                FROM system_events
-                ORDER BY timestamp DESC
-                LIMIT 50
-            """)
-            
-            for row in cursor.fetchall():
-                export_data['system_events'].append({
-                    'timestamp': row[0],
-                    'event_type': row[1],
-                    'severity': row[2],
-                    'message': row[3],
-                    'details': row[4],
-                    'created_at': row[5]
-                })
-            
-            conn.close()
+            # Read-only pooled connections - runs alongside ingestion
+            # (table, columns, newest rows exported)
+            export_tables = [
+                ('clipboard_events',
+                 ['timestamp', 'content_type', 'content_preview',
+                  'content_hash', 'source_app', 'created_at'], 100),
+                ('app_usage',
+                 ['timestamp', 'app_name', 'window_title',
+                  'duration_seconds', 'created_at'], 100),
+                ('screenshots',
+                 ['timestamp', 'filepath', 'file_size_bytes', 'resolution',
+                  'active_window', 'active_app', 'created_at'], 50),
+                ('system_events',
+                 ['timestamp', 'event_type', 'severity',
+                  'message', 'details', 'created_at'], 50),
+            ]
+            
+            for table, columns, limit in export_tables:
+                export_data[table] = self.db.latest_events(table, limit=limit, columns=columns)
             
             # Write to file
             export_filename = f"monitoring_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -579,10 +462,11 @@ class ServiceWatchdog:
         """Periodic cleanup of old data"""
         logger.info("Cleanup thread started")
         
+        next_delay = 3600
         while self.running:
             try:
-                # Sleep for 1 hour
-                time.sleep(3600)
+                # Sleep for 1 hour (less while a retention pass is unfinished)
+                time.sleep(next_delay)
                 
                 if not self.running:
                     break
@@ -590,7 +474,8 @@ class ServiceWatchdog:
                 logger.info("Running data cleanup...")
                 
                 # Cleanup database
-                self.db.cleanup_old_data(Config.RETENTION_DAYS)
+                result = self.db.cleanup_old_data(Config.RETENTION_DAYS)
+                next_delay = 3600 if result['complete'] else Config.DB_RETENTION_RESUME_DELAY
                 
                 # Cleanup old screenshots
                 self._cleanup_old_screenshots()
@@ -635,6 +520,23 @@ class ServiceWatchdog:
             
             deleted_count = 0
             deleted_bytes = 0
+            deleted_dirs = 0
+            
+            # Per-day folders (partitioned layout) are removed as a whole
+            for day_dir in Config.SCREENSHOT_DIR.iterdir():
+                if not day_dir.is_dir():
+                    continue
+                try:
+                    day = datetime.strptime(day_dir.name, '%Y%m%d')
+                except ValueError:
+                    continue
+                
+                if day + timedelta(days=1) <= cutoff_date:
+                    try:
+                        shutil.rmtree(day_dir)
+                        deleted_dirs += 1
+                    except Exception as e:
+                        logger.error(f"Error deleting screenshot folder {day_dir}: {e}")
             
             for screenshot_file in Config.SCREENSHOT_DIR.glob("*.jpg"):
                 try:
@@ -652,6 +554,8 @@ class ServiceWatchdog:
             if deleted_count > 0:
                 deleted_mb = deleted_bytes / (1024 * 1024)
                 logger.info(f"Deleted {deleted_count} old screenshots ({deleted_mb:.2f} MB)")
+            if deleted_dirs > 0:
+                logger.info(f"Deleted {deleted_dirs} expired screenshot folders")
                 
         except Exception as e:
             logger.error(f"Error cleaning up screenshots: {e}")
@@ -738,6 +642,12 @@ class ServiceWatchdog:
         except Exception as e:
             logger.error(f"Error logging stop event: {e}")
         
+        # Drain queued writes, then release pooled database connections
+        if not self.db.flush(timeout=30):
+            logger.warning("Timed out waiting for queued database writes")
+        logger.info(f"Database write stats: {self.db.get_write_stats()}")
+        self.db.close()
+        
         logger.info("Service Watchdog stopped")
 
 
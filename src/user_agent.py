@@ -109,6 +109,11 @@ class ScreenMonitor:
                     filename = f"screenshot_{timestamp.strftime('%Y%m%d_%H%M%S')}.jpg"
                     filepath = self.screenshots_dir / filename
                     
+                    # Partitioned layout: one folder per day so expiry drops whole folders
+                    if Config.DB_PARTITION_GRANULARITY:
+                        filepath = self.screenshots_dir / timestamp.strftime('%Y%m%d') / filename
+                        filepath.parent.mkdir(exist_ok=True)
+                    
                     img.save(filepath, 'JPEG', quality=50, optimize=True)
                     
                     # Get file size
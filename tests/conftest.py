@@ -0,0 +1,6 @@
+"""Shared test setup: import the modules under src/ the way the tools do"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
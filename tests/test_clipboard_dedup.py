@@ -0,0 +1,66 @@
+"""
+Clipboard payloads are only reported as stored once they are committed,
+so a sender never drops the payload of a copy the store does not have
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_manager import DatabaseManager
+
+
+def _clipboard(timestamp, content='payload', content_hash='hash-1') -> dict:
+    return {
+        'timestamp': timestamp,
+        'content_type': 'text',
+        'content_preview': 'hello',
+        'encrypted_content': content,
+        'content_hash': content_hash,
+        'source_app': 'editor.exe',
+    }
+
+
+def _stored_content(db: DatabaseManager, content_hash: str = 'hash-1'):
+    with db._pool.reader() as conn:
+        return conn.execute(
+            "SELECT encrypted_content, ref_count FROM clipboard_content WHERE content_hash = ?",
+            (content_hash,)
+        ).fetchone()
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(
+        tmp_path / "activity.db", enable_encryption=False, write_behind=False,
+        background_maintenance=False
+    )
+    yield manager
+    manager.close()
+
+
+def test_payload_of_failed_insert_is_not_reported_stored(db):
+    now = datetime.now().isoformat()
+    # The second row violates NOT NULL, so the whole transaction rolls back
+    assert db.log_clipboard_events_bulk([_clipboard(now), _clipboard(None)]) == []
+    
+    assert not db.has_stored_payload('hash-1')
+    assert _stored_content(db) is None
+    
+    db.log_clipboard_event(_clipboard(now))
+    assert db.has_stored_payload('hash-1')
+    assert _stored_content(db) == ('payload', 1)
+
+
+def test_payload_released_by_retention_is_forgotten(db):
+    old = (datetime.now() - timedelta(days=60)).isoformat()
+    db.log_clipboard_event(_clipboard(old))
+    assert db.has_stored_payload('hash-1')
+    
+    with db._pool.reader() as conn:
+        last_id = conn.execute("SELECT MAX(id) FROM clipboard_events").fetchone()[0]
+    db.advance_sync_cursor('clipboard_events', last_id)
+    db.cleanup_old_data(retention_days=30)
+    
+    assert _stored_content(db) is None
+    assert not db.has_stored_payload('hash-1')
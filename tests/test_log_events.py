@@ -0,0 +1,101 @@
+"""
+Batches of events go through the same write path as single log_* calls
+"""
+
+import time
+from datetime import datetime
+
+import pytest
+
+from db_manager import DatabaseManager
+
+
+def _app_usage(app_name: str) -> dict:
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'app_name': app_name,
+        'window_title': 'Untitled',
+        'duration_seconds': 1.0,
+    }
+
+
+def _app_names(db: DatabaseManager):
+    with db._pool.reader() as conn:
+        return [row[0] for row in conn.execute("SELECT app_name FROM app_usage_view ORDER BY id")]
+
+
+@pytest.mark.parametrize('durability', ['strict', 'balanced'])
+def test_batch_keeps_order_with_single_events(tmp_path, durability):
+    db = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                         durability=durability, background_maintenance=False)
+    try:
+        db.log_app_usage(_app_usage('first.exe'))
+        db.log_events('app_usage', [_app_usage('batch1.exe'), _app_usage('batch2.exe')])
+        db.log_app_usage(_app_usage('last.exe'))
+        assert db.flush(timeout=10)
+        
+        assert _app_names(db) == ['first.exe', 'batch1.exe', 'batch2.exe', 'last.exe']
+    finally:
+        db.close()
+
+
+def test_batch_is_one_queue_item(tmp_path):
+    db = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                         durability='balanced', batch_max_ms=60000, background_maintenance=False)
+    try:
+        db.log_events('app_usage', [_app_usage(f"app{i}.exe") for i in range(50)])
+        assert db.get_write_stats()['queue_high_water'] <= 1
+        
+        assert db.flush(timeout=10)
+        assert len(_app_names(db)) == 50
+    finally:
+        db.close()
+
+
+def test_failed_row_does_not_lose_batch(tmp_path):
+    db = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                         durability='strict', background_maintenance=False)
+    try:
+        db.log_events('app_usage', [_app_usage('ok.exe'), _app_usage(None), _app_usage('ok2.exe')])
+        
+        assert _app_names(db) == ['ok.exe', 'ok2.exe']
+        assert db.get_write_stats()['rows_failed'] == 1
+    finally:
+        db.close()
+
+
+def test_bulk_insert_lands_after_queued_events(tmp_path):
+    db = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                         durability='balanced', batch_max_ms=60000, background_maintenance=False)
+    try:
+        db.log_app_usage(_app_usage('queued.exe'))
+        ids = db.log_app_usage_bulk([_app_usage('bulk1.exe'), _app_usage('bulk2.exe')])
+        
+        assert len(ids) == 2 and None not in ids
+        assert _app_names(db) == ['queued.exe', 'bulk1.exe', 'bulk2.exe']
+    finally:
+        db.close()
+
+
+
+def test_flush_times_out_on_full_queue(tmp_path):
+    db = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                         durability='balanced', batch_max_rows=1, write_queue_size=1,
+                         background_maintenance=False)
+    try:
+        with db.lock:
+            # The writer takes this row, then waits for the lock
+            db.log_app_usage(_app_usage('taken.exe'))
+            deadline = time.monotonic() + 5
+            while db._write_queue.qsize() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            db.log_app_usage(_app_usage('queued.exe'))
+            
+            started = time.monotonic()
+            assert db.flush(timeout=0.2) is False
+            assert time.monotonic() - started < 2
+        
+        assert db.flush(timeout=10)
+        assert _app_names(db) == ['taken.exe', 'queued.exe']
+    finally:
+        db.close()
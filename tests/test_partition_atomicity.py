@@ -0,0 +1,115 @@
+"""
+Partitioned writes are atomic: a batch whose rows span several shards
+either commits completely or leaves nothing behind
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_manager import DatabaseManager
+from partition_manager import PartitionManager
+
+
+def _days_ago(days: int) -> str:
+    return (datetime.now() - timedelta(days=days)).isoformat()
+
+
+def _count(db: DatabaseManager, sql: str, params: tuple = ()):
+    with db._pool.reader() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+
+def _shard_rows(db: DatabaseManager, table: str) -> int:
+    """Rows stored in all shards of a table"""
+    total = 0
+    for path in (db.db_path.parent / "partitions").glob(f"{table}_*.db"):
+        conn = sqlite3.connect(str(path))
+        try:
+            total += conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+    return total
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(
+        tmp_path / "activity.db", enable_encryption=False, write_behind=True,
+        partition_granularity='day', background_maintenance=False
+    )
+    yield manager
+    manager.close()
+
+
+def _clipboard(timestamp: str) -> dict:
+    return {
+        'timestamp': timestamp,
+        'content_type': 'text',
+        'content_preview': 'hello',
+        'encrypted_content': 'payload',
+        'content_hash': 'hash-1',
+        'source_app': 'editor.exe',
+    }
+
+
+def test_failed_multi_shard_batch_is_retried_without_duplicates(db):
+    # One group commit: a valid clipboard row (day-2 shard) and an
+    # app_usage row violating NOT NULL (day-3 shard)
+    db.log_clipboard_event(_clipboard(_days_ago(2)))
+    db.log_app_usage({'timestamp': _days_ago(3), 'app_name': None, 'duration_seconds': 1.0})
+    assert db.flush(timeout=10)
+    
+    stats = db.get_write_stats()
+    assert stats['batch_failures'] == 1
+    assert stats['rows_written'] == 1
+    assert stats['rows_failed'] == 1
+    
+    assert _shard_rows(db, 'clipboard_events') == 1
+    assert _shard_rows(db, 'app_usage') == 0
+    assert _count(db, "SELECT ref_count FROM clipboard_content WHERE content_hash = 'hash-1'") == 1
+    assert _count(
+        db, "SELECT row_count FROM table_stats WHERE table_name = 'clipboard_events'"
+    ) == 1
+    assert _count(
+        db, "SELECT SUM(row_count) FROM partitions WHERE table_name = 'clipboard_events'"
+    ) == 1
+
+
+def test_failed_bulk_insert_leaves_no_rows(db):
+    ids = db.log_app_usage_bulk([
+        {'timestamp': _days_ago(2), 'app_name': 'editor.exe', 'duration_seconds': 1.0},
+        {'timestamp': _days_ago(3), 'app_name': None, 'duration_seconds': 1.0},
+    ])
+    
+    assert ids == []
+    assert _shard_rows(db, 'app_usage') == 0
+    assert _count(db, "SELECT row_count FROM table_stats WHERE table_name = 'app_usage'") == 0
+
+
+def test_rolled_back_shard_is_registered_by_next_write(db):
+    db.log_app_usage_bulk([{'timestamp': _days_ago(4), 'app_name': None}])
+    assert _count(db, "SELECT COUNT(*) FROM partitions") == 0
+    
+    ids = db.log_app_usage_bulk([{'timestamp': _days_ago(4), 'app_name': 'editor.exe'}])
+    assert len(ids) == 1
+    assert _count(
+        db, "SELECT row_count FROM partitions WHERE table_name = 'app_usage'"
+    ) == 1
+
+
+def test_bulk_insert_beyond_attach_limit(db):
+    days = PartitionManager.MAX_WRITER_ATTACHED + 3
+    records = [
+        {'timestamp': _days_ago(day), 'app_name': 'editor.exe', 'duration_seconds': 1.0}
+        for day in range(1, days + 1)
+    ] + [{'timestamp': 'unknown', 'app_name': 'editor.exe', 'duration_seconds': 1.0}]
+    
+    ids = db.log_app_usage_bulk(records)
+    
+    assert len(ids) == len(records)
+    assert len(set(ids)) == len(records)
+    assert _shard_rows(db, 'app_usage') == days
+    assert _count(db, "SELECT COUNT(*) FROM main.app_usage") == 1
+    assert _count(db, "SELECT row_count FROM table_stats WHERE table_name = 'app_usage'") == len(records)
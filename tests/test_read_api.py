@@ -0,0 +1,38 @@
+"""
+The read API leaves out the legacy synced/synced_at flags
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                              durability='strict', background_maintenance=False)
+    manager.log_app_usage({
+        'timestamp': datetime.now().isoformat(),
+        'app_name': 'editor.exe',
+        'window_title': 'Untitled',
+        'duration_seconds': 1.0,
+    })
+    yield manager
+    manager.close()
+
+
+def test_latest_events_has_no_sync_flags(db):
+    rows = db.latest_events('app_usage')
+    
+    assert len(rows) == 1
+    assert rows[0]['app_name'] == 'editor.exe'
+    assert 'synced' not in rows[0] and 'synced_at' not in rows[0]
+
+
+def test_iter_events_has_no_sync_flags(db):
+    rows = list(db.iter_events('app_usage', since=(datetime.now() - timedelta(days=1)).isoformat()))
+    
+    assert len(rows) == 1
+    assert 'synced' not in rows[0] and 'synced_at' not in rows[0]
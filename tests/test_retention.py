@@ -0,0 +1,80 @@
+"""
+Retention and search range predicates use the indexed epoch ts column
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_manager import DatabaseManager
+
+
+def _app_usage(days_ago: int, app_name: str = 'editor.exe') -> dict:
+    return {
+        'timestamp': (datetime.now() - timedelta(days=days_ago)).isoformat(),
+        'app_name': app_name,
+        'window_title': 'Quarterly report',
+        'duration_seconds': 1.0,
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                              durability='strict', full_text_search=True,
+                              background_maintenance=False)
+    # A new file runs the v2 backfill in the background; ts is used once it is done
+    if manager._migration_thread is not None:
+        manager._migration_thread.join(timeout=10)
+    yield manager
+    manager.close()
+
+
+def test_cleanup_deletes_by_ts(db):
+    assert db._ts_ready
+    db.log_app_usage(_app_usage(60, 'old.exe'))
+    db.log_app_usage(_app_usage(1, 'new.exe'))
+    with db._pool.reader() as conn:
+        last_id = conn.execute("SELECT MAX(id) FROM app_usage").fetchone()[0]
+    db.advance_sync_cursor('app_usage', last_id)
+    
+    statements = []
+    db._pool.writer().set_trace_callback(statements.append)
+    result = db.cleanup_old_data(retention_days=30)
+    db._pool.writer().set_trace_callback(None)
+    
+    assert result['deleted']['app_usage'] == 1
+    assert [r['app_name'] for r in db.latest_events('app_usage')] == ['new.exe']
+    deletes = [sql for sql in statements if sql.startswith('DELETE FROM app_usage ')]
+    assert deletes and all('ts < ' in sql and 'timestamp' not in sql for sql in deletes)
+
+
+def test_search_range_uses_ts(db):
+    db.log_app_usage(_app_usage(10))
+    db.log_app_usage(_app_usage(1))
+    since = (datetime.now() - timedelta(days=5)).isoformat()
+    
+    hits = db.search('quarterly', since=since)
+    
+    assert len(hits) == 1
+    assert hits[0]['timestamp'] >= since
+
+
+def test_cleanup_deletes_unreferenced_dictionary_entries(db):
+    db.log_app_usage(_app_usage(60, 'old.exe'))
+    db.log_app_usage(_app_usage(1, 'new.exe'))
+    with db._pool.reader() as conn:
+        last_id = conn.execute("SELECT MAX(id) FROM app_usage").fetchone()[0]
+    db.advance_sync_cursor('app_usage', last_id)
+    
+    result = db.cleanup_old_data(retention_days=30)
+    
+    assert result['complete'] and result['deleted']['app_names'] == 1
+    with db._pool.reader() as conn:
+        names = [row[0] for row in conn.execute("SELECT value FROM app_names")]
+        titles = [row[0] for row in conn.execute("SELECT value FROM window_titles")]
+    assert names == ['new.exe']
+    assert titles == ['Quarterly report']
+    # A value seen again after collection gets a fresh id
+    db.log_app_usage(_app_usage(0, 'old.exe'))
+    assert sorted(r['app_name'] for r in db.latest_events('app_usage')) == ['new.exe', 'old.exe']
@@ -0,0 +1,60 @@
+"""
+Rollup title sets hold window title ids and are pruned by retention
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from db_manager import DatabaseManager
+
+
+def _app_usage(days_ago: int, title: str) -> dict:
+    return {
+        'timestamp': (datetime.now() - timedelta(days=days_ago)).isoformat(),
+        'app_name': 'editor.exe',
+        'window_title': title,
+        'duration_seconds': 1.0,
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(tmp_path / "activity.db", enable_encryption=False,
+                              durability='strict', background_maintenance=False)
+    if manager._migration_thread is not None:
+        manager._migration_thread.join(timeout=10)
+    yield manager
+    manager.close()
+
+
+def _distinct_titles(db, granularity: str) -> list:
+    return [row['distinct_titles'] for row in db.query(
+        f"SELECT distinct_titles FROM app_usage_{granularity} ORDER BY bucket"
+    )]
+
+
+def test_distinct_titles_counted_by_id(db):
+    db.log_app_usage(_app_usage(0, 'Report'))
+    db.log_app_usage(_app_usage(0, 'Report'))
+    db.log_app_usage(_app_usage(0, 'Budget'))
+    assert _distinct_titles(db, 'daily') == [2]
+    
+    with db._pool.reader() as conn:
+        columns = [col[1] for col in conn.execute("PRAGMA table_info(app_usage_rollup_titles)")]
+    assert 'window_title_id' in columns and 'window_title' not in columns
+
+
+def test_retention_prunes_closed_buckets(db):
+    db.log_app_usage(_app_usage(10, 'Report'))
+    db.log_app_usage(_app_usage(10, 'Budget'))
+    db.log_app_usage(_app_usage(0, 'Report'))
+    
+    result = db.cleanup_old_data(retention_days=30)
+    assert result['deleted']['app_usage_rollup_titles'] == 4  # hourly + daily sets of the old bucket
+    
+    with db._pool.reader() as conn:
+        kept = conn.execute("SELECT COUNT(*) FROM app_usage_rollup_titles").fetchone()[0]
+    assert kept == 2
+    # The closed bucket keeps its count after the set is gone
+    assert _distinct_titles(db, 'daily') == [2, 1]
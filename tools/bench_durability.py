@@ -0,0 +1,125 @@
+"""
+Durability Benchmark
+Measures ingestion throughput and data-loss windows and bounds per
+DB_DURABILITY mode on the local disk
+
+Each mode gets a fresh database in a temporary directory (under --dir,
+by default the agent's data directory so the numbers reflect the disk
+the real database lives on). Events are logged one at a time through
+log_app_usage, the way the watchdog does, and the run ends with a flush
+so queued rows are counted only once they are committed.
+
+The p50/p99 columns are call latency: the time until log_app_usage
+returns, which is the commit in strict mode but only the enqueue with
+write-behind. The loss windows are the nominal ones from get_durability;
+the "max calls" columns are its upper bounds (a full queue, unsynced
+WAL).
+
+Usage:
+    python tools/bench_durability.py [--events N] [--dir PATH] [--modes strict,balanced]
+"""
+
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import Config  # noqa: E402
+from db_manager import DatabaseManager  # noqa: E402
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _window(ms):
+    """Human-readable loss window"""
+    if ms is None:
+        return 'unbounded'
+    if ms == 0:
+        return 'none'
+    return f"{ms / 1000:.1f}s" if ms >= 1000 else f"{ms}ms"
+
+
+def _calls(count):
+    """Human-readable loss bound in calls"""
+    return 'unbounded' if count is None else str(count)
+
+
+def run_mode(mode: str, events: int, base_dir: Path) -> dict:
+    """Ingest events into a fresh database using one durability mode"""
+    work_dir = Path(tempfile.mkdtemp(prefix=f"bench_{mode}_", dir=base_dir))
+    db = DatabaseManager(work_dir / "bench.db", enable_encryption=False, durability=mode)
+
+    try:
+        latencies = []
+        started = time.perf_counter()
+        for i in range(events):
+            record = {
+                'timestamp': datetime.now().isoformat(),
+                'app_name': f"app{i % 20}.exe",
+                'window_title': f"Document {i % 200} - Editor",
+                'duration_seconds': 5,
+                'is_active': True,
+            }
+            call_started = time.perf_counter()
+            db.log_app_usage(record)
+            latencies.append((time.perf_counter() - call_started) * 1000)
+        db.flush()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        durability = db.get_durability()
+        return {
+            'mode': mode,
+            'synchronous': durability['synchronous'],
+            'events_per_sec': events / elapsed if elapsed else 0.0,
+            'p50_ms': _percentile(latencies, 0.50),
+            'p99_ms': _percentile(latencies, 0.99),
+            'process_crash_loss_ms': durability['process_crash_loss_ms'],
+            'process_crash_loss_max_calls': durability['process_crash_loss_max_calls'],
+            'power_loss_window_ms': durability['power_loss_window_ms'],
+            'power_loss_max_calls': durability['power_loss_max_calls'],
+        }
+    finally:
+        db.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DB_DURABILITY modes")
+    parser.add_argument('--events', type=int, default=5000, help="events per mode")
+    parser.add_argument('--dir', type=Path, default=Config.DATA_DIR,
+                        help="directory on the disk to measure")
+    parser.add_argument('--modes', default=','.join(DatabaseManager.DURABILITY_MODES),
+                        help="comma-separated modes to run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    args.dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"{args.events} events per mode in {args.dir}\n")
+    print("p50/p99: call latency (enqueue only with write-behind, commit in strict)\n")
+    print(f"{'mode':<12}{'sync':<8}{'events/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'crash loss':>13}{'max calls':>11}{'power loss':>13}{'max calls':>11}")
+    for mode in args.modes.split(','):
+        result = run_mode(mode.strip(), args.events, args.dir)
+        print(f"{result['mode']:<12}{result['synchronous']:<8}"
+              f"{result['events_per_sec']:>10.0f}{result['p50_ms']:>9.3f}{result['p99_ms']:>9.3f}"
+              f"{_window(result['process_crash_loss_ms']):>13}"
+              f"{_calls(result['process_crash_loss_max_calls']):>11}"
+              f"{_window(result['power_loss_window_ms']):>13}"
+              f"{_calls(result['power_loss_max_calls']):>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+IPC Transport Benchmark
+Compares throughput and latency of the TCP and Unix domain socket
+transports
+
+A server and a client run in this process. The client sends --messages
+app_usage events carrying their send time; the server records when each
+one reaches its handler. Throughput is messages per second until the last
+one arrives, latency is send-to-handler time. By default every event is
+its own frame (--batch 1) so the per-frame transport cost is measured;
+pass e.g. --batch 100 to include client-side batching.
+
+Usage:
+    python tools/bench_ipc_transport.py [--messages N] [--batch N] [--server threaded|asyncio]
+"""
+
+import sys
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import Config  # noqa: E402
+from ipc_manager import IPCClient, create_ipc_server  # noqa: E402
+from ipc_transport import TCPTransport, UnixTransport  # noqa: E402
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_transport(make_transport, messages: int) -> dict:
+    """Send messages over one transport and collect arrival latencies"""
+    latencies = []
+    done = threading.Event()
+
+    def handle(data):
+        latencies.append(time.perf_counter() - data['sent'])
+        if len(latencies) >= messages:
+            done.set()
+
+    def handle_batch(records):
+        for data in records:
+            handle(data)
+
+    server = create_ipc_server(transport=make_transport())
+    server.register_handler('app_usage', handle)
+    server.register_batch_handler('app_usage', handle_batch)
+    server.start()
+    time.sleep(0.5)
+
+    client = IPCClient(transport=make_transport())
+    if not client.connect():
+        server.stop()
+        raise RuntimeError("Could not connect to the benchmark server")
+
+    try:
+        started = time.perf_counter()
+        for i in range(messages):
+            client.send_message('app_usage', {
+                'app_name': 'bench.exe',
+                'window_title': f"Window {i % 100}",
+                'duration_seconds': 1.5,
+                'sent': time.perf_counter(),
+            })
+        if not done.wait(timeout=120):
+            raise RuntimeError(f"Only {len(latencies)} of {messages} messages arrived")
+        elapsed = time.perf_counter() - started
+    finally:
+        client.disconnect()
+        server.stop()
+
+    latencies.sort()
+    return {
+        'messages_per_sec': messages / elapsed,
+        'p50_us': _percentile(latencies, 0.50) * 1e6,
+        'p99_us': _percentile(latencies, 0.99) * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IPC transports")
+    parser.add_argument('--messages', type=int, default=50000, help="messages per transport")
+    parser.add_argument('--batch', type=int, default=1, help="IPC_BATCH_MAX_MESSAGES for the client")
+    parser.add_argument('--server', choices=('threaded', 'asyncio'), default=Config.IPC_SERVER_MODE)
+    parser.add_argument('--port', type=int, default=Config.IPC_PORT + 1, help="TCP port to use")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    Config.IPC_BATCH_MAX_MESSAGES = args.batch
+    Config.IPC_SERVER_MODE = args.server
+
+    socket_dir = tempfile.mkdtemp(prefix="bench_ipc_")
+    transports = [('tcp', lambda: TCPTransport('127.0.0.1', args.port))]
+    if hasattr(socket, 'AF_UNIX'):
+        transports.append(('unix', lambda: UnixTransport(Path(socket_dir) / "ipc.sock", 0o600)))
+    else:
+        print("Unix domain sockets are not available on this platform")
+
+    print(f"{args.messages} messages, batch {args.batch}, {args.server} server\n")
+    print(f"{'transport':<11}{'msgs/s':>10}{'p50 us':>10}{'p99 us':>10}")
+    for name, make_transport in transports:
+        result = run_transport(make_transport, args.messages)
+        print(f"{name:<11}{result['messages_per_sec']:>10.0f}"
+              f"{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Memory-mapped Read Benchmark
+Compares full-scan throughput over app_usage with and without
+DB_READER_MMAP_SIZE
+
+Without --db a database of about --size-mb is generated under --dir
+through DatabaseManager's insert path, so app names and window titles are
+dictionary-encoded as in production (a multi-GB database takes several
+minutes to build; pass --keep to reuse it with --db on later runs). Each
+mode opens its own DatabaseManager and runs the scan queries --runs times
+on a pooled read-only connection; the first run of each mode warms the OS
+cache, so compare the median columns.
+
+Usage:
+    python tools/bench_mmap.py [--size-mb 4096] [--dir PATH] [--db PATH]
+                               [--mmap-size BYTES] [--runs N] [--keep]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import Config  # noqa: E402
+from db_manager import DatabaseManager  # noqa: E402
+
+# Through the decoding view, as the read API sees the rows
+QUERIES = {
+    'count_sum': "SELECT COUNT(*), SUM(duration_seconds), SUM(LENGTH(window_title)) FROM app_usage_view",
+    'group_by_app': "SELECT app_name, SUM(duration_seconds), COUNT(*) FROM app_usage_view GROUP BY app_name",
+}
+
+# Rows per bulk insert; the size is checked after each, so the database
+# ends up at most about one batch (~1.5 MB with the title lookup table)
+# past the target
+FILL_BATCH_ROWS = 1000
+
+
+def _database_bytes(db) -> int:
+    """Size of the committed database in pages (the file lags until a checkpoint)"""
+    with db._pool.reader() as conn:
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def build_database(db_path: Path, size_mb: int):
+    """Fill app_usage with ~300-byte events through log_app_usage_bulk"""
+    db = DatabaseManager(db_path, enable_encryption=False, durability='throughput',
+                         partition_granularity=None, background_maintenance=False)
+    target = size_mb * 1024 * 1024
+    start = datetime.now() - timedelta(days=1)
+    rows = 0
+    try:
+        while _database_bytes(db) < target:
+            db.log_app_usage_bulk([
+                {
+                    'timestamp': (start + timedelta(seconds=(rows + i) % 86400)).isoformat(),
+                    'app_name': f"app{(rows + i) % 50}.exe",
+                    'window_title': f"Document {rows + i} - {os.urandom(128).hex()}",
+                    'duration_seconds': float((rows + i) % 60),
+                }
+                for i in range(FILL_BATCH_ROWS)
+            ])
+            rows += FILL_BATCH_ROWS
+            print(f"  {rows} rows, {_database_bytes(db) / 1024 / 1024:.0f} MB", end='\r')
+        db.checkpoint('TRUNCATE')
+    finally:
+        db.close()
+    print()
+
+
+def run_mode(db_path: Path, mmap_size: int, runs: int) -> dict:
+    """Time each scan query on one reader with the given mmap size"""
+    db = DatabaseManager(db_path, enable_encryption=False, reader_pool_size=1,
+                         reader_mmap_size=mmap_size, background_maintenance=False)
+    try:
+        timings = {name: [] for name in QUERIES}
+        with db._pool.reader() as conn:
+            for _ in range(runs):
+                for name, sql in QUERIES.items():
+                    started = time.perf_counter()
+                    conn.execute(sql).fetchall()
+                    timings[name].append(time.perf_counter() - started)
+        effective = db.get_pool_stats()['reader_mmap_effective']
+    finally:
+        db.close()
+    return {'effective': effective or 0, 'timings': timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory-mapped reads")
+    parser.add_argument('--size-mb', type=int, default=4096, help="size of the generated database")
+    parser.add_argument('--dir', type=Path, default=Config.DATA_DIR,
+                        help="directory on the disk to measure")
+    parser.add_argument('--db', type=Path, help="existing database to scan instead")
+    parser.add_argument('--mmap-size', type=int, default=8 * 1024 ** 3,
+                        help="bytes to map in the mmap mode (SQLite caps it at compile time)")
+    parser.add_argument('--runs', type=int, default=5, help="runs per query and mode")
+    parser.add_argument('--keep', action='store_true', help="keep the generated database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = None
+    db_path = args.db
+    if db_path is None:
+        args.dir.mkdir(parents=True, exist_ok=True)
+        work_dir = Path(tempfile.mkdtemp(prefix="bench_mmap_", dir=args.dir))
+        db_path = work_dir / "bench.db"
+        print(f"Building {args.size_mb} MB database in {db_path}")
+        build_database(db_path, args.size_mb)
+
+    try:
+        size_mb = db_path.stat().st_size / 1024 / 1024
+        print(f"Scanning {db_path} ({size_mb:.0f} MB), {args.runs} runs per query\n")
+        print(f"{'mode':<22}{'query':<14}{'first s':>9}{'median s':>10}{'MB/s':>9}")
+        for mmap_size in (0, args.mmap_size):
+            result = run_mode(db_path, mmap_size, args.runs)
+            mode = f"mmap {result['effective'] / 1024 ** 2:.0f} MB" if mmap_size else "page cache"
+            for name, times in result['timings'].items():
+                median = statistics.median(times)
+                print(f"{mode:<22}{name:<14}{times[0]:>9.3f}{median:>10.3f}"
+                      f"{size_mb / median if median else 0:>9.0f}")
+    finally:
+        if work_dir is not None and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()